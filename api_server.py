@@ -0,0 +1,288 @@
+import argparse
+import asyncio
+import json
+import logging
+import sqlite3
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import column_store
+import database
+import facets
+import migrations
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8080
+
+# Threads running queries; each keeps its own connection (database.Database is
+# per-thread), so this is also the size of the read-connection pool
+READ_CONNECTIONS = 4
+
+# Responses kept in the cache; it is emptied whenever the database changes
+CACHE_SIZE = 1024
+
+MAX_PAGE_SIZE = 1000
+
+# Longest request line or header accepted
+MAX_LINE = 8192
+
+log = logging.getLogger("cars.api")
+
+STATUS_TEXT = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error",
+}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def row_dict(row, names=database.SEARCH_COLUMN_NAMES):
+    return dict(zip(names, row))
+
+
+def single_values(query):
+    return {name: values[-1] for name, values in parse_qs(query).items()}
+
+
+def search_filters(params):
+    return {name: params[name] for name in database.SEARCH_FILTERS if params.get(name)}
+
+
+def range_filters(params):
+    return {name: params[name] for name in database.RANGE_FILTERS if params.get(name)}
+
+
+class ResponseCache:
+    """LRU cache of response bodies, valid for one PRAGMA data_version of the database."""
+
+    def __init__(self, path, size=CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # Only used on the event loop thread; the check costs no disk read
+        self._conn = sqlite3.connect(path)
+        self._version = None
+
+    def _check_version(self):
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._version:
+            self.entries.clear()
+            self._version = version
+
+    def get(self, key):
+        self._check_version()
+        body = self.entries.get(key)
+        if body is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return body
+
+    def version(self):
+        """The data version responses computed from now on belong to."""
+        self._check_version()
+        return self._version
+
+    def put(self, key, body, version):
+        """Caches a body computed at the given version(), unless the database changed since."""
+        self._check_version()
+        if version != self._version:
+            return
+        self.entries[key] = body
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def close(self):
+        self._conn.close()
+
+
+class ApiServer:
+    """
+    Read-only JSON API over the inventory.
+
+    GET /search?brand=&model=&country=&car_class=&body_type=&year_from=&year_to=&page_size=&token=
+        One page of search results, same filters as SearchForm; next_token fetches the next page.
+        Also takes numeric ranges: price_min=&price_max=, and the same for horse_power, volume,
+        consumption_mixed and max_speed, answered from the column_store snapshot.
+    GET /facets?<same filters>
+        Number of results for every brand, country, model, class and body type.
+    GET /cars/<id>
+        One specification with its brand, model, generation and price.
+    GET /stats
+        Cache and pool statistics.
+
+    Queries run on a thread pool so the event loop only parses requests and
+    writes responses.
+    """
+
+    def __init__(self, read_connections=READ_CONNECTIONS, cache_size=CACHE_SIZE):
+        self.executor = ThreadPoolExecutor(read_connections, thread_name_prefix="reader")
+        self.read_connections = read_connections
+        self.cache = ResponseCache(database.db.path, cache_size)
+        self.requests = 0
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_LINE)
+        print(f"Serving on http://{host}:{port}/ with {self.read_connections} read connections.")
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.executor.shutdown()
+        self.cache.close()
+        facets.facet_index.close()
+        column_store.column_store.close()
+        database.db.close()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, separator, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                if headers.get("content-length"):
+                    await reader.readexactly(int(headers["content-length"]))
+
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    self.write_response(writer, 400, self.error_body("Malformed request line."), False)
+                    break
+                status, body = await self.respond(method, target)
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+                self.write_response(writer, status, body, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def write_response(self, writer, status, body, keep_alive):
+        head = (f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+                f"Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+
+    @staticmethod
+    def error_body(message):
+        return json.dumps({"error": message}).encode()
+
+    async def respond(self, method, target):
+        """Returns (status, body) for a request, serving repeated GETs from the cache."""
+        self.requests += 1
+        if method != "GET":
+            return 405, self.error_body("Only GET is supported.")
+        url = urlsplit(target)
+        params = single_values(url.query)
+        key = (url.path, tuple(sorted(params.items())))
+        if url.path != "/stats":
+            body = self.cache.get(key)
+            if body is not None:
+                return 200, body
+        # Taken before the query: a write committed while it runs must not be cached
+        version = self.cache.version()
+
+        try:
+            result = await self.route(url.path, params)
+        except HttpError as e:
+            return e.status, self.error_body(str(e))
+        except ValueError as e:
+            return 400, self.error_body(str(e))
+        except sqlite3.Error as e:
+            return 500, self.error_body(f"Database error: {e}")
+        except Exception:
+            # A bug; keep serving, and keep the traceback for whoever fixes it
+            log.exception("Error serving %s", target)
+            return 500, self.error_body("Internal server error.")
+
+        body = json.dumps(result, ensure_ascii=False).encode()
+        if url.path != "/stats":
+            self.cache.put(key, body, version)
+        return 200, body
+
+    async def run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def route(self, path, params):
+        if path == "/search":
+            return await self.run(self.search, params)
+        if path == "/facets":
+            return await self.run(facets.facet_index.counts, search_filters(params))
+        if path.startswith("/cars/"):
+            return await self.run(self.car, path[len("/cars/"):])
+        if path == "/stats":
+            return {
+                "requests": self.requests,
+                "cache_entries": len(self.cache.entries),
+                "cache_hits": self.cache.hits,
+                "cache_misses": self.cache.misses,
+                "read_connections": self.read_connections,
+            }
+        raise HttpError(404, f"No such endpoint: {path}")
+
+    @staticmethod
+    def search(params):
+        page_size = params.get("page_size", str(database.PAGE_SIZE))
+        if not page_size.isdigit() or not 1 <= int(page_size) <= MAX_PAGE_SIZE:
+            raise HttpError(400, f"page_size must be a number from 1 to {MAX_PAGE_SIZE}.")
+        filters = dict(search_filters(params), **range_filters(params))
+        rows, next_token = column_store.column_store.search_page(filters, int(page_size), params.get("token"))
+        return {"rows": [row_dict(row) for row in rows], "next_token": next_token}
+
+    @staticmethod
+    def car(specification_id):
+        if not specification_id.isdigit():
+            raise HttpError(400, "Invalid car ID.")
+        row = database.get_car(int(specification_id))
+        if row is None:
+            raise HttpError(404, f"No car with ID {specification_id}.")
+        return row_dict(row, database.SEARCH_COLUMN_NAMES + ("Price",))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the inventory as a JSON API.")
+    parser.add_argument("--db", default=database.DB_PATH, help=f"SQLite database file (default: {database.DB_PATH})")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--read-connections", type=int, default=READ_CONNECTIONS,
+                        help="query threads, each with its own connection")
+    parser.add_argument("--cache-size", type=int, default=CACHE_SIZE, help="responses kept in the cache")
+    args = parser.parse_args()
+
+    database.db.path = args.db
+    migrations.migrate(database.db.connection())
+    if column_store.column_store.available():
+        # Load the range-filter snapshot now rather than in the first request that needs it
+        column_store.column_store.matching_ids({})
+    server = ApiServer(args.read_connections, args.cache_size)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
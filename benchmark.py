@@ -0,0 +1,266 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import time
+from datetime import datetime, timezone
+
+import database
+import facets
+import generate_catalogue
+import latency
+import migrations
+
+DEFAULT_SCALES = "1k,100k"
+DEFAULT_ITERATIONS = 200
+WARMUP_ITERATIONS = 10
+
+# Generated databases are cached here and reused by later runs; results are written here too
+BENCHMARK_DIR = 'benchmarks'
+
+# Expensive cases (whole result sets, full index builds) run at most this many times
+SLOW_CASE_ITERATIONS = 20
+
+
+def measure(func, make_args, iterations, warmup=WARMUP_ITERATIONS):
+    """Calls func(*make_args()) warmup + iterations times; only the calls themselves are timed."""
+    for _ in range(warmup):
+        func(*make_args())
+    latencies = []
+    for _ in range(iterations):
+        args = make_args()
+        started = time.perf_counter()
+        func(*args)
+        latencies.append(time.perf_counter() - started)
+    return latency.summarize(latencies)
+
+
+class Workload:
+    """Random but representative arguments for the benchmarked calls, sampled from the database."""
+
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        self.models = database.db.fetchall("""
+            SELECT Marks.id, Marks.name, Marks.country, Models.id, Models.name, Models.class, Models.body_type
+            FROM Models
+            INNER JOIN Marks ON Marks.id = Models.mark_id
+        """)
+        self.generations = database.db.fetchall("SELECT id, model_id, year_start, year_stop FROM Generations")
+        self.specification_ids = database.db.fetch_column("SELECT id FROM Specifications")
+        self.rng.shuffle(self.specification_ids)
+        self.inserted = 0
+
+    def model(self):
+        return self.rng.choice(self.models)
+
+    def generation(self):
+        return self.rng.choice(self.generations)
+
+    def years(self):
+        year_start = self.generation()[2] or 2000
+        return str(year_start), str(year_start + self.rng.randint(5, 15))
+
+    # Filter combinations a user typically picks in SearchForm
+    def search_filters(self, combination):
+        mark_id, brand, country, model_id, model, car_class, body_type = self.model()
+        year_from, year_to = self.years()
+        return {
+            "empty": {},
+            "brand": {"brand": brand},
+            "brand+model": {"brand": brand, "model": model},
+            "country+class": {"country": country, "car_class": car_class},
+            "class+body": {"car_class": car_class, "body_type": body_type},
+            "brand+years": {"brand": brand, "year_from": year_from, "year_to": year_to},
+            "years": {"year_from": year_from, "year_to": year_to},
+        }[combination]
+
+    def new_car(self):
+        # A new model of an existing brand, as NewCarForm.save_new_car would send it
+        mark_id, brand, country, model_id, model, car_class, body_type = self.model()
+        self.inserted += 1
+        year_from = self.rng.randint(1990, 2020)
+        main = {
+            "mark_name": brand,
+            "country": country,
+            "model_name": f"Benchmark {self.inserted}",
+            "year_from": year_from,
+            "year_to": year_from + 7,
+            "car_class": car_class,
+            "body_type": body_type,
+            "price": self.rng.randint(20, 500) * 100,
+        }
+        styling = {"generation": "I", "generation_year_from": year_from, "generation_year_to": year_from + 7}
+        specs = {
+            "engine_type": "бензин",
+            "transmission": "автоматическая",
+            "volume": 1998,
+            "consumption_mixed": 7.4,
+            "max_speed": 210,
+            "drive": "передний",
+            "horse_power": self.rng.randint(90, 400),
+        }
+        return main, styling, specs
+
+    def changes(self):
+        # EditDataForm with the model and specification checkboxes ticked
+        mark_id, brand, country, model_id, model, car_class, body_type = self.model()
+        return [
+            ("models", "class", car_class, model_id),
+            ("specifications", "price", str(self.rng.randint(20, 500) * 100), self.rng.choice(self.specification_ids)),
+        ]
+
+    def specification_to_delete(self):
+        return self.specification_ids.pop()
+
+
+def benchmark_cases(workload, facet_index):
+    """(group, name, func, make_args, slow) for every benchmarked call, reads before writes."""
+    cases = []
+    for combination in ("empty", "brand", "brand+model", "country+class", "class+body", "brand+years", "years"):
+        def make_filters(combination=combination):
+            return workload.search_filters(combination),
+
+        # perform_search: first page; the result view pulls further pages on scroll
+        cases.append(("search", f"page/{combination}", database.search_page, make_filters, False))
+        cases.append(("search", f"all/{combination}", database.search_cars, make_filters, True))
+        cases.append(("search", f"facet_counts/{combination}", facet_index.counts, make_filters, False))
+
+    cases += [
+        ("search_cascade", "facet_index/build", lambda: (facet_index.invalidate(), facet_index.mark_names()),
+         tuple, True),
+        ("search_cascade", "facet_index/countries", facet_index.countries, lambda: (workload.model()[1],), False),
+        ("search_cascade", "facet_index/model_names", facet_index.model_names, lambda: (workload.model()[1],), False),
+        ("search_cascade", "facet_index/classes", facet_index.classes, lambda: (workload.model()[4],), False),
+        ("search_cascade", "sql/mark_names", database.get_mark_names, tuple, False),
+        ("search_cascade", "sql/countries", database.get_countries, lambda: (workload.model()[1],), False),
+        ("search_cascade", "sql/model_names", database.get_model_names, lambda: (workload.model()[1],), False),
+        ("search_cascade", "sql/classes", database.get_classes, lambda: (workload.model()[4],), False),
+        ("search_cascade", "sql/body_types", database.get_body_types, lambda: (workload.model()[4],), False),
+        ("edit_cascade", "marks", database.get_marks, tuple, False),
+        ("edit_cascade", "models", database.get_models, lambda: (workload.model()[0],), False),
+        ("edit_cascade", "generations", database.get_generations, lambda: (workload.model()[3],), False),
+        ("edit_cascade", "specifications", database.get_specifications,
+         lambda: workload.generation()[1::-1], False),
+        ("write", "add_car", database.add_car, workload.new_car, False),
+        ("write", "update_records", database.update_records, lambda: (workload.changes(),), False),
+        ("write", "delete_specification", database.delete_specification,
+         lambda: (workload.specification_to_delete(),), False),
+    ]
+    return cases
+
+
+def catalogue_path(directory, specification_count, seed):
+    """Generated catalogue for the scale, created on first use and migrated to the current schema."""
+    path = os.path.join(directory, f"catalogue-{seed}-{specification_count}.db")
+    if not os.path.exists(path):
+        print(f"Generating {specification_count} specifications into {path}...")
+        generate_catalogue.create_database(path + ".tmp", specification_count, seed)
+        os.replace(path + ".tmp", path)
+        return path
+    # Cached by an earlier version: migrate it once here, not on every run's working copy
+    conn = sqlite3.connect(path)
+    try:
+        applied = migrations.migrate(conn)
+    finally:
+        conn.close()
+    if applied:
+        print(f"Migrated {path} to schema version {applied[-1]}.")
+    return path
+
+
+def run_scale(path, iterations, seed):
+    """Runs every case against a scratch copy of the catalogue, which the write cases modify."""
+    work_path = os.path.join(os.path.dirname(path), "work.db")
+    shutil.copyfile(path, work_path)
+    saved_path = database.db.path
+    database.db.close()
+    database.db.path = work_path
+    facet_index = facets.FacetIndex(work_path)
+    try:
+        workload = Workload(seed)
+        results = {}
+        for group, name, func, make_args, slow in benchmark_cases(workload, facet_index):
+            case_iterations = min(iterations, SLOW_CASE_ITERATIONS) if slow else iterations
+            warmup = min(WARMUP_ITERATIONS, case_iterations)
+            summary = measure(func, make_args, case_iterations, warmup)
+            results[f"{group}/{name}"] = summary
+            print(f"  {group + '/' + name:<40} p50 {summary['p50_ms']:9.3f} ms  p95 {summary['p95_ms']:9.3f} ms  "
+                  f"p99 {summary['p99_ms']:9.3f} ms  {summary['ops_per_sec']:10.1f} ops/s")
+        return results
+    finally:
+        facet_index.close()
+        database.db.close()
+        database.db.path = saved_path
+        os.remove(work_path)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    """Prints the p50/p95 change of every case against an earlier results file."""
+    with open(baseline_path, encoding='utf-8') as file:
+        baseline = json.load(file)
+    print(f"\nCompared with {baseline_path} (commit {baseline.get('commit')}):")
+    for scale, cases in results["scales"].items():
+        for case, summary in cases.items():
+            before = baseline.get("scales", {}).get(scale, {}).get(case)
+            if not before:
+                continue
+            changes = "  ".join(
+                f"p{p} {(summary[f'p{p}_ms'] / before[f'p{p}_ms'] - 1) * 100:+7.1f}%"
+                for p in (50, 95) if before[f"p{p}_ms"]
+            )
+            print(f"  {scale:>8} {case:<44} {changes}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the search, cascade and write paths.")
+    parser.add_argument("--scales", default=DEFAULT_SCALES,
+                        help=f"comma-separated catalogue sizes: 1k, 100k, 1M, 10M or numbers (default: {DEFAULT_SCALES})")
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS, help="timed calls per case")
+    parser.add_argument("--seed", type=int, default=generate_catalogue.DEFAULT_SEED)
+    parser.add_argument("--dir", default=BENCHMARK_DIR, help="where catalogues are cached and results written")
+    parser.add_argument("--output", help="results file (default: <dir>/results-<time>-<commit>.json)")
+    parser.add_argument("--compare", metavar="RESULTS", help="earlier results file to compare with")
+    args = parser.parse_args()
+
+    os.makedirs(args.dir, exist_ok=True)
+    commit = git_commit()
+    results = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "iterations": args.iterations,
+        "scales": {},
+    }
+    for scale in args.scales.split(","):
+        specification_count = generate_catalogue.parse_scale(scale.strip())
+        path = catalogue_path(args.dir, specification_count, args.seed)
+        print(f"{scale.strip()} ({specification_count} specifications):")
+        results["scales"][scale.strip()] = run_scale(path, args.iterations, args.seed)
+
+    output = args.output or os.path.join(
+        args.dir, f"results-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{commit or 'unknown'}.json")
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=2)
+    print(f"Results written to {output}.")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
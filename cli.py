@@ -0,0 +1,238 @@
+import argparse
+import sqlite3
+import sys
+
+import database
+import db_create
+import inventory
+
+# CLI option -> search filter (see database.SEARCH_FILTERS)
+FILTER_OPTIONS = (
+    ("--brand", "brand"),
+    ("--model", "model"),
+    ("--country", "country"),
+    ("--class", "car_class"),
+    ("--body-type", "body_type"),
+    ("--year-from", "year_from"),
+    ("--year-to", "year_to"),
+    ("--price-min", "price_min"),
+    ("--price-max", "price_max"),
+    ("--horse-power-min", "horse_power_min"),
+    ("--horse-power-max", "horse_power_max"),
+    ("--volume-min", "volume_min"),
+    ("--volume-max", "volume_max"),
+    ("--consumption-min", "consumption_mixed_min"),
+    ("--consumption-max", "consumption_mixed_max"),
+    ("--max-speed-min", "max_speed_min"),
+    ("--max-speed-max", "max_speed_max"),
+)
+
+# CLI option -> new car field (see inventory.split_car)
+CAR_OPTIONS = (
+    ("--brand", "mark_name"),
+    ("--model", "model_name"),
+    ("--country", "country"),
+    ("--class", "car_class"),
+    ("--body-type", "body_type"),
+    ("--year-from", "year_from"),
+    ("--year-to", "year_to"),
+    ("--price", "price"),
+    ("--generation", "generation"),
+    ("--generation-year-from", "generation_year_from"),
+    ("--generation-year-to", "generation_year_to"),
+    ("--engine-type", "engine_type"),
+    ("--transmission", "transmission"),
+    ("--drive", "drive"),
+    ("--horse-power", "horse_power"),
+    ("--volume", "volume"),
+    ("--consumption", "consumption_mixed"),
+    ("--max-speed", "max_speed"),
+)
+
+
+def add_options(parser, options):
+    for option, dest in options:
+        parser.add_argument(option, dest=dest)
+
+
+def filters_from(args):
+    return {dest: getattr(args, dest) for option, dest in FILTER_OPTIONS if getattr(args, dest) is not None}
+
+
+def print_result(result):
+    applied = ", ".join(f"{count} {kind}" for kind, count in result["applied"].items())
+    print(f"Applied: {applied}; failed: {len(result['failed'])}.")
+    for line_number, message in result["failed"]:
+        print(f"  line {line_number}: {message}" if line_number else f"  {message}", file=sys.stderr)
+    if result["stopped"]:
+        print("Stopped at the first error; its batch was rolled back.", file=sys.stderr)
+    return 1 if result["failed"] else 0
+
+
+def run_operations(operations, args):
+    return print_result(inventory.apply_operations(operations, args.batch_size, args.stop_on_error))
+
+
+def command_search(args):
+    rows = inventory.search(filters_from(args), args.text, args.limit)
+    inventory.write_rows(rows, sys.stdout, args.format)
+    return 0
+
+
+def command_export(args):
+    result = inventory.export(args.path, filters_from(args), args.format, args.text)
+    print(f"Exported {result['rows']} rows to {args.path} in {result['seconds']:.1f} s "
+          f"({result['rows_per_sec']:.0f} rows/sec).")
+    return 0
+
+
+def command_add(args):
+    car = {dest: getattr(args, dest) for option, dest in CAR_OPTIONS if getattr(args, dest) is not None}
+    return run_operations([(None, dict(car, op="add"))], args)
+
+
+def command_update(args):
+    values = {}
+    for assignment in args.assignments:
+        column, separator, value = assignment.partition("=")
+        if not separator:
+            raise inventory.ValidationError(f"Expected COLUMN=VALUE, got \"{assignment}\".")
+        values[column] = value
+    return run_operations([(None, {"op": "update", "table": args.table, "id": args.id, "set": values})], args)
+
+
+def command_bulk_update(args):
+    changes = []
+    for assignment in args.assignments:
+        target, separator, value = assignment.partition("=")
+        table, dot, column = target.partition(".")
+        if not separator or not dot:
+            raise inventory.ValidationError(f"Expected TABLE.COLUMN=VALUE, got \"{assignment}\".")
+        changes.append(inventory.parse_bulk_change(table, column, value))
+    ids, ranges = inventory.parse_id_list(" ".join(args.ids or ()))
+    counts = inventory.bulk_update(changes, ids, ranges, filters_from(args), args.dry_run)
+    print(f"{'Would update' if args.dry_run else 'Updated'}: {inventory.format_counts(counts)}.")
+    return 0
+
+
+def command_delete(args):
+    ids, ranges = inventory.parse_id_list(" ".join(args.ids))
+    counts = inventory.delete_cars(ids, ranges, filters_from(args), args.cleanup, args.dry_run)
+    print(f"{'Would delete' if args.dry_run else 'Deleted'}: {inventory.format_counts(counts)}.")
+    if not counts["specifications"]:
+        print("No matching specifications.", file=sys.stderr)
+        return 1
+    return 0
+
+
+def command_apply(args):
+    if args.path == "-":
+        return run_operations(inventory.read_operations(sys.stdin), args)
+    with open(args.path, encoding='utf-8') as file:
+        return run_operations(inventory.read_operations(file), args)
+
+
+def command_import(args):
+    inventory.import_dump(args.path, args.batch_size, args.sync, args.workers)
+    print("Data successfully loaded into the database.")
+    return 0
+
+
+def command_rebuild_search(args):
+    print(f"Rebuilt the search table: {inventory.rebuild_search_table()} rows.")
+    return 0
+
+
+def command_rebuild_stats(args):
+    print(f"Rebuilt the statistics tables: {inventory.rebuild_stats_tables()} models.")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Search and edit the car inventory without the GUI.")
+    parser.add_argument("--db", default=database.DB_PATH, help=f"SQLite database file (default: {database.DB_PATH})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    search = commands.add_parser("search", help="print matching cars")
+    export = commands.add_parser("export", help="write matching cars to a file")
+    export.add_argument("path", help="output file; .csv, .jsonl or .parquet (needs pyarrow) picks the format")
+    for command in (search, export):
+        add_options(command, FILTER_OPTIONS)
+        command.add_argument("--text", help="free-text search instead of the filters (best matches only)")
+    search.add_argument("--format", choices=inventory.TEXT_FORMATS, default="csv")
+    search.add_argument("--limit", type=int, help="print at most this many rows")
+    export.add_argument("--format", choices=inventory.EXPORT_FORMATS)
+    search.set_defaults(handler=command_search)
+    export.set_defaults(handler=command_export)
+
+    add = commands.add_parser("add", help="add one car")
+    add_options(add, CAR_OPTIONS)
+    add.set_defaults(handler=command_add)
+
+    update = commands.add_parser("update", help="change columns of one row")
+    update.add_argument("table", choices=inventory.EDITABLE_COLUMNS)
+    update.add_argument("id", type=int)
+    update.add_argument("assignments", nargs="+", metavar="COLUMN=VALUE")
+    update.set_defaults(handler=command_update)
+
+    bulk_update = commands.add_parser("bulk-update", help="change columns of every matching car at once")
+    bulk_update.add_argument("assignments", nargs="+", metavar="TABLE.COLUMN=VALUE",
+                             help="new value, or for numeric columns *1.05, +500 or -500")
+    bulk_update.add_argument("--ids", nargs="+", metavar="ID", help="IDs or ranges such as 100-200")
+    add_options(bulk_update, FILTER_OPTIONS)
+    bulk_update.add_argument("--dry-run", action="store_true", help="only print how many rows would change")
+    bulk_update.set_defaults(handler=command_bulk_update)
+
+    delete = commands.add_parser("delete", help="delete specifications by ID, ID range and/or search filter")
+    delete.add_argument("ids", nargs="*", metavar="ID", help="IDs or ranges such as 100-200")
+    add_options(delete, FILTER_OPTIONS)
+    delete.add_argument("--cleanup", action="store_true",
+                        help="also delete generations, models and brands left without specifications")
+    delete.add_argument("--dry-run", action="store_true", help="only print what would be deleted")
+    delete.set_defaults(handler=command_delete)
+
+    apply = commands.add_parser("apply", help="apply a JSON Lines file of add/update/delete operations")
+    apply.add_argument("path", help="operations file, or - for stdin")
+    apply.set_defaults(handler=command_apply)
+
+    for command in (add, update, apply):
+        command.add_argument("--batch-size", type=int, default=inventory.BATCH_SIZE,
+                             help="operations per transaction")
+        command.add_argument("--stop-on-error", action="store_true",
+                             help="roll back the current batch and stop at the first failed operation")
+
+    load = commands.add_parser("import", help="load a JSON catalogue dump (see db_create.py)")
+    load.add_argument("path")
+    load.add_argument("--batch-size", type=int, default=db_create.BATCH_SIZE, help="rows per transaction")
+    load.add_argument("--sync", action="store_true", help="merge by natural key even into an empty database")
+    load.add_argument("--workers", type=int, default=0, help="transform processes for a parallel import")
+    load.set_defaults(handler=command_import)
+
+    rebuild = commands.add_parser("rebuild-search", help="rewrite the search table from the catalogue tables")
+    rebuild.set_defaults(handler=command_rebuild_search)
+    rebuild_stats = commands.add_parser("rebuild-stats", help="rewrite the statistics tables from the catalogue tables")
+    rebuild_stats.set_defaults(handler=command_rebuild_stats)
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    try:
+        inventory.open_database(args.db)
+        return args.handler(args)
+    except inventory.ValidationError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    except sqlite3.Error as e:
+        print(f"Database error: {e}", file=sys.stderr)
+        return 1
+    except OSError as e:
+        # An unreadable input or unwritable output file
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        database.db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+import json
+import operator
+import sqlite3
+import threading
+
+import database
+
+try:
+    import numpy
+except ImportError:  # optional; range filters then run as SQL
+    numpy = None
+
+# Share of the snapshot that may change before a refresh reloads it in full
+REBUILD_SHARE = 0.1
+
+# Up to this many range matches after the page token are looked up directly;
+# beyond that the other filters run as SQL and are checked against the ranges
+CANDIDATE_LOOKUPS = 20000
+
+COMPARISONS = {">=": operator.ge, "<=": operator.le}
+
+
+class ColumnStore:
+    """
+    In-memory snapshot of the Specifications range-filter columns as NumPy arrays.
+
+    A range filter (price_max, horse_power_min, ...) is answered with a vectorized
+    comparison per column instead of a scan of Specifications, and the matching ids
+    are then read from car_search.
+
+    Like facets.FacetIndex, the snapshot is checked against PRAGMA data_version on
+    a private connection. When it changed, only the specifications listed in the
+    specification_changes log (filled by triggers) since the last refresh are
+    reloaded; a NULL entry, a pruned log (migrations.CHANGE_LOG_SIZE entries are
+    kept) or a large share of changes reloads all.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._version = None
+        self._clear()
+
+    def _clear(self):
+        self._seq = None
+        self._ids = None
+        self._columns = {}
+
+    @staticmethod
+    def available():
+        return numpy is not None
+
+    def _connection(self):
+        if self._conn is None:
+            # Guarded by self._lock, so it may be used from any worker thread
+            self._conn = sqlite3.connect(self.path or database.db.path, timeout=database.BUSY_TIMEOUT_MS / 1000,
+                                         check_same_thread=False, isolation_level=None)
+        return self._conn
+
+    def _snapshot(self):
+        """(ids, columns) as of the latest commit; the arrays are never modified in place."""
+        with self._lock:
+            conn = self._connection()
+            version = conn.execute("PRAGMA data_version").fetchone()[0]
+            if version != self._version:
+                self._refresh(conn)
+                self._version = version
+            return self._ids, self._columns
+
+    def _refresh(self, conn):
+        conn.execute("BEGIN")
+        try:
+            seq = conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'specification_changes'"
+            ).fetchone()[0]
+            oldest = conn.execute("SELECT MIN(seq) FROM specification_changes").fetchone()[0]
+            changed = self._changed_ids(conn, seq, oldest)
+            if changed is None:
+                ids, table = self._load(conn)
+                columns = {column: numpy.ascontiguousarray(table[:, position])
+                           for position, column in enumerate(database.RANGE_COLUMNS)}
+            else:
+                ids, columns = self._apply_changes(conn, changed)
+        finally:
+            conn.execute("COMMIT")
+        self._seq = seq
+        self._ids = ids
+        self._columns = columns
+
+    def _changed_ids(self, conn, seq, oldest):
+        """Sorted ids changed since the snapshot, or None if it has to be reloaded in full."""
+        if self._ids is None:
+            return None
+        if seq == self._seq:
+            return numpy.empty(0, numpy.int64)
+        if oldest is None or oldest > self._seq + 1:
+            # Entries this snapshot needs were pruned
+            return None
+        changed = conn.execute("SELECT specification_id FROM specification_changes WHERE seq > ? AND seq <= ?",
+                               (self._seq, seq)).fetchall()
+        if any(row[0] is None for row in changed):
+            return None
+        changed = numpy.unique(numpy.array([row[0] for row in changed], numpy.int64))
+        if len(changed) > REBUILD_SHARE * len(self._ids):
+            return None
+        return changed
+
+    def _apply_changes(self, conn, changed):
+        """New (ids, columns) with the changed rows removed and their current values inserted."""
+        if not len(changed):
+            return self._ids, self._columns
+        keep = ~numpy.isin(self._ids, changed)
+        new_ids, table = self._load(conn, "WHERE id IN (SELECT value FROM json_each(?))",
+                                    (json.dumps(changed.tolist()),))
+        ids = self._ids[keep]
+        # Deleted ids are simply not reloaded; the others go back in id order
+        positions = numpy.searchsorted(ids, new_ids)
+        columns = {column: numpy.insert(self._columns[column][keep], positions, table[:, position])
+                   for position, column in enumerate(database.RANGE_COLUMNS)}
+        return numpy.insert(ids, positions, new_ids), columns
+
+    @staticmethod
+    def _load(conn, condition="", params=()):
+        """(ids, values) of the specifications matching condition, in id order; values has a column per range column."""
+        # NULL becomes NaN, which fails every comparison like NULL does in SQL; text
+        # sorts after every number in SQLite, so it becomes +inf
+        values = ", ".join(f"CASE WHEN typeof({column}) IN ('integer', 'real', 'null') THEN {column} ELSE 9e999 END"
+                           for column in database.RANGE_COLUMNS)
+        cursor = conn.execute(f"SELECT id, {values} FROM Specifications {condition} ORDER BY id", params)
+        chunks = [numpy.empty((0, len(database.RANGE_COLUMNS) + 1))]
+        while True:
+            rows = cursor.fetchmany(database.FETCH_SIZE)
+            if not rows:
+                break
+            chunks.append(numpy.array(rows, numpy.float64))
+        table = numpy.concatenate(chunks)
+        return table[:, 0].astype(numpy.int64), table[:, 1:]
+
+    def invalidate(self):
+        """Forces a full reload on the next lookup."""
+        with self._lock:
+            self._version = None
+            self._clear()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self._version = None
+            self._clear()
+
+    def matching_ids(self, filters):
+        """
+        Ids of the specifications within the range filters, in id order.
+
+        :param filters: dict with any of the database.RANGE_FILTERS keys; other keys are ignored.
+        :return: numpy int64 array.
+        """
+        ids, columns = self._snapshot()
+        return ids[self._mask(columns, database.range_bounds(filters), len(ids))]
+
+    @staticmethod
+    def _mask(columns, bounds, size):
+        mask = numpy.ones(size, bool)
+        for name, bound in bounds.items():
+            column, comparison = database.RANGE_FILTERS[name]
+            mask &= COMPARISONS[comparison](columns[column], bound)
+        return mask
+
+    def search_page(self, filters, page_size=database.PAGE_SIZE, token=None):
+        """
+        database.search_page() with the range filters answered from the snapshot.
+
+        Without range filters, or without NumPy, it is database.search_page() itself.
+        """
+        bounds = database.range_bounds(filters)
+        if not bounds or numpy is None:
+            return database.search_page(filters, page_size, token)
+        after = database.decode_page_token(token) if token is not None else None
+        other_filters = {name: value for name, value in filters.items() if name not in database.RANGE_FILTERS}
+
+        ids, columns = self._snapshot()
+        mask = self._mask(columns, bounds, len(ids))
+        start = 0 if after is None else numpy.searchsorted(ids, after, side="right")
+        candidates = ids[start:][mask[start:]]
+        if not any(other_filters.values()) or len(candidates) <= CANDIDATE_LOOKUPS:
+            rows = self._lookup(candidates, other_filters, page_size + 1)
+        else:
+            rows = database.search_rows(self._filter_ids(ids, mask, other_filters, after, page_size + 1))
+
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            return rows, database.encode_page_token(rows[-1][database.SEARCH_ID_COLUMN])
+        return rows, None
+
+    @staticmethod
+    def _lookup(candidates, filters, limit):
+        """Search rows of the first candidates that match the other filters, until there are limit of them."""
+        rows = []
+        position = 0
+        size = limit
+        while len(rows) < limit and position < len(candidates):
+            rows += database.search_rows(candidates[position:position + size], filters)
+            position += size
+            size = min(size * 2, database.FETCH_SIZE)
+        return rows[:limit]
+
+    @staticmethod
+    def _filter_ids(ids, mask, filters, after, limit):
+        """The first limit ids matching the filters in SQL that are also within the ranges."""
+        matched = []
+        chunks = database.iter_search_ids(filters, after)
+        try:
+            for chunk in chunks:
+                chunk = numpy.array(chunk, numpy.int64)
+                positions = numpy.minimum(numpy.searchsorted(ids, chunk), len(ids) - 1)
+                matched.extend(chunk[(ids[positions] == chunk) & mask[positions]].tolist())
+                if len(matched) >= limit:
+                    break
+        finally:
+            chunks.close()
+        return matched[:limit]
+
+
+column_store = ColumnStore()
@@ -0,0 +1,938 @@
+import base64
+import functools
+import hashlib
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+import query_log
+
+DB_PATH = 'cars.db'
+
+# Applied once to every new connection
+PRAGMAS = (
+    "PRAGMA cache_size = -16000",  # ~16 MB page cache per connection
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA mmap_size = 268435456",
+)
+
+STATEMENT_CACHE_SIZE = 256
+
+# Several desks share one database file. WAL lets readers and a writer work at the same time,
+# but needs every desk on the same host (it uses shared memory); set CARS_JOURNAL_MODE=DELETE
+# when the file sits on a network share.
+JOURNAL_MODE = os.environ.get("CARS_JOURNAL_MODE", "WAL")
+
+# How long a statement waits for another connection's lock before failing with "database is locked"
+BUSY_TIMEOUT_MS = int(os.environ.get("CARS_BUSY_TIMEOUT_MS", 5000))
+
+# Transactions and reads still failing on a lock after the busy timeout are retried this
+# many times, sleeping RETRY_DELAY seconds (doubled every attempt, with jitter) in between
+BUSY_RETRIES = 3
+RETRY_DELAY = 0.1
+
+# Default number of rows per search page
+PAGE_SIZE = 200
+
+# Rows per fetchmany() call when streaming a whole result (see iter_search)
+FETCH_SIZE = 5000
+
+
+def set_journal_mode(conn, mode=None):
+    """Switches the database file to the journal mode (persistent); returns the mode in effect."""
+    mode = mode or JOURNAL_MODE
+    try:
+        current = conn.execute(f"PRAGMA journal_mode = {mode}").fetchone()[0]
+    except sqlite3.OperationalError:
+        # Another connection is using the file; it stays in its current mode for now
+        current = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    if current.lower() == "wal":
+        # Durable at every checkpoint rather than every commit; safe with WAL
+        conn.execute("PRAGMA synchronous = NORMAL")
+    return current
+
+
+def is_busy_error(error):
+    code = getattr(error, "sqlite_errorcode", None)  # Python 3.11+
+    if code is not None:
+        return code & 0xff in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    return "locked" in str(error) or "busy" in str(error)
+
+
+def retry_on_busy(func):
+    """Re-runs a transaction or read that failed because another connection held the database."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        delay = RETRY_DELAY
+        for attempt in range(BUSY_RETRIES):
+            try:
+                return func(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if not is_busy_error(e):
+                    raise
+            time.sleep(delay * random.uniform(0.5, 1.5))
+            delay *= 2
+        return func(*args, **kwargs)
+    return wrapper
+
+
+class _ThreadConnection:
+    """A thread's connection, held in its threading.local; closed when the thread ends."""
+
+    def __init__(self, database, conn):
+        self.conn = conn
+        # Runs when the thread's locals are dropped, i.e. when the thread ends
+        weakref.finalize(self, database._release, conn)
+
+
+class Database:
+    """
+    Long-lived SQLite connections shared by all forms.
+
+    sqlite3 connections may not be used across threads, so every thread gets
+    its own connection, opened on first use and kept until the thread ends or
+    close() is called. Threads running queries should be long-lived Python
+    threads (see workers.pool), or every run pays for a new connection.
+    """
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+
+    def connection(self):
+        holder = getattr(self._local, 'holder', None)
+        if holder is None:
+            # Every statement is timed; slow ones are logged with their plan (see query_log)
+            # Only this thread uses the connection, but close() may run on another one
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000,
+                                   cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=False,
+                                   factory=query_log.InstrumentedConnection)
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            set_journal_mode(conn)
+            holder = self._local.holder = _ThreadConnection(self, conn)
+            with self._lock:
+                self._connections.append(conn)
+        return holder.conn
+
+    def _release(self, conn):
+        with self._lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+        conn.close()
+
+    def execute(self, query, params=()):
+        return self.connection().execute(query, params)
+
+    # The fetch helpers close their cursor before returning, so a read never keeps its
+    # snapshot (and, without WAL, its shared lock) open longer than the query itself.
+    # They are retried like writes: a WAL database can briefly report busy during recovery.
+
+    @retry_on_busy
+    def fetchall(self, query, params=()):
+        cursor = self.execute(query, params)
+        try:
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    @retry_on_busy
+    def fetchone(self, query, params=()):
+        cursor = self.execute(query, params)
+        try:
+            return cursor.fetchone()
+        finally:
+            cursor.close()
+
+    def fetch_column(self, query, params=()):
+        """Returns the first column of every row."""
+        return [row[0] for row in self.fetchall(query, params)]
+
+    @contextmanager
+    def transaction(self):
+        """
+        Yields a cursor; commits on success and rolls back on any error.
+
+        The write lock is taken up front (BEGIN IMMEDIATE), so a busy database
+        makes the transaction wait or fail before it has done anything,
+        never halfway through. Wrap callers in @retry_on_busy.
+        """
+        conn = self.connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            yield cursor
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    @contextmanager
+    def read_transaction(self):
+        """
+        Yields a cursor in a deferred transaction that is always rolled back.
+
+        Its queries see one snapshot, and it never takes the write lock; temp
+        tables it fills are discarded with it.
+        """
+        conn = self.connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN")
+            yield cursor
+        finally:
+            conn.rollback()
+            cursor.close()
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+
+db = Database()
+
+
+# ---------------------------------------------------------------- Employees
+
+def get_password_hash(login):
+    row = db.fetchone("SELECT password FROM Employees WHERE login = ?", (login,))
+    return row[0] if row else None
+
+
+def employee_exists(login):
+    return db.fetchone("SELECT 1 FROM Employees WHERE login = ? LIMIT 1", (login,)) is not None
+
+
+@retry_on_busy
+def add_employee(name, login, hashed_password):
+    with db.transaction() as cursor:
+        cursor.execute(
+            "INSERT INTO Employees (name, password, login) VALUES (?, ?, ?);",
+            (name, hashed_password, login)
+        )
+
+
+# ---------------------------------------------------------------- Search cascade
+
+def get_mark_names():
+    return db.fetch_column("SELECT DISTINCT name FROM Marks")
+
+
+def get_countries(brand=None):
+    if brand:
+        return db.fetch_column("SELECT DISTINCT country FROM Marks WHERE name = ?", (brand,))
+    return db.fetch_column("SELECT DISTINCT country FROM Marks")
+
+
+def get_model_names(brand=None):
+    if brand:
+        return db.fetch_column("""
+            SELECT DISTINCT Models.name
+            FROM Models
+            JOIN Marks ON Models.mark_id = Marks.id
+            WHERE Marks.name = ?
+        """, (brand,))
+    return db.fetch_column("SELECT DISTINCT name FROM Models")
+
+
+def get_classes(model=None):
+    if model:
+        return db.fetch_column("SELECT DISTINCT class FROM Models WHERE name = ?", (model,))
+    return db.fetch_column("SELECT DISTINCT class FROM Models")
+
+
+def get_body_types(model=None):
+    if model:
+        return db.fetch_column("SELECT DISTINCT body_type FROM Models WHERE name = ?", (model,))
+    return db.fetch_column("SELECT DISTINCT body_type FROM Models")
+
+
+def get_distinct_values(table, column):
+    """Distinct non-NULL values of a column, e.g. for the NewCarForm comboboxes."""
+    return db.fetch_column(f"SELECT DISTINCT {column} FROM {table} WHERE {column} IS NOT NULL")
+
+
+# ---------------------------------------------------------------- Search
+
+# car_search (see migrations.add_search_table) holds one row per specification with
+# these columns, kept up to date by triggers, so a search reads a single table
+SEARCH_COLUMNS = """
+    SELECT
+        car_search.mark_name AS MarkName,
+        car_search.country AS Country,
+        car_search.model_name AS ModelName,
+        car_search.car_class AS CarClass,
+        car_search.year_from AS YearFrom,
+        car_search.year_to AS YearTo,
+        car_search.body_type AS BodyType,
+        car_search.generation_name AS GenerationName,
+        car_search.generation_start AS GenerationStart,
+        car_search.generation_end AS GenerationEnd,
+        car_search.engine_type AS EngineType,
+        car_search.horse_power AS HorsePower,
+        car_search.transmission AS Transmission,
+        car_search.drive AS DriveType,
+        car_search.volume AS EngineVolume,
+        car_search.consumption_mixed AS ConsumptionMixed,
+        car_search.max_speed AS MaxSpeed,
+        car_search.id AS SpecificationId
+"""
+
+SEARCH_QUERY = SEARCH_COLUMNS + """
+    FROM
+        car_search
+    WHERE 1=1
+"""
+
+TEXT_SEARCH_QUERY = SEARCH_COLUMNS + """
+    FROM
+        car_fts
+    INNER JOIN
+        car_search ON car_search.id = car_fts.rowid
+    WHERE car_fts MATCH ?
+    ORDER BY car_fts.rank
+    LIMIT ?
+"""
+
+# Text search returns the best matches only; refine the text to narrow them
+TEXT_SEARCH_LIMIT = 200
+
+# Position of the specification id in a search row
+SEARCH_ID_COLUMN = 17
+
+# Column names of a search row, e.g. for exports
+SEARCH_COLUMN_NAMES = tuple(re.findall(r"AS (\w+)", SEARCH_COLUMNS))
+
+# Search filter name -> SQL condition
+SEARCH_FILTERS = {
+    "brand": "car_search.mark_name = ?",
+    "model": "car_search.model_name = ?",
+    "country": "car_search.country = ?",
+    "car_class": "car_search.car_class = ?",
+    "body_type": "car_search.body_type = ?",
+    "year_from": "car_search.generation_start >= ?",
+    "year_to": "car_search.generation_end <= ?",
+}
+
+
+# Specifications columns that can be filtered by range, e.g. {"price_max": 30000, "horse_power_min": 200}.
+# column_store answers these from memory when NumPy is installed; otherwise they run as SQL.
+RANGE_COLUMNS = ("price", "horse_power", "volume", "consumption_mixed", "max_speed")
+
+# Range filter name -> (Specifications column, comparison)
+RANGE_FILTERS = {f"{column}_{bound}": (column, operator)
+                 for column in RANGE_COLUMNS for bound, operator in (("min", ">="), ("max", "<="))}
+
+
+def range_bound(name, value):
+    """A range filter value as a number; SQLite would compare text with every number as greater."""
+    try:
+        bound = float(value)
+    except (TypeError, ValueError):
+        bound = None
+    if bound is None or bound != bound:
+        raise ValueError(f"{name} must be a number.")
+    return bound
+
+
+def range_bounds(filters):
+    """{range filter name: number} for the range filters that are set; 0 is a valid bound."""
+    return {name: range_bound(name, filters[name]) for name in RANGE_FILTERS
+            if filters.get(name) is not None and filters.get(name) != ""}
+
+
+def build_search_query(filters):
+    """
+    Builds the search query for the given filters.
+
+    :param filters: dict with any of the SEARCH_FILTERS and RANGE_FILTERS keys; empty values are ignored.
+    :return: (query, params) tuple.
+    """
+    conditions, params = filter_conditions(filters)
+    return SEARCH_QUERY + conditions, params
+
+
+def filter_conditions(filters):
+    """" AND ..." conditions (over car_search) and params for the non-empty filters."""
+    conditions = ""
+    params = []
+    for name, condition in SEARCH_FILTERS.items():
+        value = filters.get(name)
+        if value:
+            conditions += f" AND {condition}"
+            params.append(value)
+    ranges = []
+    for name, bound in range_bounds(filters).items():
+        column, operator = RANGE_FILTERS[name]
+        ranges.append(f"{column} {operator} ?")
+        params.append(bound)
+    if ranges:
+        conditions += f" AND car_search.id IN (SELECT id FROM Specifications WHERE {' AND '.join(ranges)})"
+    return conditions, tuple(params)
+
+
+def search_cars(filters):
+    query, params = build_search_query(filters)
+    return db.fetchall(query, params)
+
+
+def iter_search(filters, fetch_size=FETCH_SIZE):
+    """
+    Yields the search rows for the filters in lists of up to fetch_size rows.
+
+    The rows are read with fetchmany() from one cursor, so memory use stays
+    flat however many rows match, and they all come from one snapshot of the
+    database. They come in no particular order: sorting would hold them all.
+    """
+    query, params = build_search_query(filters)
+    cursor = db.execute(query, params)
+    try:
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                return
+            yield rows
+    finally:
+        cursor.close()
+
+
+def encode_page_token(last_id):
+    return base64.urlsafe_b64encode(json.dumps({"after": last_id}).encode()).decode()
+
+
+def decode_page_token(token):
+    try:
+        last_id = json.loads(base64.urlsafe_b64decode(token.encode()))["after"]
+    except (ValueError, TypeError, KeyError):
+        raise ValueError("Invalid continuation token.")
+    if not isinstance(last_id, int):
+        raise ValueError("Invalid continuation token.")
+    return last_id
+
+
+def search_page(filters, page_size=PAGE_SIZE, token=None):
+    """
+    Returns one page of search results in specification id order.
+
+    Pages are located by keyset (id > last id of the previous page), so every
+    page costs the same no matter how deep into the result it is.
+
+    :param filters: same as build_search_query().
+    :param page_size: maximum number of rows in the page.
+    :param token: continuation token from the previous page, or None for the first page.
+    :return: (rows, next_token); next_token is None on the last page.
+    """
+    query, params = build_search_query(filters)
+    if token is not None:
+        query += " AND car_search.id > ?"
+        params += (decode_page_token(token),)
+    # One extra row tells whether another page exists
+    query += " ORDER BY car_search.id LIMIT ?"
+    rows = db.fetchall(query, params + (page_size + 1,))
+
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        return rows, encode_page_token(rows[-1][SEARCH_ID_COLUMN])
+    return rows, None
+
+
+def search_rows(ids, filters=None):
+    """Search rows of the given specification ids that also match the filters, in id order."""
+    conditions, params = filter_conditions(filters or {})
+    query = SEARCH_QUERY + " AND car_search.id IN (SELECT value FROM json_each(?))" + conditions
+    return db.fetchall(query + " ORDER BY car_search.id", (json.dumps([int(i) for i in ids]),) + params)
+
+
+def iter_search_ids(filters, after=None, fetch_size=FETCH_SIZE):
+    """Yields lists of the ids matching the filters, in id order, starting after the given id."""
+    conditions, params = filter_conditions(filters)
+    query = "SELECT car_search.id FROM car_search WHERE 1=1" + conditions
+    if after is not None:
+        query += " AND car_search.id > ?"
+        params += (after,)
+    cursor = db.execute(query + " ORDER BY car_search.id", params)
+    try:
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                return
+            yield [row[0] for row in rows]
+    finally:
+        cursor.close()
+
+
+CAR_QUERY = SEARCH_COLUMNS + """,
+        Specifications.price AS Price
+    FROM
+        car_search
+    INNER JOIN
+        Specifications ON Specifications.id = car_search.id
+    WHERE car_search.id = ?
+"""
+
+
+def get_car(specification_id):
+    """Search row of one specification followed by its price, or None if it does not exist."""
+    return db.fetchone(CAR_QUERY, (specification_id,))
+
+
+# Grouping of the inventory statistics: inventory_stats.dimension -> the search filter of its values
+STATS_DIMENSIONS = ("brand", "car_class", "body_type")
+
+# One inventory_stats row per value: number of cars, then min / average / max price and horse power.
+# Averages are sum / count, kept up to date by the triggers, so the statistics are read in one pass.
+STATS_QUERY = """
+    SELECT value, cars,
+           price_min, price_sum / NULLIF(price_count, 0), price_max,
+           horse_power_min, horse_power_sum / NULLIF(horse_power_count, 0), horse_power_max
+    FROM inventory_stats
+    WHERE dimension = ?
+    ORDER BY value
+"""
+
+
+def get_statistics(dimension):
+    """
+    Inventory statistics grouped by one of STATS_DIMENSIONS.
+
+    :return: list of (value, cars, min price, average price, max price, min hp, average hp, max hp);
+             value is '' for cars without one.
+    """
+    if dimension not in STATS_DIMENSIONS:
+        raise ValueError(f"Unknown statistics grouping: {dimension}.")
+    return db.fetchall(STATS_QUERY, (dimension,))
+
+
+def fts_query(text):
+    """
+    Turns free text into an FTS5 query where every word is a prefix, e.g. "bmw x5 g0".
+
+    :return: the MATCH expression, or None if the text has no words.
+    """
+    words = text.split()
+    if not words:
+        return None
+    return " ".join('"' + word.replace('"', '""') + '"*' for word in words)
+
+
+def text_search(text, limit=TEXT_SEARCH_LIMIT):
+    """Search rows whose brand, model, generation or specification text matches, best bm25 rank first."""
+    query = fts_query(text)
+    if query is None:
+        return []
+    return db.fetchall(TEXT_SEARCH_QUERY, (query, limit))
+
+
+def suggest(text, limit=10):
+    """Distinct "brand model generation" completions for the text, best matches first."""
+    query = fts_query(text)
+    if query is None:
+        return []
+    suggestions = []
+    for parts in db.fetchall("""
+        SELECT mark, model, generation FROM car_fts
+        WHERE car_fts MATCH ?
+        ORDER BY rank
+        LIMIT ?
+    """, (query, limit * 20)):
+        suggestion = " ".join(part for part in parts if part)
+        if suggestion not in suggestions:
+            suggestions.append(suggestion)
+            if len(suggestions) == limit:
+                break
+    return suggestions
+
+
+# ---------------------------------------------------------------- Edit cascade
+
+def get_marks():
+    return db.fetchall("SELECT id, name FROM Marks")
+
+
+def get_models(mark_id):
+    return db.fetchall("SELECT id, name FROM Models WHERE mark_id = ?", (mark_id,))
+
+
+def get_generations(model_id):
+    return db.fetchall("SELECT id, name FROM Generations WHERE model_id = ?", (model_id,))
+
+
+def get_specifications(model_id, generation_id=None):
+    """Specifications of a model, narrowed to a generation when given (unlinked rows are always included)."""
+    if generation_id:
+        return db.fetchall("""
+            SELECT id, engine_type FROM Specifications
+            WHERE model_id = ? AND (generation_id = ? OR generation_id IS NULL)
+        """, (model_id, generation_id))
+    return db.fetchall("SELECT id, engine_type FROM Specifications WHERE model_id = ?", (model_id,))
+
+
+# ---------------------------------------------------------------- Natural keys
+
+# Specifications columns identifying a catalogue modification, with their SQLite affinity.
+# Price is dealer data, not catalogue data, so it is not part of the key.
+FINGERPRINT_COLUMNS = (
+    ("engine_type", "TEXT"),
+    ("horse_power", "INTEGER"),
+    ("transmission", "TEXT"),
+    ("drive", "TEXT"),
+    ("volume", "REAL"),
+    ("consumption_mixed", "REAL"),
+    ("max_speed", "INTEGER"),
+)
+
+
+def with_affinity(value, affinity):
+    """Converts a value the way SQLite does on insert into a column with the given affinity."""
+    if value is None:
+        return None
+    if affinity == "TEXT":
+        return value if isinstance(value, str) else str(value)
+    if isinstance(value, str):
+        try:
+            value = float(value)
+        except ValueError:
+            return value
+    if isinstance(value, float) and affinity == "INTEGER" and value.is_integer():
+        return int(value)
+    if isinstance(value, int) and affinity == "REAL":
+        return float(value)
+    return value
+
+
+def specification_fingerprints(rows):
+    """
+    Natural keys for the specifications of one generation.
+
+    :param rows: sequences starting with the FINGERPRINT_COLUMNS values, in catalogue order.
+    :return: one fingerprint per row; identical modifications get an occurrence suffix.
+    """
+    seen = {}
+    fingerprints = []
+    for row in rows:
+        values = [with_affinity(value, affinity) for value, (column, affinity) in zip(row, FINGERPRINT_COLUMNS)]
+        digest = hashlib.sha1(json.dumps(values, ensure_ascii=False).encode()).hexdigest()[:20]
+        seen[digest] = seen.get(digest, 0) + 1
+        fingerprints.append(digest if seen[digest] == 1 else f"{digest}#{seen[digest]}")
+    return fingerprints
+
+
+# ---------------------------------------------------------------- Writes
+
+@retry_on_busy
+def add_car(main, styling, specs):
+    """
+    Inserts a mark (if new), model, generation and specification in one transaction.
+
+    :param main: NewCarForm main fields.
+    :param styling: NewCarForm generation fields.
+    :param specs: NewCarForm additional specification fields.
+    """
+    with db.transaction() as cursor:
+        insert_car(cursor, main, styling, specs)
+
+
+def insert_car(cursor, main, styling, specs):
+    """add_car() within the caller's transaction; returns the new Specifications id."""
+    # Insert or get brand ID
+    cursor.execute("""
+        INSERT OR IGNORE INTO Marks (name, country)
+        VALUES (?, ?)
+    """, (main["mark_name"], main["country"]))
+    cursor.execute("SELECT id FROM Marks WHERE name = ?", (main["mark_name"],))
+    mark_id = cursor.fetchone()[0]
+
+    # Insert or get model ID
+    cursor.execute("""
+        INSERT INTO Models (name, year_from, year_to, class, body_type, mark_id)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (mark_id, name) DO NOTHING
+    """, (main["model_name"], main["year_from"], main["year_to"], main["car_class"], main["body_type"],
+          mark_id))
+    cursor.execute("SELECT id FROM Models WHERE mark_id = ? AND name = ?", (mark_id, main["model_name"]))
+    model_id = cursor.fetchone()[0]
+
+    # Insert or get generation ID
+    cursor.execute("""
+        INSERT INTO Generations (name, year_start, year_stop, model_id)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (model_id, name) DO NOTHING
+    """, (styling.get("generation"), styling.get("generation_year_from"), styling.get("generation_year_to"),
+          model_id))
+    cursor.execute("SELECT id FROM Generations WHERE model_id = ? AND name IS ? ORDER BY id DESC LIMIT 1",
+                   (model_id, styling.get("generation")))
+    generation_id = cursor.fetchone()[0]
+
+    # Insert specifications
+    cursor.execute("""
+        INSERT INTO Specifications (engine_type, transmission, volume, consumption_mixed, max_speed, drive, horse_power, model_id, generation_id, price)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (
+        specs.get("engine_type"), specs.get("transmission"), specs.get("volume"),
+        specs.get("consumption_mixed"), specs.get("max_speed"), specs.get("drive"),
+        specs.get("horse_power"), model_id, generation_id, main["price"]
+    ))
+    return cursor.lastrowid
+
+
+@retry_on_busy
+def update_records(changes):
+    """
+    Applies column updates to single rows.
+
+    :param changes: iterable of (table, column, value, row_id); table and column
+                    must come from inventory.EDITABLE_COLUMNS.
+    """
+    with db.transaction() as cursor:
+        update_rows(cursor, changes)
+
+
+def update_rows(cursor, changes):
+    """update_records() within the caller's transaction; returns the number of rows changed."""
+    updated = 0
+    for table, column, value, row_id in changes:
+        cursor.execute(f"UPDATE {table} SET {column} = ? WHERE id = ?", (value, row_id))
+        updated += cursor.rowcount
+    return updated
+
+
+@retry_on_busy
+def delete_specification(specification_id):
+    """Deletes one Specifications row; returns False if it does not exist."""
+    with db.transaction() as cursor:
+        return delete_specification_row(cursor, specification_id)
+
+
+def delete_specification_row(cursor, specification_id):
+    """delete_specification() within the caller's transaction."""
+    cursor.execute("DELETE FROM Specifications WHERE id = ?", (specification_id,))
+    return cursor.rowcount > 0
+
+
+# ---------------------------------------------------------------- Bulk deletes and updates
+
+def build_selection_query(ids=(), ranges=(), filters=None):
+    """
+    Builds a query for the ids of the specifications to delete.
+
+    :param ids: specification ids.
+    :param ranges: (first, last) id ranges, both ends included.
+    :param filters: same as build_search_query(); with ids or ranges, only the
+                    specifications matching both are selected.
+    :return: (query, params) tuple.
+    """
+    conditions, params = filter_conditions(filters or {})
+    # car_search is only needed by the filters; without them, rows whose model is gone still match
+    table = "car_search" if conditions else "Specifications"
+    query = f"SELECT {table}.id FROM {table} WHERE 1=1"
+    id_conditions = []
+    id_params = []
+    if ids:
+        # One parameter however many ids there are
+        id_conditions.append(f"{table}.id IN (SELECT value FROM json_each(?))")
+        id_params.append(json.dumps(list(ids)))
+    for first, last in ranges:
+        id_conditions.append(f"{table}.id BETWEEN ? AND ?")
+        id_params += [first, last]
+    if id_conditions:
+        query += " AND (" + " OR ".join(id_conditions) + ")"
+    return query + conditions, tuple(id_params) + params
+
+
+def select_specifications(cursor, selection):
+    """
+    Stores the ids a selection query returns in temp.selected_ids.
+
+    Bulk changes then act on the rows selected before they started, even
+    if they change the columns the selection filtered on.
+    """
+    query, params = selection
+    cursor.execute("DROP TABLE IF EXISTS temp.selected_ids")
+    cursor.execute("CREATE TEMP TABLE selected_ids (id INTEGER PRIMARY KEY)")
+    cursor.execute("INSERT INTO temp.selected_ids " + query, params)
+
+
+# Table -> temp table select_deletions() fills with the ids to delete
+DELETED_ROWS = {
+    "Specifications": "temp.selected_ids",
+    "Generations": "temp.deleted_generations",
+    "Models": "temp.deleted_models",
+    "Marks": "temp.deleted_marks",
+}
+
+
+@retry_on_busy
+def delete_specifications(selection, cleanup=False, dry_run=False):
+    """
+    Deletes every specification a selection query returns, in one transaction.
+
+    :param selection: (query, params) from build_selection_query().
+    :param cleanup: also delete the generations, models and marks left without specifications.
+    :param dry_run: only count the rows that would be deleted, without taking the write lock.
+    :return: dict of rows deleted per table: specifications, generations, models, marks.
+    """
+    if not dry_run:
+        with db.transaction() as cursor:
+            return delete_specification_rows(cursor, selection, cleanup)
+    counts = dict.fromkeys(("specifications", "generations", "models", "marks"), 0)
+    with db.read_transaction() as cursor:
+        select_deletions(cursor, selection, cleanup)
+        for table in DELETED_ROWS if cleanup else ("Specifications",):
+            cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE id IN (SELECT id FROM {DELETED_ROWS[table]})")
+            counts[table.lower()] = cursor.fetchone()[0]
+    return counts
+
+
+def select_deletions(cursor, selection, cleanup=False):
+    """
+    Fills the DELETED_ROWS temp tables with the ids delete_specifications() removes.
+
+    Without cleanup, only temp.selected_ids is filled.
+    """
+    select_specifications(cursor, selection)
+    if not cleanup:
+        return
+    # Parents of the deleted rows; only these can become empty
+    cursor.execute("DROP TABLE IF EXISTS temp.delete_parents")
+    cursor.execute("""
+        CREATE TEMP TABLE delete_parents AS
+        SELECT DISTINCT Specifications.generation_id, Specifications.model_id, Models.mark_id
+        FROM Specifications
+        LEFT JOIN Models ON Models.id = Specifications.model_id
+        WHERE Specifications.id IN (SELECT id FROM temp.selected_ids)
+    """)
+    # Generations left without cars: those of the deleted rows, and every generation of a
+    # model left without cars (most rows of an older catalogue have no generation_id)
+    cursor.execute("DROP TABLE IF EXISTS temp.deleted_generations")
+    cursor.execute("""
+        CREATE TEMP TABLE deleted_generations AS
+        SELECT id FROM Generations
+        WHERE NOT EXISTS (SELECT 1 FROM Specifications WHERE generation_id = Generations.id
+                          AND id NOT IN (SELECT id FROM temp.selected_ids))
+          AND (id IN (SELECT generation_id FROM temp.delete_parents)
+               OR model_id IN (SELECT model_id FROM temp.delete_parents
+                               WHERE NOT EXISTS (SELECT 1 FROM Specifications
+                                                 WHERE Specifications.model_id = delete_parents.model_id
+                                                   AND id NOT IN (SELECT id FROM temp.selected_ids))))
+    """)
+    cursor.execute("DROP TABLE IF EXISTS temp.deleted_models")
+    cursor.execute("""
+        CREATE TEMP TABLE deleted_models AS
+        SELECT id FROM Models
+        WHERE id IN (SELECT model_id FROM temp.delete_parents)
+          AND NOT EXISTS (SELECT 1 FROM Specifications WHERE model_id = Models.id
+                          AND id NOT IN (SELECT id FROM temp.selected_ids))
+          AND NOT EXISTS (SELECT 1 FROM Generations WHERE model_id = Models.id
+                          AND id NOT IN (SELECT id FROM temp.deleted_generations))
+    """)
+    cursor.execute("DROP TABLE IF EXISTS temp.deleted_marks")
+    cursor.execute("""
+        CREATE TEMP TABLE deleted_marks AS
+        SELECT id FROM Marks
+        WHERE id IN (SELECT mark_id FROM temp.delete_parents)
+          AND NOT EXISTS (SELECT 1 FROM Models WHERE mark_id = Marks.id
+                          AND id NOT IN (SELECT id FROM temp.deleted_models))
+    """)
+    cursor.execute("DROP TABLE temp.delete_parents")
+
+
+def delete_specification_rows(cursor, selection, cleanup=False):
+    """delete_specifications() within the caller's transaction."""
+    counts = dict.fromkeys(("specifications", "generations", "models", "marks"), 0)
+    select_deletions(cursor, selection, cleanup)
+    # Children before their parents
+    for table in DELETED_ROWS if cleanup else ("Specifications",):
+        cursor.execute(f"DELETE FROM {table} WHERE id IN (SELECT id FROM {DELETED_ROWS[table]})")
+        counts[table.lower()] = cursor.rowcount
+        cursor.execute(f"DROP TABLE {DELETED_ROWS[table]}")
+    return counts
+
+
+# Bulk change operation -> SET expression
+BULK_OPERATIONS = {
+    "set": "{column} = ?",
+    "add": "{column} = {column} + ?",
+    "multiply": "{column} = {column} * ?",
+}
+
+# Products are rounded in INTEGER columns, so 100 hp * 1.05 is stored as 105, not 105.0
+ROUNDED_MULTIPLY = "{column} = CAST(ROUND({column} * ?) AS INTEGER)"
+
+# Table -> ids of its rows linked to the specifications in temp.selected_ids
+LINKED_ROWS = {
+    "specifications": "SELECT id FROM temp.selected_ids",
+    "generations": """
+        SELECT generation_id FROM Specifications WHERE id IN (SELECT id FROM temp.selected_ids)
+    """,
+    "models": """
+        SELECT model_id FROM Specifications WHERE id IN (SELECT id FROM temp.selected_ids)
+    """,
+    "marks": """
+        SELECT Models.mark_id FROM Specifications
+        JOIN Models ON Models.id = Specifications.model_id
+        WHERE Specifications.id IN (SELECT id FROM temp.selected_ids)
+    """,
+}
+
+
+@retry_on_busy
+def bulk_update(selection, changes, dry_run=False):
+    """
+    Applies column changes to every row linked to the selected specifications,
+    with one UPDATE per table, in one transaction.
+
+    :param selection: (query, params) from build_selection_query().
+    :param changes: iterable of (table, column, operation, value); operation is a
+                    BULK_OPERATIONS key; table and column must come from
+                    inventory.EDITABLE_COLUMNS.
+    :param dry_run: only count the rows that would be updated, without taking the write lock.
+    :return: dict of rows updated per changed table.
+    """
+    if not dry_run:
+        with db.transaction() as cursor:
+            return bulk_update_rows(cursor, selection, changes)
+    counts = {}
+    with db.read_transaction() as cursor:
+        select_specifications(cursor, selection)
+        for table, column, operation, value in changes:
+            if table not in counts:
+                cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE id IN ({LINKED_ROWS[table]})")
+                counts[table] = cursor.fetchone()[0]
+    return counts
+
+
+def bulk_update_rows(cursor, selection, changes):
+    """bulk_update() within the caller's transaction."""
+    assignments = {}
+    for table, column, operation, value in changes:
+        assignments.setdefault(table, []).append((column, operation, value))
+
+    select_specifications(cursor, selection)
+    counts = {}
+    for table, columns in assignments.items():
+        cursor.execute(f"PRAGMA table_info({table})")
+        integer_columns = {row[1] for row in cursor.fetchall() if row[2].upper() == "INTEGER"}
+        expressions = []
+        params = []
+        for column, operation, value in columns:
+            template = ROUNDED_MULTIPLY if operation == "multiply" and column in integer_columns \
+                else BULK_OPERATIONS[operation]
+            expressions.append(template.format(column=column))
+            params.append(value)
+        cursor.execute(f"UPDATE {table} SET {', '.join(expressions)} WHERE id IN ({LINKED_ROWS[table]})", params)
+        counts[table] = cursor.rowcount
+    cursor.execute("DROP TABLE temp.selected_ids")
+    return counts
@@ -1,126 +1,653 @@
-import sqlite3
+import argparse
 import json
+import multiprocessing
+import queue
 import random
+import re
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import database
+import migrations
+
+DEFAULT_JSON_PATH = 'base_demo.json'
+DEFAULT_DB_PATH = 'cars.db'
+
+# Rows buffered before they are written in one transaction
+BATCH_SIZE = 10000
+
+# Characters read from the JSON file at a time
+READ_SIZE = 1 << 20
+
+# Parallel import: chunks of marks (at least READ_SIZE characters each) in
+# flight per transform worker, and normalized marks waiting for the writer,
+# before the earlier stage blocks
+CHUNKS_PER_WORKER = 4
+WRITER_QUEUE_SIZE = 64
+
+CATALOGUE_TABLES = ("Marks", "Models", "Generations", "Specifications")
+
+# Tables derived from the catalogue; a bulk load fills them afterwards (see catch_up_search_index)
+DERIVED_TABLES = ("car_search",)
+
+INSERT_QUERIES = {
+    "Marks": 'INSERT INTO Marks (id, name, country) VALUES (?, ?, ?)',
+    "Models": 'INSERT INTO Models (id, name, class, year_from, year_to, body_type, mark_id) VALUES (?, ?, ?, ?, ?, ?, ?)',
+    "Generations": 'INSERT INTO Generations (id, name, year_start, year_stop, model_id) VALUES (?, ?, ?, ?, ?)',
+    "Specifications": 'INSERT INTO Specifications (id, engine_type, horse_power, transmission, drive, volume, consumption_mixed, max_speed, price, fingerprint, model_id, generation_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+}
+
+# Affinities of the attributes compared during sync (the columns set by UPDATE_QUERIES)
+SYNC_AFFINITIES = {
+    "Marks": ("TEXT",),
+    "Models": ("TEXT", "INTEGER", "INTEGER", "TEXT"),
+    "Generations": ("INTEGER", "INTEGER"),
+}
+
+UPDATE_QUERIES = {
+    "Marks": 'UPDATE Marks SET country = ? WHERE id = ?',
+    "Models": 'UPDATE Models SET class = ?, year_from = ?, year_to = ?, body_type = ? WHERE id = ?',
+    "Generations": 'UPDATE Generations SET year_start = ?, year_stop = ? WHERE id = ?',
+    "Specifications": 'UPDATE Specifications SET generation_id = ?, fingerprint = ? WHERE id = ?',
+}
+
+
+def iter_marks(path, read_size=READ_SIZE):
+    """
+    Yields the marks of a JSON dump one at a time.
+
+    The dump is a JSON array of marks; only the mark being decoded (plus one
+    read buffer) is held in memory, never the whole file.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as file:
+        buffer = file.read(read_size).lstrip()
+        if not buffer.startswith('['):
+            raise ValueError(f"{path}: expected a JSON array of marks.")
+        buffer = buffer[1:]
+        eof = False
+
+        while True:
+            buffer = buffer.lstrip()
+            if buffer.startswith(','):
+                buffer = buffer[1:].lstrip()
+            if buffer.startswith(']'):
+                return
+            try:
+                mark, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # The mark is incomplete; read at least as much again as is buffered
+                chunk = file.read(max(read_size, len(buffer)))
+                eof = not chunk
+                buffer += chunk
+                continue
+            yield mark
+            buffer = buffer[end:]
+
+
+# Skips strings and other characters up to the next bracket, which it captures;
+# brackets inside strings are skipped with the string
+_STRING = r'"[^"\\]*(?:\\.[^"\\]*)*"'
+_NEXT_BRACKET = re.compile(rf'[^"{{}}\[\]]*(?:{_STRING}[^"{{}}\[\]]*)*([{{}}\[\]])')
+
+
+def iter_mark_texts(path, chunk_size=READ_SIZE, read_size=READ_SIZE):
+    """
+    Yields the marks of a JSON dump as undecoded text, several marks per chunk.
+
+    Only brackets are tracked, so this is much cheaper than iter_marks(); each
+    chunk is decoded with decode_mark_text(), e.g. in a worker process.
+
+    :param chunk_size: marks are added to a chunk until it is at least this long.
+    :return: iterator of "mark, mark, ..." strings.
+    """
+    with open(path, 'r', encoding='utf-8') as file:
+        buffer = file.read(read_size).lstrip()
+        if not buffer.startswith('['):
+            raise ValueError(f"{path}: expected a JSON array of marks.")
+        position = 1
+        depth = 1
+        chunk_start = None
+        while True:
+            match = _NEXT_BRACKET.match(buffer, position)
+            if match is None:
+                # The next bracket, or the end of a string, is not read yet
+                start = position if chunk_start is None else chunk_start
+                buffer, position = buffer[start:], position - start
+                if chunk_start is not None:
+                    chunk_start = 0
+                chunk = file.read(max(read_size, len(buffer)))
+                if not chunk:
+                    raise ValueError(f"{path}: unexpected end of the JSON array.")
+                buffer += chunk
+                continue
+            bracket = match.group(1)
+            position = match.end()
+            if bracket in '{[':
+                if depth == 1 and chunk_start is None:
+                    chunk_start = position - 1
+                depth += 1
+                continue
+            depth -= 1
+            if depth == 0:
+                if chunk_start is not None:
+                    yield buffer[chunk_start:position - 1]
+                return
+            if depth == 1 and position - chunk_start >= chunk_size:
+                yield buffer[chunk_start:position]
+                buffer, position, chunk_start = buffer[position:], 0, None
+
+
+def decode_mark_text(text):
+    """Decodes an iter_mark_texts() chunk into its marks."""
+    return json.loads(f"[{text}]")
+
+
+def random_price():
+    # Dumps normally carry no price; synthetic ones (generate_catalogue.py) do
+    return random.randint(20, 500) * 100  # Generate a random price rounded to 100
 
-# Load data from the JSON file
-with open('base_demo.json', 'r', encoding='utf-8') as file:
-    data = json.load(file)
-
-# Create a connection to SQLite and a cursor
-with sqlite3.connect('cars.db') as conn:
-    cursor = conn.cursor()
-
-    # Create tables
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS Marks (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT,
-            country TEXT
-        )
-    ''')
-
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS Models (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT,
-            class TEXT,
-            year_from INTEGER,
-            year_to INTEGER,
-            body_type TEXT,
-            mark_id INTEGER,
-            FOREIGN KEY (mark_id) REFERENCES Marks(id)
-        )
-    ''')
-
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS Generations (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT,
-            year_start INTEGER,
-            year_stop INTEGER,
-            model_id INTEGER,
-            FOREIGN KEY (model_id) REFERENCES Models(id)
-        )
-    ''')
-
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS Specifications (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            engine_type TEXT,
-            horse_power INTEGER,
-            transmission TEXT,
-            drive TEXT,
-            volume REAL,
-            consumption_mixed REAL,
-            max_speed INTEGER,
-            price REAL,
-            model_id INTEGER,
-            FOREIGN KEY (model_id) REFERENCES Models(id)
-        )
-    ''')
-
-    # Function to insert data
-    def insert_data():
-        for mark in data:
-            # Insert mark and get its id
-            cursor.execute(
-                'INSERT INTO Marks (name, country) VALUES (?, ?)',
-                (mark.get('name'), mark.get('country'))
-            )
-            mark_id = cursor.lastrowid  # Get the generated id of the mark
-
-            for model in mark.get('models', []):
-                # Get body_type from the first generation
-                body_type = (
-                    model.get('generations', [{}])[0]
-                    .get('configurations', [{}])[0]
-                    .get('body-type')
-                )
-                cursor.execute(
-                    'INSERT INTO Models (name, class, year_from, year_to, body_type, mark_id) VALUES (?, ?, ?, ?, ?, ?)',
-                    (
-                        model.get('name'),
-                        model.get('class'),
-                        model.get('year-from'),
-                        model.get('year-to'),
-                        body_type,
-                        mark_id
+
+def first_body_type(model):
+    # Get body_type from the first configuration of the first generation
+    generations = model.get('generations') or [{}]
+    configurations = generations[0].get('configurations') or [{}]
+    return configurations[0].get('body-type')
+
+
+def normalize_mark(mark):
+    """
+    Converts one mark of the dump into row tuples without ids.
+
+    :return: (mark_row, [(model_row, [(generation_row, [specification_row, ...]), ...]), ...]);
+             every specification row ends with its fingerprint (see database.specification_fingerprints).
+    """
+    models = []
+    for model in mark.get('models', []):
+        generations = []
+        for generation in model.get('generations', []):
+            specifications = []
+            for configuration in generation.get('configurations', []):
+                for modification in configuration.get('modifications', []):
+                    specs = modification.get('specifications', {})
+                    specifications.append((
+                        specs.get('engine-type'),
+                        specs.get('horse-power'),
+                        specs.get('transmission'),
+                        specs.get('drive'),
+                        specs.get('volume'),
+                        specs.get('consumption-mixed'),
+                        specs.get('max-speed'),
+                        specs['price'] if specs.get('price') is not None else random_price(),
+                    ))
+            fingerprints = database.specification_fingerprints(specifications)
+            generations.append((
+                (generation.get('name'), generation.get('year-start'), generation.get('year-stop')),
+                [row + (fingerprint,) for row, fingerprint in zip(specifications, fingerprints)]
+            ))
+        models.append((
+            (model.get('name'), model.get('class'), model.get('year-from'), model.get('year-to'),
+             first_body_type(model)),
+            generations
+        ))
+    return (mark.get('name'), mark.get('country')), models
+
+
+class BatchWriter:
+    """
+    Buffers normalized marks and writes them with executemany, one transaction per batch.
+
+    Ids are assigned here rather than taken from lastrowid, so that whole
+    batches can be inserted at once with their foreign keys already set.
+    """
+
+    def __init__(self, conn, batch_size=BATCH_SIZE):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.next_ids = {
+            table: conn.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table}").fetchone()[0]
+            for table in CATALOGUE_TABLES
+        }
+        self.first_ids = dict(self.next_ids)
+        self.pending = {table: [] for table in CATALOGUE_TABLES}
+        self.pending_count = 0
+        self.written = 0
+
+    def _new_id(self, table):
+        row_id = self.next_ids[table]
+        self.next_ids[table] += 1
+        return row_id
+
+    def add_mark(self, normalized_mark):
+        mark_row, models = normalized_mark
+        mark_id = self._new_id("Marks")
+        self.pending["Marks"].append((mark_id,) + mark_row)
+        count = 1
+
+        for model_row, generations in models:
+            model_id = self._new_id("Models")
+            self.pending["Models"].append((model_id,) + model_row + (mark_id,))
+            count += 1
+
+            for generation_row, specifications in generations:
+                generation_id = self._new_id("Generations")
+                self.pending["Generations"].append((generation_id,) + generation_row + (model_id,))
+                count += 1
+
+                for specification_row in specifications:
+                    self.pending["Specifications"].append(
+                        (self._new_id("Specifications"),) + specification_row + (model_id, generation_id)
                     )
-                )
-                model_id = cursor.lastrowid  # Get the id of the model
-
-                for generation in model.get('generations', []):
-                    cursor.execute(
-                        'INSERT INTO Generations (name, year_start, year_stop, model_id) VALUES (?, ?, ?, ?)',
-                        (
-                            generation.get('name'),
-                            generation.get('year-start'),
-                            generation.get('year-stop'),
-                            model_id
-                        )
+                count += len(specifications)
+
+        self.pending_count += count
+        if self.pending_count >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending_count:
+            return
+        with self.conn:
+            for table in CATALOGUE_TABLES:
+                if self.pending[table]:
+                    self.conn.executemany(INSERT_QUERIES[table], self.pending[table])
+                    self.pending[table] = []
+        self.written += self.pending_count
+        self.pending_count = 0
+
+
+class SyncWriter(BatchWriter):
+    """
+    Merges normalized marks into existing rows by natural key instead of appending them.
+
+    Marks are matched by name, models by mark + name, generations by model + name
+    and specifications by generation + fingerprint. Specifications stored without
+    a generation or fingerprint are matched by model + fingerprint of their
+    values instead, and get both filled in. Only new rows are inserted and
+    only rows whose attributes differ are updated; prices of existing
+    specifications are never touched. Nothing is deleted.
+    """
+
+    def __init__(self, conn, batch_size=BATCH_SIZE):
+        super().__init__(conn, batch_size)
+        self.marks = {name: (mark_id, country) for mark_id, name, country in
+                      conn.execute("SELECT id, name, country FROM Marks WHERE name IS NOT NULL")}
+        self.updates = {table: [] for table in UPDATE_QUERIES}
+        self.synced_mark_ids = set()
+        self.stats = {"inserted": 0, "updated": 0, "unchanged": 0}
+
+    def _existing_children(self, mark_id):
+        """Models, generations and fingerprints already stored under a mark, keyed by natural key."""
+        models = {name: (model_id, attributes) for model_id, name, *attributes in self.conn.execute(
+            "SELECT id, name, class, year_from, year_to, body_type FROM Models WHERE mark_id = ?", (mark_id,))}
+        generations = {(model_id, name): (generation_id, attributes)
+                       for generation_id, model_id, name, *attributes in self.conn.execute("""
+            SELECT Generations.id, Generations.model_id, Generations.name,
+                   Generations.year_start, Generations.year_stop
+            FROM Generations JOIN Models ON Models.id = Generations.model_id
+            WHERE Models.mark_id = ?
+        """, (mark_id,))}
+        fingerprints = set(self.conn.execute("""
+            SELECT Specifications.generation_id, Specifications.fingerprint
+            FROM Specifications JOIN Models ON Models.id = Specifications.model_id
+            WHERE Models.mark_id = ? AND Specifications.fingerprint IS NOT NULL
+              AND Specifications.generation_id IS NOT NULL
+        """, (mark_id,)))
+        return models, generations, fingerprints, self._unlinked_specifications(mark_id)
+
+    def _unlinked_specifications(self, mark_id):
+        """
+        Specifications under a mark without a generation or fingerprint (older imports).
+
+        :return: {(model_id, fingerprint without occurrence suffix): [(id, generation_id), ...]} in id order.
+        """
+        columns = ", ".join(f"Specifications.{column}" for column, affinity in database.FINGERPRINT_COLUMNS)
+        unlinked = {}
+        for specification_id, model_id, generation_id, *values in self.conn.execute(f"""
+            SELECT Specifications.id, Specifications.model_id, Specifications.generation_id, {columns}
+            FROM Specifications JOIN Models ON Models.id = Specifications.model_id
+            WHERE Models.mark_id = ?
+              AND (Specifications.generation_id IS NULL OR Specifications.fingerprint IS NULL)
+            ORDER BY Specifications.id
+        """, (mark_id,)):
+            fingerprint, = database.specification_fingerprints([values])
+            unlinked.setdefault((model_id, fingerprint), []).append((specification_id, generation_id))
+        return unlinked
+
+    def _link(self, unlinked, model_id, generation_id, fingerprint):
+        """Queues filling in generation and fingerprint of a matching unlinked specification; False if none."""
+        candidates = unlinked.get((model_id, fingerprint.split("#")[0]), [])
+        for position, (specification_id, stored_generation_id) in enumerate(candidates):
+            if stored_generation_id in (None, generation_id):
+                del candidates[position]
+                self.updates["Specifications"].append((generation_id, fingerprint, specification_id))
+                self.stats["updated"] += 1
+                self.pending_count += 1
+                return True
+        return False
+
+    def _merge(self, table, existing, row):
+        """Queues an insert or update for one row; returns its id."""
+        if existing is None:
+            row_id = self._new_id(table)
+            self.pending[table].append((row_id,) + row)
+            self.stats["inserted"] += 1
+            self.pending_count += 1
+            return row_id
+        row_id, attributes = existing
+        affinities = SYNC_AFFINITIES[table]
+        incoming = tuple(database.with_affinity(value, affinity)
+                         for value, affinity in zip(row[1:len(affinities) + 1], affinities))
+        if tuple(attributes) != incoming:
+            self.updates[table].append(incoming + (row_id,))
+            self.stats["updated"] += 1
+            self.pending_count += 1
+        else:
+            self.stats["unchanged"] += 1
+        return row_id
+
+    def add_mark(self, normalized_mark):
+        (name, country), models = normalized_mark
+        existing_mark = self.marks.get(name)
+        if existing_mark and existing_mark[0] in self.synced_mark_ids:
+            # The dump repeats a mark; make its earlier rows visible to the lookups below
+            self.flush()
+
+        mark_id = self._merge("Marks", existing_mark and (existing_mark[0], (existing_mark[1],)),
+                              (name, country))
+        self.marks[name] = (mark_id, country)
+        self.synced_mark_ids.add(mark_id)
+        if existing_mark:
+            existing_models, existing_generations, existing_fingerprints, unlinked = self._existing_children(mark_id)
+        else:
+            existing_models, existing_generations, existing_fingerprints, unlinked = {}, {}, set(), {}
+
+        for model_row, generations in models:
+            model_id = self._merge("Models", existing_models.get(model_row[0]), model_row + (mark_id,))
+            existing_models[model_row[0]] = (model_id, model_row[1:])
+
+            for generation_row, specifications in generations:
+                key = (model_id, generation_row[0])
+                generation_id = self._merge("Generations", existing_generations.get(key),
+                                            generation_row + (model_id,))
+                existing_generations[key] = (generation_id, generation_row[1:])
+
+                for specification_row in specifications:
+                    key = (generation_id, specification_row[-1])
+                    if key in existing_fingerprints:
+                        self.stats["unchanged"] += 1
+                        continue
+                    existing_fingerprints.add(key)
+                    if self._link(unlinked, model_id, generation_id, specification_row[-1]):
+                        continue
+                    self.pending["Specifications"].append(
+                        (self._new_id("Specifications"),) + specification_row + (model_id, generation_id)
                     )
+                    self.stats["inserted"] += 1
+                    self.pending_count += 1
+
+        if self.pending_count >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending_count:
+            return
+        with self.conn:
+            for table in CATALOGUE_TABLES:
+                if self.pending[table]:
+                    self.conn.executemany(INSERT_QUERIES[table], self.pending[table])
+                    self.pending[table] = []
+            for table, rows in self.updates.items():
+                if rows:
+                    self.conn.executemany(UPDATE_QUERIES[table], rows)
+                    self.updates[table] = []
+        self.written += self.pending_count
+        self.pending_count = 0
+
+
+def drop_secondary_objects(conn):
+    """
+    Drops indexes and triggers on the catalogue and derived tables; returns their SQL for restore_objects().
+
+    Unique (natural key) indexes are kept so that the data stays consistent.
+    """
+    tables = CATALOGUE_TABLES + DERIVED_TABLES
+    placeholders = ", ".join("?" for _ in tables)
+    objects = conn.execute(f"""
+        SELECT type, name, sql FROM sqlite_master
+        WHERE type IN ('index', 'trigger') AND sql IS NOT NULL AND tbl_name IN ({placeholders})
+          AND sql NOT LIKE 'CREATE UNIQUE INDEX%'
+    """, tables).fetchall()
+    with conn:
+        for object_type, name, sql in objects:
+            conn.execute(f'DROP {object_type.upper()} "{name}"')
+    return [sql for object_type, name, sql in objects]
+
+
+def restore_objects(conn, statements):
+    with conn:
+        for sql in statements:
+            conn.execute(sql)
+
+
+def catch_up_search_index(conn, first_specification_id):
+    """Adds full-text documents, car_search rows and statistics for specifications imported while the triggers were dropped."""
+    with conn:
+        migrations.fill_search_table(conn.cursor(), "WHERE Specifications.id >= ?", (first_specification_id,))
+        migrations.add_specification_stats(conn.cursor(), "AND Specifications.id >= ?", (first_specification_id,))
+        # The change log missed the import too; ask column_store for a full rebuild
+        conn.execute("INSERT INTO specification_changes (specification_id) VALUES (NULL)")
+        conn.execute("""
+            INSERT INTO car_fts (rowid, mark, model, generation, engine_type, transmission, drive)
+            SELECT Specifications.id, Marks.name, Models.name, Generations.name,
+                   Specifications.engine_type, Specifications.transmission, Specifications.drive
+            FROM Specifications
+            LEFT JOIN Models ON Models.id = Specifications.model_id
+            LEFT JOIN Marks ON Marks.id = Models.mark_id
+            LEFT JOIN Generations ON Generations.id = Specifications.generation_id
+            WHERE Specifications.id >= ?
+        """, (first_specification_id,))
+
+
+class ImportProgress:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.marks = 0
+
+    def rate(self, rows):
+        return rows / max(time.perf_counter() - self.started, 1e-9)
+
+    def report(self, rows, final=False):
+        elapsed = time.perf_counter() - self.started
+        prefix = "Imported" if final else "..."
+        print(f"{prefix} {self.marks} marks, {rows} rows in {elapsed:.1f} s ({self.rate(rows):.0f} rows/sec)")
+
+
+def import_marks(conn, marks, batch_size=BATCH_SIZE):
+    """
+    Bulk-loads normalized marks into an already migrated database.
+
+    Import-time PRAGMAs are set and the catalogue indexes and triggers are
+    dropped for the duration of the load, then restored.
+
+    :param marks: iterable of normalize_mark() results.
+    :return: number of rows written.
+    """
+    journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    synchronous = conn.execute("PRAGMA synchronous").fetchone()[0]
+    conn.execute("PRAGMA journal_mode = MEMORY")
+    conn.execute("PRAGMA synchronous = OFF")
+    saved_objects = drop_secondary_objects(conn)
+
+    writer = BatchWriter(conn, batch_size)
+    progress = ImportProgress()
+    try:
+        for normalized_mark in marks:
+            written = writer.written
+            writer.add_mark(normalized_mark)
+            progress.marks += 1
+            if writer.written != written:
+                progress.report(writer.written)
+        writer.flush()
+    finally:
+        # Whatever was committed stays; bring the schema back either way
+        try:
+            # Before the indexes come back, so they are built once over all the new rows
+            catch_up_search_index(conn, writer.first_ids["Specifications"])
+        finally:
+            restore_objects(conn, saved_objects)
+        conn.execute("ANALYZE")
+        conn.commit()
+        conn.execute(f"PRAGMA synchronous = {synchronous}")
+        conn.execute(f"PRAGMA journal_mode = {journal_mode}")
+
+    progress.report(writer.written, final=True)
+    return writer.written
+
+
+def sync_marks(conn, marks, batch_size=BATCH_SIZE):
+    """
+    Merges normalized marks into the database by natural key (see SyncWriter).
+
+    Indexes and triggers stay in place: the natural-key lookups need them, and
+    a refresh writes few rows.
+
+    :return: dict with the number of inserted, updated and unchanged rows.
+    """
+    writer = SyncWriter(conn, batch_size)
+    progress = ImportProgress()
+    for normalized_mark in marks:
+        writer.add_mark(normalized_mark)
+        progress.marks += 1
+    writer.flush()
+
+    rows = sum(writer.stats.values())
+    print(f"Synced {progress.marks} marks, {rows} rows ({progress.rate(rows):.0f} rows/sec): "
+          f"{writer.stats['inserted']} inserted, {writer.stats['updated']} updated, "
+          f"{writer.stats['unchanged']} unchanged")
+    return writer.stats
+
+
+def load(conn, marks, batch_size=BATCH_SIZE, sync=False):
+    """Bulk-loads into an empty catalogue, otherwise merges by natural key (re-runs never duplicate)."""
+    if sync or conn.execute("SELECT 1 FROM Marks LIMIT 1").fetchone():
+        return sync_marks(conn, marks, batch_size)
+    return import_marks(conn, marks, batch_size)
+
+
+# ---------------------------------------------------------------- Parallel import
+#
+# reader (this process)  -> transform pool        -> writer process
+# iter_mark_texts()         decode_mark_text(),       load()
+#                           normalize_mark()
+#
+# The reader only splits the dump into chunks of marks; the workers decode
+# them, so neither JSON decoding nor pickling decoded marks runs here.
+# Each arrow is bounded: the reader waits when CHUNKS_PER_WORKER chunks per
+# worker are in flight, and workers wait when WRITER_QUEUE_SIZE normalized
+# marks are queued for the writer, so memory stays flat however fast each stage is.
+
+_writer_queue = None
+_writer_failed = None
+
+
+def _init_transform_worker(writer_queue, writer_failed):
+    global _writer_queue, _writer_failed
+    _writer_queue = writer_queue
+    _writer_failed = writer_failed
+    random.seed()  # Forked workers would otherwise all draw the same prices
+
+
+def _transform_marks(text):
+    for mark in decode_mark_text(text):
+        normalized_mark = normalize_mark(mark)
+        while True:
+            try:
+                _writer_queue.put(normalized_mark, timeout=1)
+                break
+            except queue.Full:
+                if _writer_failed.is_set():
+                    raise RuntimeError("The writer process stopped.")
+
+
+def _writer_process(db_path, batch_size, sync, writer_queue, results, writer_failed):
+    # The only process that opens the database
+    conn = sqlite3.connect(db_path)
+    try:
+        results.put(load(conn, iter(writer_queue.get, None), batch_size, sync))
+    except BaseException as e:
+        writer_failed.set()
+        results.put(RuntimeError(f"Writer failed: {e!r}"))
+        raise
+    finally:
+        conn.close()
+
+
+def parallel_load(db_path, json_path, workers, batch_size=BATCH_SIZE, sync=False):
+    """
+    Loads a dump with a pool of transform processes and a single writer process.
+
+    The database must already be migrated.
+    """
+    context = multiprocessing.get_context()
+    writer_queue = context.Queue(maxsize=WRITER_QUEUE_SIZE)
+    results = context.Queue()
+    writer_failed = context.Event()
+    writer = context.Process(target=_writer_process,
+                             args=(db_path, batch_size, sync, writer_queue, results, writer_failed))
+    writer.start()
+
+    try:
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_transform_worker,
+                                 initargs=(writer_queue, writer_failed)) as pool:
+            in_flight = deque()
+            for text in iter_mark_texts(json_path):
+                if len(in_flight) >= workers * CHUNKS_PER_WORKER:
+                    in_flight.popleft().result()
+                in_flight.append(pool.submit(_transform_marks, text))
+            for future in in_flight:
+                future.result()
+    finally:
+        # Let the writer commit what it has and stop, unless it already died
+        if writer.is_alive():
+            writer_queue.put(None)
+
+    result = results.get()
+    writer.join()
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load a JSON catalogue dump into the cars database.")
+    parser.add_argument("json_path", nargs="?", default=DEFAULT_JSON_PATH)
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="SQLite database file (default: cars.db)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="rows per transaction")
+    parser.add_argument("--sync", action="store_true",
+                        help="merge by natural key even into an empty database (the default once it has data)")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="transform processes for a parallel import (default: 0, import in this process)")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    try:
+        # Create tables and indexes
+        migrations.migrate(conn)
+        if not args.workers:
+            load(conn, (normalize_mark(mark) for mark in iter_marks(args.json_path)), args.batch_size, args.sync)
+    finally:
+        conn.close()
+
+    if args.workers:
+        parallel_load(args.db, args.json_path, args.workers, args.batch_size, args.sync)
+
+    print("Data successfully loaded into the database.")
+
 
-                    for configuration in generation.get('configurations', []):
-                        for modification in configuration.get('modifications', []):
-                            specs = modification.get('specifications', {})
-                            random_price = random.randint(20, 500) * 100  # Generate a random price rounded to 100
-                            cursor.execute(
-                                'INSERT INTO Specifications (engine_type, horse_power, transmission, drive, volume, consumption_mixed, max_speed, price, model_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
-                                (
-                                    specs.get('engine-type'),
-                                    specs.get('horse-power'),
-                                    specs.get('transmission'),
-                                    specs.get('drive'),
-                                    specs.get('volume'),
-                                    specs.get('consumption-mixed'),
-                                    specs.get('max-speed'),
-                                    random_price,
-                                    model_id
-                                )
-                            )
-
-    # Insert data
-    insert_data()
-    conn.commit()
-
-print("Data successfully loaded into the database.")
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,38 @@
-from PyQt5.QtWidgets import QDialog, QLabel, QLineEdit, QPushButton, QVBoxLayout, QMessageBox
-import sqlite3
+from PyQt5.QtWidgets import QDialog, QLabel, QLineEdit, QPushButton, QVBoxLayout, QMessageBox, QCheckBox
+
+import inventory
+from workers import BusyIndicator, QueryRunner
 
 
 class DeleteCarForm(QDialog):
-    def __init__(self):
+    def __init__(self, filters=None):
         super().__init__()
         self.setWindowTitle("Delete from Specifications")
+        # Current SearchForm filters, offered as an alternative to typing IDs
+        self.filters = {name: value for name, value in (filters or {}).items() if value}
         self.init_ui()
 
     def init_ui(self):
         layout = QVBoxLayout()
+        self.query_runner = QueryRunner(self)
 
-        # Field for entering ID of Specifications
-        self.label_id = QLabel("Enter the ID of Specifications to delete:")
+        # Field for entering IDs and ranges of Specifications
+        self.label_id = QLabel("Enter the IDs of Specifications to delete:")
         self.input_delete_id = QLineEdit()
-        self.input_delete_id.setPlaceholderText("Specifications ID")
+        self.input_delete_id.setPlaceholderText("e.g. 12, 15, 100-200")
+
+        # Deleting by the search filters instead of (or together with) IDs
+        filters_text = ", ".join(f"{name} = {value}" for name, value in self.filters.items())
+        self.check_filters = QCheckBox(f"Only cars matching the search filters ({filters_text or 'none'})")
+        self.check_filters.setEnabled(bool(self.filters))
+        self.check_filters.setChecked(bool(self.filters))
+
+        self.check_cleanup = QCheckBox("Also delete generations, models and brands left without cars")
 
         # Buttons
+        self.btn_preview = QPushButton("Preview")
+        self.btn_preview.clicked.connect(self.preview)
+
         self.btn_delete = QPushButton("Delete")
         self.btn_delete.clicked.connect(self.delete_specification)
 
@@ -26,44 +42,62 @@ class DeleteCarForm(QDialog):
         # Adding elements to the layout
         layout.addWidget(self.label_id)
         layout.addWidget(self.input_delete_id)
+        layout.addWidget(self.check_filters)
+        layout.addWidget(self.check_cleanup)
+        layout.addWidget(self.btn_preview)
         layout.addWidget(self.btn_delete)
         layout.addWidget(self.btn_cancel)
+        layout.addWidget(BusyIndicator(self.query_runner))
 
         self.setLayout(layout)
 
-    def delete_specification(self):
-        specification_id = self.input_delete_id.text().strip()
-
-        # Check if the ID is numeric
-        if not specification_id.isdigit():
-            QMessageBox.warning(self, "Error", "Please enter a valid Specifications ID.")
-            return
-
+    def delete_cars(self, dry_run, on_result):
+        """Runs (or previews) the delete in the background; on_result gets the counts."""
         try:
-            # Connect to the database
-            conn = sqlite3.connect('cars.db')
-            cursor = conn.cursor()
-
-            # Check if a record with the specified ID exists in the Specifications table
-            cursor.execute("SELECT id FROM Specifications WHERE id = ?", (specification_id,))
-            if not cursor.fetchone():
-                QMessageBox.warning(self, "Error", f"No record found with ID {specification_id} in Specifications.")
-                return
-
-            # Delete the record from the Specifications table
-            cursor.execute("DELETE FROM Specifications WHERE id = ?", (specification_id,))
-
-            # Commit the transaction
-            conn.commit()
+            ids, ranges = inventory.parse_id_list(self.input_delete_id.text())
+        except inventory.ValidationError as e:
+            QMessageBox.warning(self, "Error", str(e))
+            return
+        filters = self.filters if self.check_filters.isChecked() else None
+        self.set_buttons_enabled(False)
+        self.query_runner.submit("delete", inventory.delete_cars,
+                                 (ids, ranges, filters, self.check_cleanup.isChecked(), dry_run),
+                                 on_result=on_result, on_error=self.show_error)
+
+    def set_buttons_enabled(self, enabled):
+        self.btn_preview.setEnabled(enabled)
+        self.btn_delete.setEnabled(enabled)
+
+    def show_error(self, error):
+        self.set_buttons_enabled(True)
+        if isinstance(error, inventory.ValidationError):
+            QMessageBox.warning(self, "Error", str(error))
+        else:
+            QMessageBox.critical(self, "Error", f"Database error: {error}")
+
+    def preview(self):
+        self.delete_cars(True, self.show_preview)
+
+    def show_preview(self, counts):
+        self.set_buttons_enabled(True)
+        QMessageBox.information(self, "Preview", f"Would delete {inventory.format_counts(counts)}.")
 
-            # Notify the user of the successful deletion
-            QMessageBox.information(self, "Success", f"Record with ID {specification_id} was successfully deleted from Specifications.")
+    def delete_specification(self):
+        # Count first, so nothing is deleted without confirmation
+        self.delete_cars(True, self.confirm_delete)
 
-        except sqlite3.Error as e:
-            # Rollback the transaction in case of an error
-            conn.rollback()
-            QMessageBox.critical(self, "Error", f"Database error: {e}")
+    def confirm_delete(self, counts):
+        if not counts["specifications"]:
+            self.set_buttons_enabled(True)
+            QMessageBox.warning(self, "Error", "No matching records found in Specifications.")
+            return
+        answer = QMessageBox.question(self, "Confirm", f"Delete {inventory.format_counts(counts)}?")
+        if answer != QMessageBox.Yes:
+            self.set_buttons_enabled(True)
+            return
+        self.delete_cars(False, self.show_deleted)
 
-        finally:
-            # Close the database connection
-            conn.close()
+    def show_deleted(self, counts):
+        self.set_buttons_enabled(True)
+        # Notify the user of the successful deletion
+        QMessageBox.information(self, "Success", f"Deleted {inventory.format_counts(counts)}.")
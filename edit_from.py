@@ -2,34 +2,13 @@ import sqlite3
 from PyQt5.QtWidgets import (QDialog, QComboBox, QLineEdit, QPushButton, QVBoxLayout,
                              QMessageBox, QFormLayout, QCheckBox, QLabel, QHBoxLayout, QWidget)
 
+import database
+import inventory
+from workers import BusyIndicator, QueryRunner
+
 
 class EditDataForm(QDialog):
-    TABLE_COLUMNS = {
-        "marks": {
-            "name": "Name",
-            "country": "Country"},
-        "models": {
-            "name": "Name",
-            "class": "Car Class",
-            "year_from": "Start Year",
-            "year_to": "End Year",
-            "body_type": "Body Type"
-        },
-        "generations": {
-            "name": "Name",
-            "year_start": "Start Year",
-            "year_stop": "End Year"},
-        "specifications": {
-            "engine_type": "Engine Type",
-            "horse_power": "Horse Power (hp)",
-            "transmission": "Transmission",
-            "drive": "Drive",
-            "volume": "Engine Volume",
-            "consumption_mixed": "Fuel Consumption (Mixed)",
-            "max_speed": "Max Speed",
-            "price": "Price"
-        }
-    }
+    TABLE_COLUMNS = inventory.EDITABLE_COLUMNS
 
     TABLE_NAMES = {
         "marks": "Marks",
@@ -38,13 +17,16 @@ class EditDataForm(QDialog):
         "specifications": "Specifications"
     }
 
-    def __init__(self):
+    def __init__(self, filters=None):
         super().__init__()
         self.setWindowTitle("Edit Data")
+        # Current SearchForm filters; bulk edits change every car matching them
+        self.filters = {name: value for name, value in (filters or {}).items() if value}
         self.init_ui()
 
     def init_ui(self):
         self.layout = QVBoxLayout()
+        self.query_runner = QueryRunner(self)
 
         # Input fields
         input_fields = [
@@ -64,6 +46,12 @@ class EditDataForm(QDialog):
             self.layout.addLayout(row_layout)
             setattr(self, attr_name, combo_box)
 
+        # Bulk edit: one set-based update of every matching car instead of the selected records
+        filters_text = ", ".join(f"{name} = {value}" for name, value in self.filters.items())
+        self.check_bulk = QCheckBox(f"Bulk edit every car matching the search filters ({filters_text or 'all cars'})")
+        self.check_bulk.stateChanged.connect(self.toggle_bulk)
+        self.layout.addWidget(self.check_bulk)
+
         # Checkboxes and input fields for tables
         self.checkboxes = {}
         self.forms = {}
@@ -106,6 +94,7 @@ class EditDataForm(QDialog):
         button_layout.addWidget(self.btn_update)
         button_layout.addWidget(self.btn_cancel)
         self.layout.addLayout(button_layout)
+        self.layout.addWidget(BusyIndicator(self.query_runner))
 
         self.setLayout(self.layout)
 
@@ -117,18 +106,23 @@ class EditDataForm(QDialog):
 
         self.populate_marks()
 
-    def populate_marks(self):
-        try:
-            conn = sqlite3.connect('cars.db')
-            cursor = conn.cursor()
-            cursor.execute("SELECT id, name FROM marks")
-            records = cursor.fetchall()
+    def load_records(self, combo_box, loader, *args, on_loaded=None):
+        """Fetches (id, name) records in the background and adds them to the combobox."""
+        def add_records(records):
             for record_id, record_name in records:
-                self.input_mark.addItem(record_name, record_id)
-        except sqlite3.Error as e:
-            QMessageBox.critical(self, "Error", f"Database error: {e}")
-        finally:
-            conn.close()
+                combo_box.addItem(record_name, record_id)
+            combo_box.setEnabled(bool(records))
+            if on_loaded:
+                on_loaded()
+
+        self.query_runner.submit(combo_box, loader, args, on_result=add_records,
+                                 on_error=self.show_database_error)
+
+    def show_database_error(self, error):
+        QMessageBox.critical(self, "Error", f"Database error: {error}")
+
+    def populate_marks(self):
+        self.load_records(self.input_mark, database.get_marks)
 
     def populate_models(self):
         self.input_model.clear()
@@ -138,20 +132,11 @@ class EditDataForm(QDialog):
         self.input_generation.setEnabled(False)
         self.input_specification.setEnabled(False)
 
-        if self.input_mark.currentData():
-            mark_id = self.input_mark.currentData()
-            try:
-                conn = sqlite3.connect('cars.db')
-                cursor = conn.cursor()
-                cursor.execute("SELECT id, name FROM models WHERE mark_id = ?", (mark_id,))
-                records = cursor.fetchall()
-                for record_id, record_name in records:
-                    self.input_model.addItem(record_name, record_id)
-                self.input_model.setEnabled(bool(records))
-            except sqlite3.Error as e:
-                QMessageBox.critical(self, "Error", f"Database error: {e}")
-            finally:
-                conn.close()
+        mark_id = self.input_mark.currentData()
+        if mark_id:
+            self.load_records(self.input_model, database.get_models, mark_id)
+        else:
+            self.query_runner.cancel(self.input_model)
 
     def populate_generations(self):
         self.input_generation.clear()
@@ -161,21 +146,9 @@ class EditDataForm(QDialog):
 
         model_id = self.input_model.currentData()
         if model_id:
-            try:
-                conn = sqlite3.connect('cars.db')
-                cursor = conn.cursor()
-                cursor.execute("SELECT id, name FROM generations WHERE model_id = ?", (model_id,))
-                records = cursor.fetchall()
-
-                for record_id, record_name in records:
-                    self.input_generation.addItem(record_name, record_id)
-                if records:
-                    self.input_generation.setEnabled(True)
-
-            except sqlite3.Error as e:
-                QMessageBox.critical(self, "Error", f"Database error: {e}")
-            finally:
-                conn.close()
+            self.load_records(self.input_generation, database.get_generations, model_id)
+        else:
+            self.query_runner.cancel(self.input_generation)
 
     def populate_specifications(self):
         self.input_specification.clear()
@@ -183,24 +156,27 @@ class EditDataForm(QDialog):
 
         model_id = self.input_model.currentData()
         if model_id:
-            try:
-                conn = sqlite3.connect('cars.db')
-                cursor = conn.cursor()
-                cursor.execute("SELECT id, engine_type FROM specifications WHERE model_id = ?", (model_id,))
-                records = cursor.fetchall()
-
-                for record_id, record_name in records:
-                    self.input_specification.addItem(record_name, record_id)
-                if records:
-                    self.input_specification.setEnabled(True)
-
-            except sqlite3.Error as e:
-                QMessageBox.critical(self, "Error", f"Database error: {e}")
-            finally:
-                conn.close()
+            self.load_records(self.input_specification, database.get_specifications,
+                              model_id, self.input_generation.currentData(),
+                              on_loaded=self.enable_checkboxes)
+        else:
+            self.query_runner.cancel(self.input_specification)
+
+    def toggle_bulk(self):
+        bulk = self.check_bulk.isChecked()
+        self.input_mark.setEnabled(not bulk and self.input_mark.count() > 0)
+        for combo_box in (self.input_model, self.input_generation, self.input_specification):
+            combo_box.setEnabled(not bulk and combo_box.count() > 0)
+        for table, columns in self.TABLE_COLUMNS.items():
+            for column, label in columns.items():
+                relative = bulk and column in inventory.NUMERIC_COLUMNS.get(table, ())
+                self.forms[f"{table}.{column}"].setPlaceholderText(
+                    f"Enter {label}, or *1.05, +500, -500" if relative else f"Enter {label}")
+        self.btn_update.setText("Preview and Update All" if bulk else "Update")
+        self.enable_checkboxes()
 
     def enable_checkboxes(self):
-        if self.input_specification.currentData():
+        if self.check_bulk.isChecked() or self.input_specification.currentData():
             for checkbox in self.checkboxes.values():
                 checkbox.setEnabled(True)
             self.btn_update.setEnabled(True)
@@ -220,36 +196,67 @@ class EditDataForm(QDialog):
         self.adjustSize()
 
     def update_records(self):
+        if self.check_bulk.isChecked():
+            self.bulk_update_records()
+            return
+
         specification_id = self.input_specification.currentData()
 
-        try:
-            conn = sqlite3.connect('cars.db')
-            cursor = conn.cursor()
-
-            table_id_map = {
-                "marks": self.input_mark.currentData,
-                "models": self.input_model.currentData,
-                "generations": self.input_generation.currentData,
-                "specifications": lambda: specification_id
-            }
-
-            for table, checkbox in self.checkboxes.items():
-                if checkbox.isChecked():
-                    for column, label in self.TABLE_COLUMNS[table].items():
-                        key = f"{table}.{column}"
-                        new_value = self.forms[key].text()
-                        if new_value:
-                            identifier = table_id_map[table]()
-                            cursor.execute(
-                                f"UPDATE {table} SET {column} = ? WHERE id = ?",
-                                (new_value, identifier)
-                            )
-
-            conn.commit()
+        table_id_map = {
+            "marks": self.input_mark.currentData,
+            "models": self.input_model.currentData,
+            "generations": self.input_generation.currentData,
+            "specifications": lambda: specification_id
+        }
+
+        changes = []
+        for table, checkbox in self.checkboxes.items():
+            if checkbox.isChecked():
+                for column, label in self.TABLE_COLUMNS[table].items():
+                    key = f"{table}.{column}"
+                    new_value = self.forms[key].text()
+                    if new_value:
+                        changes.append((table, column, new_value, table_id_map[table]()))
 
+        try:
+            inventory.update_records(changes)
             QMessageBox.information(self, "Success", "Data successfully updated.")
 
+        except inventory.ValidationError as e:
+            QMessageBox.critical(self, "Error", str(e))
         except sqlite3.Error as e:
             QMessageBox.critical(self, "Error", f"Database error: {e}")
-        finally:
-            conn.close()
+
+    def bulk_update_records(self):
+        try:
+            changes = [inventory.parse_bulk_change(table, column, self.forms[f"{table}.{column}"].text())
+                       for table, checkbox in self.checkboxes.items() if checkbox.isChecked()
+                       for column in self.TABLE_COLUMNS[table]
+                       if self.forms[f"{table}.{column}"].text()]
+        except inventory.ValidationError as e:
+            QMessageBox.critical(self, "Error", str(e))
+            return
+        # Count first, so nothing changes without confirmation
+        self.btn_update.setEnabled(False)
+        self.query_runner.submit("bulk_update", inventory.bulk_update, (changes, (), (), self.filters, True),
+                                 on_result=lambda counts: self.confirm_bulk_update(changes, counts),
+                                 on_error=self.show_bulk_error)
+
+    def confirm_bulk_update(self, changes, counts):
+        answer = QMessageBox.question(self, "Confirm", f"Update {inventory.format_counts(counts)}?")
+        if answer != QMessageBox.Yes:
+            self.btn_update.setEnabled(True)
+            return
+        self.query_runner.submit("bulk_update", inventory.bulk_update, (changes, (), (), self.filters),
+                                 on_result=self.show_bulk_result, on_error=self.show_bulk_error)
+
+    def show_bulk_result(self, counts):
+        self.btn_update.setEnabled(True)
+        QMessageBox.information(self, "Success", f"Updated {inventory.format_counts(counts)}.")
+
+    def show_bulk_error(self, error):
+        self.btn_update.setEnabled(True)
+        if isinstance(error, inventory.ValidationError):
+            QMessageBox.critical(self, "Error", str(error))
+        else:
+            self.show_database_error(error)
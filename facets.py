@@ -0,0 +1,256 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import database
+
+# Search filters that have a combobox in SearchForm, in the order of a combination row
+FACETS = ("brand", "country", "model", "car_class", "body_type")
+
+
+class FacetIndex:
+    """
+    In-memory lookup tables for the SearchForm brand/country/model/class/body cascade.
+
+    It also keeps per-combination specification counts, from which facet counts
+    for any filter selection are computed in a single pass in memory.
+
+    The index is built with three queries and rebuilt only when PRAGMA data_version
+    reports that another connection has committed since the last build. It keeps
+    a private connection for that check, so writes made through database.db
+    (NewCarForm, EditDataForm, DeleteCarForm) all count as "another connection".
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._version = None
+        self._clear()
+
+    def _clear(self):
+        self._mark_names = ()
+        self._all_countries = ()
+        self._all_models = ()
+        self._all_classes = ()
+        self._all_bodies = ()
+        self._countries_by_brand = {}
+        self._models_by_brand = {}
+        self._classes_by_model = {}
+        self._bodies_by_model = {}
+        self._combinations = ()
+        self._year_combinations = ()
+        self._numeric_years = ()
+        self._other_years = ()
+        self._year_cache = (None, ())
+
+    def _connection(self):
+        if self._conn is None:
+            # Guarded by self._lock, so it may be used from any worker thread
+            self._conn = sqlite3.connect(self.path or database.db.path, timeout=database.BUSY_TIMEOUT_MS / 1000,
+                                         check_same_thread=False)
+        return self._conn
+
+    @contextmanager
+    def _fresh(self):
+        """Holds the lock for a lookup, rebuilding first if the database has changed."""
+        with self._lock:
+            conn = self._connection()
+            version = conn.execute("PRAGMA data_version").fetchone()[0]
+            if version != self._version:
+                self._build(conn)
+                self._version = version
+            yield
+
+    def _build(self, conn):
+        countries_by_brand = {}
+        for brand, country in conn.execute("SELECT DISTINCT name, country FROM Marks"):
+            if brand is not None and country is not None:
+                countries_by_brand.setdefault(brand, set()).add(country)
+
+        models_by_brand = {}
+        classes_by_model = {}
+        bodies_by_model = {}
+        all_models = set()
+        all_classes = set()
+        all_bodies = set()
+        for brand, model, car_class, body_type in conn.execute("""
+            SELECT DISTINCT Marks.name, Models.name, Models.class, Models.body_type
+            FROM Models
+            LEFT JOIN Marks ON Models.mark_id = Marks.id
+        """):
+            if model is None:
+                continue
+            all_models.add(model)
+            if brand is not None:
+                models_by_brand.setdefault(brand, set()).add(model)
+            if car_class is not None:
+                all_classes.add(car_class)
+                classes_by_model.setdefault(model, set()).add(car_class)
+            if body_type is not None:
+                all_bodies.add(body_type)
+                bodies_by_model.setdefault(model, set()).add(body_type)
+
+        def compact(groups):
+            return {key: tuple(sorted(values)) for key, values in groups.items()}
+
+        self._mark_names = tuple(sorted(set(countries_by_brand) | set(models_by_brand)))
+        self._all_countries = tuple(sorted(set().union(*countries_by_brand.values())))
+        self._all_models = tuple(sorted(all_models))
+        self._all_classes = tuple(sorted(all_classes))
+        self._all_bodies = tuple(sorted(all_bodies))
+        self._countries_by_brand = compact(countries_by_brand)
+        self._models_by_brand = compact(models_by_brand)
+        self._classes_by_model = compact(classes_by_model)
+        self._bodies_by_model = compact(bodies_by_model)
+
+        # (brand, country, model, class, body, year_start, year_stop, specification count), with
+        # the model's years for specifications without a generation, as in car_search;
+        # generation years only matter when a year filter is set, so keep a smaller
+        # copy aggregated without them for the common case
+        self._year_combinations = tuple(conn.execute("""
+            SELECT Marks.name, Marks.country, Models.name, Models.class, Models.body_type,
+                   CASE WHEN Generations.id IS NULL THEN Models.year_from ELSE Generations.year_start END,
+                   CASE WHEN Generations.id IS NULL THEN Models.year_to ELSE Generations.year_stop END,
+                   COUNT(*)
+            FROM Specifications
+            INNER JOIN Models ON Models.id = Specifications.model_id
+            INNER JOIN Marks ON Marks.id = Models.mark_id
+            LEFT JOIN Generations ON Generations.id = Specifications.generation_id
+            GROUP BY Specifications.model_id, Specifications.generation_id
+        """))
+        combinations = {}
+        for row in self._year_combinations:
+            combinations[row[:5]] = combinations.get(row[:5], 0) + row[7]
+        self._combinations = tuple(key + (count,) for key, count in combinations.items())
+        # Rows with numeric years, unpacked for the year filter fast path
+        numeric = (int, float)
+        self._numeric_years = tuple((row[5], row[6], row[:5], row[7]) for row in self._year_combinations
+                                    if isinstance(row[5], numeric) and isinstance(row[6], numeric))
+        self._other_years = tuple(row for row in self._year_combinations
+                                  if not (isinstance(row[5], numeric) and isinstance(row[6], numeric)))
+        self._year_cache = (None, ())
+
+    def invalidate(self):
+        """Forces a rebuild on the next lookup."""
+        with self._lock:
+            self._version = None
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self._version = None
+            self._clear()
+
+    def mark_names(self):
+        with self._fresh():
+            return self._mark_names
+
+    def countries(self, brand=None):
+        with self._fresh():
+            return self._countries_by_brand.get(brand, ()) if brand else self._all_countries
+
+    def model_names(self, brand=None):
+        with self._fresh():
+            return self._models_by_brand.get(brand, ()) if brand else self._all_models
+
+    def classes(self, model=None):
+        with self._fresh():
+            return self._classes_by_model.get(model, ()) if model else self._all_classes
+
+    def body_types(self, model=None):
+        with self._fresh():
+            return self._bodies_by_model.get(model, ()) if model else self._all_bodies
+
+    def _year_filtered(self, year_from, year_to):
+        """Combinations whose generation years pass the year filters, aggregated like _combinations."""
+        key = (year_from, year_to)
+        if self._year_cache[0] != key:
+            aggregated = {}
+            if isinstance(year_from, str) or isinstance(year_to, str):
+                numeric_rows = ()
+                other_rows = self._year_combinations
+            else:
+                numeric_rows = self._numeric_years
+                other_rows = self._other_years
+            # Plain numbers are compared inline; text bounds and NULL or text years take the slow path
+            low = float("-inf") if year_from is None else year_from
+            high = float("inf") if year_to is None else year_to
+            for year_start, year_stop, combination, count in numeric_rows:
+                if low <= year_start and year_stop <= high:
+                    aggregated[combination] = aggregated.get(combination, 0) + count
+            for row in other_rows:
+                if _years_match(row[5], row[6], year_from, year_to):
+                    aggregated[row[:5]] = aggregated.get(row[:5], 0) + row[7]
+            self._year_cache = (key, tuple(combination + (count,) for combination, count in aggregated.items()))
+        return self._year_cache[1]
+
+    def counts(self, filters):
+        """
+        Number of matching specifications for every value of every facet.
+
+        The count of a value takes all the other selected filters into
+        account but not the facet's own selection, so it says how many
+        results choosing that value would give.
+
+        :param filters: search filters as in database.build_search_query().
+        :return: dict facet -> {value: count}.
+        """
+        checks = [(position, filters.get(facet)) for position, facet in enumerate(FACETS) if filters.get(facet)]
+        year_from = _year_bound(filters.get("year_from"))
+        year_to = _year_bound(filters.get("year_to"))
+        counts = {facet: {} for facet in FACETS}
+        every_position = range(len(FACETS))
+
+        with self._fresh():
+            if year_from is None and year_to is None:
+                rows = self._combinations
+            else:
+                rows = self._year_filtered(year_from, year_to)
+
+            for row in rows:
+                mismatched = None
+                for position, value in checks:
+                    if row[position] != value:
+                        if mismatched is not None:
+                            break
+                        mismatched = position
+                else:
+                    count = row[5]
+                    # A row matching every filter counts for every facet; a row failing
+                    # exactly one filter only counts for the facet of that filter
+                    for position in every_position if mismatched is None else (mismatched,):
+                        values = counts[FACETS[position]]
+                        values[row[position]] = values.get(row[position], 0) + count
+        return counts
+
+
+def _year_bound(text):
+    """Parses a year filter like SQLite does for an INTEGER column: numeric text becomes a number."""
+    if not text:
+        return None
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def _sql_order(value):
+    # SQLite sorts every number before any text
+    return (1, value) if isinstance(value, str) else (0, value)
+
+
+def _years_match(year_start, year_stop, year_from, year_to):
+    # Same semantics as the SQL filters; NULL years never match a set bound
+    if year_from is not None:
+        if year_start is None or _sql_order(year_start) < _sql_order(year_from):
+            return False
+    if year_to is not None:
+        if year_stop is None or _sql_order(year_stop) > _sql_order(year_to):
+            return False
+    return True
+
+
+facet_index = FacetIndex()
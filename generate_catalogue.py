@@ -0,0 +1,224 @@
+import argparse
+import json
+import random
+import sqlite3
+
+import db_create
+import migrations
+
+DEFAULT_SEED = 42
+
+SCALE_FACTORS = {
+    "1k": 1000,
+    "100k": 100000,
+    "1M": 1000000,
+    "10M": 10000000,
+}
+
+# Upper bound on brands; larger catalogues get more models per brand instead
+MAX_MARKS = 400
+
+# Average catalogue shape
+SPECIFICATIONS_PER_MODEL = 40
+MAX_GENERATIONS_PER_MODEL = 8
+
+COUNTRIES = [
+    ("Германия", 18), ("Япония", 16), ("США", 12), ("Китай", 14), ("Франция", 6), ("Италия", 6),
+    ("Великобритания", 6), ("Корея", 5), ("Швеция", 3), ("Россия", 4), ("Чехия", 2), ("Испания", 2),
+]
+CLASSES = [("A", 4), ("B", 12), ("C", 20), ("D", 18), ("E", 10), ("F", 4), ("J", 22), ("M", 4), ("S", 6)]
+BODY_TYPES = [
+    ("седан", 25), ("внедорожник 5 дв.", 25), ("хэтчбек 5 дв.", 14), ("универсал 5 дв.", 8), ("лифтбек", 6),
+    ("купе", 6), ("хэтчбек 3 дв.", 4), ("минивэн", 4), ("кабриолет", 3), ("пикап двойная кабина", 3),
+    ("родстер", 2),
+]
+ENGINE_TYPES = [("бензин", 70), ("дизель", 17), ("гибрид", 6), ("электро", 5), ("СУГ", 2)]
+TRANSMISSIONS = [("автоматическая", 45), ("механическая", 35), ("робот", 12), ("вариатор", 8)]
+DRIVES = [("передний", 55), ("полный", 28), ("задний", 17)]
+# Engine volumes in cm3
+VOLUMES = [998, 1197, 1368, 1498, 1598, 1798, 1995, 2393, 2494, 2996, 3498, 3996, 4395, 5998]
+
+SYLLABLES = ["ar", "ve", "ko", "ta", "ri", "lo", "mi", "sa", "nu", "de", "xo", "ly", "ga", "pe", "ze", "ho"]
+ROMAN = ["I", "II", "III", "IV", "V", "VI", "VII", "VIII", "IX", "X"]
+
+
+def parse_scale(text):
+    """Number of specifications for a scale factor name (1k, 100k, 1M, 10M) or a plain number."""
+    if text in SCALE_FACTORS:
+        return SCALE_FACTORS[text]
+    try:
+        return int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Unknown scale factor: {text} (use {', '.join(SCALE_FACTORS)} or a number)")
+
+
+def weighted(rng, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights)[0]
+
+
+def split(total, parts, rng, skew=1.0):
+    """
+    Splits total into parts random positive integers (when total >= parts) that sum exactly to total.
+
+    Larger skew gives a more uneven, long-tailed split.
+    """
+    weights = [rng.paretovariate(1.0 + 1.0 / skew) for _ in range(parts)]
+    scale = max(total - parts, 0) / sum(weights)
+    shares = [weight * scale for weight in weights]
+    counts = [int(share) + (1 if total >= parts else 0) for share in shares]
+    # Hand out what rounding down left over, largest remainders first
+    remainder = total - sum(counts)
+    by_remainder = sorted(range(parts), key=lambda i: shares[i] - int(shares[i]), reverse=True)
+    for i in by_remainder[:remainder]:
+        counts[i] += 1
+    return counts
+
+
+def unique_name(rng, make, used):
+    for _ in range(100):
+        name = make(rng)
+        if name not in used:
+            used.add(name)
+            return name
+    # Collisions at huge scales: make it unique with a counter
+    name = f"{make(rng)} {len(used) + 1}"
+    used.add(name)
+    return name
+
+
+def mark_name(rng):
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+
+
+def model_name(rng):
+    style = rng.random()
+    if style < 0.4:
+        return f"{rng.choice('ACEGKMQRSTXZ')}{rng.randint(1, 9)}"
+    if style < 0.7:
+        return str(rng.randint(1, 9) * 100 + rng.choice([0, 8, 50]))
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+
+
+def generate_specification(rng, car_class, year):
+    engine_type = weighted(rng, ENGINE_TYPES)
+    volume = None if engine_type == "электро" else rng.choice(VOLUMES)
+    class_power = {"A": 0.7, "B": 0.85, "S": 1.6, "F": 1.4, "E": 1.25, "M": 1.0}.get(car_class, 1.0)
+    if volume is None:
+        horse_power = int(rng.uniform(100, 550) * class_power)
+        consumption = None
+    else:
+        horse_power = int(volume / 1000 * rng.uniform(55, 95) * class_power) + rng.randint(0, 15)
+        consumption = round(volume / 1000 * rng.uniform(2.4, 3.8) + (1.5 if engine_type != "дизель" else 0), 1)
+    max_speed = min(int(120 + horse_power * rng.uniform(0.25, 0.4)), 340)
+    # Newer and more powerful cars cost more; rounded to 100 like the importer's prices
+    price = round((8000 + horse_power * rng.uniform(90, 160) * class_power + (year - 1990) * 300) / 100) * 100
+    return {
+        "engine-type": engine_type,
+        "horse-power": horse_power,
+        "transmission": weighted(rng, TRANSMISSIONS),
+        "drive": weighted(rng, DRIVES),
+        "volume": volume,
+        "consumption-mixed": consumption,
+        "max-speed": max_speed,
+        "price": price,
+    }
+
+
+def generate_mark(seed, index, name, specification_count):
+    """One mark in the db_create.py dump format; depends only on (seed, index, name, count)."""
+    rng = random.Random(f"{seed}:{index}")
+    model_count = max(1, round(specification_count / SPECIFICATIONS_PER_MODEL))
+    used_models = set()
+    models = []
+    for model_specifications in split(specification_count, model_count, rng):
+        car_class = weighted(rng, CLASSES)
+        body_type = weighted(rng, BODY_TYPES)
+        generation_count = max(1, min(MAX_GENERATIONS_PER_MODEL, model_specifications, round(rng.expovariate(1 / 3))))
+        year = rng.randint(1985, 2015)
+        generations = []
+        for number, generation_specifications in enumerate(split(model_specifications, generation_count, rng)):
+            length = rng.randint(3, 8)
+            name_suffix = " Рестайлинг" if number % 2 else ""
+            configurations = [{
+                "body-type": body_type,
+                "modifications": [
+                    {"specifications": generate_specification(rng, car_class, year)}
+                    for _ in range(generation_specifications)
+                ],
+            }]
+            generations.append({
+                "name": f"{ROMAN[(number // 2) % len(ROMAN)]}{name_suffix}" + (f" ({number})" if number >= 20 else ""),
+                "year-start": year,
+                "year-stop": min(year + length, 2025),
+                "configurations": configurations,
+            })
+            year = min(year + length, 2025)
+        models.append({
+            "name": unique_name(rng, model_name, used_models),
+            "class": car_class,
+            "year-from": generations[0]["year-start"],
+            "year-to": generations[-1]["year-stop"],
+            "generations": generations,
+        })
+    return {"name": name, "country": weighted(rng, COUNTRIES), "models": models}
+
+
+def generate_marks(specification_count, seed=DEFAULT_SEED):
+    """
+    Yields a catalogue of exactly specification_count specifications, one mark at a time.
+
+    Brand sizes are long-tailed, as in real catalogues. The same seed and count
+    always give the same catalogue.
+    """
+    rng = random.Random(f"{seed}:marks")
+    mark_count = min(MAX_MARKS, max(1, round(specification_count ** 0.4)))
+    used_names = set()
+    names = [unique_name(rng, mark_name, used_names) for _ in range(mark_count)]
+    for index, (name, count) in enumerate(zip(names, split(specification_count, mark_count, rng, skew=1.5))):
+        if count:
+            yield generate_mark(seed, index, name, count)
+
+
+def write_json(marks, path):
+    """Streams marks to a JSON dump readable by db_create.py."""
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write("[\n")
+        for number, mark in enumerate(marks):
+            if number:
+                file.write(",\n")
+            json.dump(mark, file, ensure_ascii=False)
+        file.write("\n]\n")
+
+
+def create_database(path, specification_count, seed=DEFAULT_SEED, batch_size=db_create.BATCH_SIZE):
+    """Creates (or syncs into) a migrated database holding the generated catalogue."""
+    conn = sqlite3.connect(path)
+    try:
+        migrations.migrate(conn)
+        marks = generate_marks(specification_count, seed)
+        db_create.load(conn, (db_create.normalize_mark(mark) for mark in marks), batch_size)
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic car catalogue.")
+    parser.add_argument("--scale", type=parse_scale, default="1k",
+                        help="number of specifications: 1k, 100k, 1M, 10M or any number (default: 1k)")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument("--json", help="write a JSON dump for db_create.py")
+    output.add_argument("--db", help="load straight into a SQLite database")
+    parser.add_argument("--batch-size", type=int, default=db_create.BATCH_SIZE, help="rows per transaction")
+    args = parser.parse_args()
+
+    if args.json:
+        write_json(generate_marks(args.scale, args.seed), args.json)
+        print(f"Wrote {args.scale} specifications to {args.json}.")
+    else:
+        create_database(args.db, args.scale, args.seed, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
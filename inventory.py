@@ -0,0 +1,498 @@
+import csv
+import itertools
+import json
+import math
+import re
+import sqlite3
+import time
+
+import database
+import migrations
+
+# Columns that may be edited, per table, with their EditDataForm labels
+EDITABLE_COLUMNS = {
+    "marks": {
+        "name": "Name",
+        "country": "Country"},
+    "models": {
+        "name": "Name",
+        "class": "Car Class",
+        "year_from": "Start Year",
+        "year_to": "End Year",
+        "body_type": "Body Type"
+    },
+    "generations": {
+        "name": "Name",
+        "year_start": "Start Year",
+        "year_stop": "End Year"},
+    "specifications": {
+        "engine_type": "Engine Type",
+        "horse_power": "Horse Power (hp)",
+        "transmission": "Transmission",
+        "drive": "Drive",
+        "volume": "Engine Volume",
+        "consumption_mixed": "Fuel Consumption (Mixed)",
+        "max_speed": "Max Speed",
+        "price": "Price"
+    }
+}
+
+# Fields of a new car, split the way database.add_car() takes them
+CAR_FIELDS = ("mark_name", "model_name", "country", "car_class", "body_type", "year_from", "year_to", "price")
+STYLING_FIELDS = ("generation", "generation_year_from", "generation_year_to")
+SPECIFICATION_FIELDS = ("engine_type", "transmission", "drive", "horse_power", "volume", "consumption_mixed",
+                        "max_speed")
+
+# Field -> label used in error messages
+REQUIRED_FIELDS = {"mark_name": "Brand", "model_name": "Model"}
+
+# Operations per transaction when applying an operations file
+BATCH_SIZE = 1000
+
+# Formats that can be written to any text stream, e.g. stdout
+TEXT_FORMATS = ("csv", "jsonl")
+# Parquet needs pyarrow, which is optional
+EXPORT_FORMATS = TEXT_FORMATS + ("parquet",)
+
+# Affinity of the numeric search row columns in Parquet exports; the rest are text
+NUMERIC_SEARCH_COLUMNS = {
+    "YearFrom": "INTEGER",
+    "YearTo": "INTEGER",
+    "GenerationStart": "INTEGER",
+    "GenerationEnd": "INTEGER",
+    "HorsePower": "INTEGER",
+    "EngineVolume": "REAL",
+    "ConsumptionMixed": "REAL",
+    "MaxSpeed": "INTEGER",
+    "SpecificationId": "INTEGER",
+}
+
+# Columns a bulk edit may change relative to their current value
+NUMERIC_COLUMNS = {
+    "models": ("year_from", "year_to"),
+    "generations": ("year_start", "year_stop"),
+    "specifications": ("horse_power", "volume", "consumption_mixed", "max_speed", "price"),
+}
+
+# Prefix of a relative bulk edit -> database.BULK_OPERATIONS operation
+RELATIVE_OPERATIONS = {"*": "multiply", "\u00d7": "multiply", "+": "add", "-": "add"}
+
+# Tables delete_cars() and bulk_update() report on, with their labels
+COUNT_LABELS = {"specifications": "specifications", "generations": "generations", "models": "models",
+                 "marks": "brands"}
+
+
+class ValidationError(ValueError):
+    """Input rejected before it reaches the database; the message is meant for the user."""
+
+
+def open_database(path=None):
+    """Points database.db at the file (if given) and brings its schema up to date."""
+    if path:
+        database.db.close()
+        database.db.path = path
+    return migrations.migrate(database.db.connection())
+
+
+# ---------------------------------------------------------------- Validation
+
+def validate_car(main):
+    """Checks that the required fields of a new car have data."""
+    for field, label in REQUIRED_FIELDS.items():
+        if not str(main.get(field) or "").strip():
+            raise ValidationError(f"The field \"{label}\" cannot be empty.")
+
+
+def split_car(car):
+    """
+    Splits a flat dict of car fields into database.add_car()'s (main, styling, specs).
+
+    Missing fields are None; unknown fields are an error.
+    """
+    unknown = set(car) - set(CAR_FIELDS) - set(STYLING_FIELDS) - set(SPECIFICATION_FIELDS)
+    if unknown:
+        raise ValidationError(f"Unknown car fields: {', '.join(sorted(unknown))}.")
+    main = {field: car.get(field) for field in CAR_FIELDS}
+    styling = {field: car.get(field) for field in STYLING_FIELDS}
+    specs = {field: car.get(field) for field in SPECIFICATION_FIELDS}
+    validate_car(main)
+    return main, styling, specs
+
+
+def parse_specification_id(value):
+    text = str(value).strip()
+    if not text.isdigit():
+        raise ValidationError("Please enter a valid Specifications ID.")
+    return int(text)
+
+
+def parse_id_list(text):
+    """Parses IDs and inclusive ranges such as "12, 15 100-200" into (ids, ranges)."""
+    ids = []
+    ranges = []
+    for part in re.split(r"[\s,]+", str(text).strip()):
+        if not part:
+            continue
+        first, separator, last = part.partition("-")
+        if not first.isdigit() or separator and not last.isdigit():
+            raise ValidationError(f"Invalid ID or range: \"{part}\".")
+        if not separator:
+            ids.append(int(first))
+        elif int(first) > int(last):
+            raise ValidationError(f"Invalid range: \"{part}\" ends before it starts.")
+        else:
+            ranges.append((int(first), int(last)))
+    return ids, ranges
+
+
+def validate_column(table, column):
+    if column not in EDITABLE_COLUMNS.get(table, {}):
+        raise ValidationError(f"Column \"{column}\" of \"{table}\" cannot be edited.")
+
+
+def validate_changes(changes):
+    """Checks (table, column, value, row_id) changes against EDITABLE_COLUMNS."""
+    for table, column, value, row_id in changes:
+        validate_column(table, column)
+        if not isinstance(row_id, int) and not str(row_id).isdigit():
+            raise ValidationError(f"Invalid {table} ID: {row_id}.")
+
+
+# ---------------------------------------------------------------- Single operations
+
+def add_car(main, styling, specs):
+    validate_car(main)
+    database.add_car(main, styling, specs)
+
+
+def update_records(changes):
+    validate_changes(changes)
+    database.update_records(changes)
+
+
+def delete_specification(value):
+    """Deletes a specification by ID given as text or number; returns False if it does not exist."""
+    return database.delete_specification(parse_specification_id(value))
+
+
+def parse_bulk_change(table, column, text):
+    """
+    Turns an entered value into a (table, column, operation, value) change for bulk_update().
+
+    Numeric columns also take values relative to the current one: "*1.05"
+    (or "\u00d71.05") multiplies it, "+500" and "-500" add to it.
+    """
+    validate_column(table, column)
+    text = str(text).strip()
+    operation = RELATIVE_OPERATIONS.get(text[:1])
+    if operation is None or column not in NUMERIC_COLUMNS.get(table, ()):
+        return table, column, "set", text
+    try:
+        value = float(text if text[0] == "-" else text[1:])
+    except ValueError:
+        value = None
+    if value is None or not math.isfinite(value):
+        raise ValidationError(f"Expected a number after \"{text[0]}\" for \"{column}\", got \"{text}\".")
+    return table, column, operation, value
+
+
+def validate_filters(filters):
+    """The non-empty search and range filters; raises ValidationError for unknown names or non-numeric ranges."""
+    filters = {name: value for name, value in (filters or {}).items() if value is not None and value != ""}
+    unknown = set(filters) - set(database.SEARCH_FILTERS) - set(database.RANGE_FILTERS)
+    if unknown:
+        raise ValidationError(f"Unknown search filters: {', '.join(sorted(unknown))}.")
+    try:
+        database.range_bounds(filters)
+    except ValueError as e:
+        raise ValidationError(str(e))
+    return filters
+
+
+def selection(ids=(), ranges=(), filters=None):
+    """database.build_selection_query() for the IDs, ranges and non-empty search filters."""
+    return database.build_selection_query(ids, ranges, validate_filters(filters))
+
+
+def delete_cars(ids=(), ranges=(), filters=None, cleanup=False, dry_run=False):
+    """
+    Deletes the specifications with the given IDs or in the ranges, and/or
+    matching the search filters, in one transaction.
+
+    :param cleanup: also delete the generations, models and brands left without specifications.
+    :param dry_run: only count what would be deleted.
+    :return: dict of deleted rows per COUNT_LABELS table.
+    """
+    # A bound of 0 (price_min=0) is a filter too; only None and "" are not
+    filters = validate_filters(filters)
+    if not ids and not ranges and not filters:
+        raise ValidationError("Enter the IDs to delete or choose at least one search filter.")
+    return database.delete_specifications(database.build_selection_query(ids, ranges, filters), cleanup, dry_run)
+
+
+def bulk_update(changes, ids=(), ranges=(), filters=None, dry_run=False):
+    """
+    Applies changes from parse_bulk_change() to every specification with the
+    given IDs or in the ranges, and/or matching the search filters, and to
+    their generations, models and brands; without any, to the whole catalogue.
+
+    :param dry_run: only count the rows that would be updated.
+    :return: dict of updated rows per changed table.
+    """
+    if not changes:
+        raise ValidationError("Enter at least one new value.")
+    return database.bulk_update(selection(ids, ranges, filters), changes, dry_run)
+
+
+def format_counts(counts):
+    """E.g. "12 specifications, 3 generations, 1 models, 0 brands"; only the tables in counts."""
+    return ", ".join(f"{counts[table]} {label}" for table, label in COUNT_LABELS.items() if table in counts)
+
+
+# ---------------------------------------------------------------- Operation files
+
+def parse_operation(operation):
+    """
+    Validates one operation and returns (kind, args) for OPERATIONS.
+
+    Operations are dicts:
+        {"op": "add", "mark_name": ..., "model_name": ..., ...any CAR/STYLING/SPECIFICATION_FIELDS}
+        {"op": "update", "table": "specifications", "id": 12, "set": {"price": 15000}}
+        {"op": "delete", "id": 12}
+    """
+    if not isinstance(operation, dict):
+        raise ValidationError("An operation must be a JSON object.")
+    kind = operation.get("op")
+    if kind == "add":
+        return kind, split_car({field: value for field, value in operation.items() if field != "op"})
+    if kind == "update":
+        values = operation.get("set")
+        if not isinstance(values, dict) or not values:
+            raise ValidationError("An update needs a non-empty \"set\" object.")
+        changes = [(operation.get("table"), column, value, operation.get("id")) for column, value in values.items()]
+        validate_changes(changes)
+        return kind, (changes,)
+    if kind == "delete":
+        return kind, (parse_specification_id(operation.get("id")),)
+    raise ValidationError(f"Unknown operation: {kind!r}.")
+
+
+def _apply_delete(cursor, specification_id):
+    if not database.delete_specification_row(cursor, specification_id):
+        raise ValidationError(f"No record found with ID {specification_id} in Specifications.")
+
+
+def _apply_update(cursor, changes):
+    for table, column, value, row_id in changes:
+        if not database.update_rows(cursor, [(table, column, value, row_id)]):
+            raise ValidationError(f"No record found with ID {row_id} in {table}.")
+
+
+OPERATIONS = {
+    "add": database.insert_car,
+    "update": _apply_update,
+    "delete": _apply_delete,
+}
+
+
+def read_operations(file):
+    """Yields (line number, operation) from a JSON Lines file; blank lines and lines starting with # are skipped."""
+    for line_number, line in enumerate(file, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_number, ValidationError(f"Invalid JSON: {e}.")
+
+
+class BatchAborted(Exception):
+    pass
+
+
+@database.retry_on_busy
+def apply_batch(batch, stop_on_error=False):
+    """
+    Applies a list of (line number, operation) pairs in one transaction.
+
+    Every operation runs in its own savepoint, so a failing one is skipped and
+    reported without undoing the rest of the batch. With stop_on_error the
+    whole batch is rolled back at the first failure.
+
+    :return: (applied counts per operation, failed (line number, message) pairs, stopped).
+    """
+    applied = dict.fromkeys(OPERATIONS, 0)
+    failed = []
+    try:
+        with database.db.transaction() as cursor:
+            for line_number, operation in batch:
+                try:
+                    if isinstance(operation, Exception):
+                        raise operation
+                    kind, args = parse_operation(operation)
+                    cursor.execute("SAVEPOINT operation")
+                    try:
+                        OPERATIONS[kind](cursor, *args)
+                    except BaseException:
+                        cursor.execute("ROLLBACK TO operation")
+                        raise
+                    finally:
+                        cursor.execute("RELEASE operation")
+                except (ValidationError, sqlite3.Error) as e:
+                    failed.append((line_number, str(e)))
+                    if stop_on_error:
+                        raise BatchAborted()
+                else:
+                    applied[kind] += 1
+    except BatchAborted:
+        return dict.fromkeys(OPERATIONS, 0), failed, True
+    return applied, failed, False
+
+
+def apply_operations(operations, batch_size=BATCH_SIZE, stop_on_error=False):
+    """
+    Applies (line number, operation) pairs in transactions of batch_size operations (see apply_batch).
+
+    With stop_on_error nothing runs after the batch of the first failure;
+    earlier batches stay committed.
+
+    :return: dict with "applied" counts per operation, "failed" (line number,
+             message) pairs and "stopped" (True if stop_on_error stopped the run).
+    """
+    result = {"applied": dict.fromkeys(OPERATIONS, 0), "failed": [], "stopped": False}
+    operations = iter(operations)
+    while not result["stopped"]:
+        batch = list(itertools.islice(operations, batch_size))
+        if not batch:
+            break
+        applied, failed, result["stopped"] = apply_batch(batch, stop_on_error)
+        for kind, count in applied.items():
+            result["applied"][kind] += count
+        result["failed"] += failed
+    return result
+
+
+# ---------------------------------------------------------------- Search, import and export
+
+def search(filters, text=None, limit=None):
+    """
+    Yields search rows for the filters, or the full-text matches for text.
+
+    Filtered results are streamed from the database, so memory stays flat however many rows match.
+    """
+    return itertools.islice(itertools.chain.from_iterable(search_chunks(filters, text, limit)), limit)
+
+
+def search_chunks(filters, text=None, limit=None):
+    """search() as lists of rows, for writers that handle a chunk at a time."""
+    if text:
+        return iter([database.text_search(text, limit or database.TEXT_SEARCH_LIMIT)])
+    return database.iter_search(validate_filters(filters))
+
+
+def write_rows(rows, file, file_format="csv"):
+    """Writes search rows as CSV (with a header) or JSON Lines; returns the number of rows."""
+    count = 0
+    if file_format == "csv":
+        writer = csv.writer(file)
+        writer.writerow(database.SEARCH_COLUMN_NAMES)
+        for count, row in enumerate(rows, 1):
+            writer.writerow(row)
+    elif file_format == "jsonl":
+        # json.dumps() with options builds a new encoder on every call
+        encode = json.JSONEncoder(ensure_ascii=False).encode
+        for count, row in enumerate(rows, 1):
+            file.write(encode(dict(zip(database.SEARCH_COLUMN_NAMES, row))) + "\n")
+    else:
+        raise ValidationError(f"Unknown export format: {file_format} (use {', '.join(TEXT_FORMATS)}).")
+    return count
+
+
+def parquet_value(value, affinity):
+    """The value as its column's Parquet type; numeric columns get None for anything but a number."""
+    value = database.with_affinity(value, affinity)
+    if affinity == "INTEGER":
+        return value if isinstance(value, int) else None
+    return float(value) if isinstance(value, (int, float)) else None
+
+
+def write_parquet(chunks, path):
+    """Writes chunks of search rows to a Parquet file, one row group per chunk; returns the number of rows."""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ValidationError("Parquet export needs pyarrow (pip install pyarrow).")
+
+    types = {"INTEGER": pyarrow.int64(), "REAL": pyarrow.float64()}
+    affinities = [NUMERIC_SEARCH_COLUMNS.get(name, "TEXT") for name in database.SEARCH_COLUMN_NAMES]
+    schema = pyarrow.schema([(name, types.get(affinity, pyarrow.string()))
+                             for name, affinity in zip(database.SEARCH_COLUMN_NAMES, affinities)])
+    count = 0
+    with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+        for chunk in chunks:
+            arrays = []
+            for values, affinity, field in zip(zip(*chunk), affinities, schema):
+                try:
+                    arrays.append(pyarrow.array(values, field.type))
+                except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError):
+                    # Rare mixed values (e.g. a year typed in as text): convert them one by one
+                    if affinity == "TEXT":
+                        values = [None if value is None else str(value) for value in values]
+                    else:
+                        values = [parquet_value(value, affinity) for value in values]
+                    arrays.append(pyarrow.array(values, field.type))
+            writer.write_table(pyarrow.Table.from_arrays(arrays, schema=schema))
+            count += len(chunk)
+    return count
+
+
+def export(path, filters, file_format=None, text=None):
+    """
+    Streams every matching row to a file; the format defaults to the file extension.
+
+    :return: dict with the number of "rows", "seconds" taken and "rows_per_sec".
+    """
+    file_format = file_format or path.rsplit(".", 1)[-1].lower()
+    if file_format not in EXPORT_FORMATS:
+        raise ValidationError(f"Unknown export format: {file_format} (use {', '.join(EXPORT_FORMATS)}).")
+    started = time.perf_counter()
+    chunks = search_chunks(filters, text)
+    if file_format == "parquet":
+        rows = write_parquet(chunks, path)
+    else:
+        with open(path, 'w', encoding='utf-8', newline='') as file:
+            rows = write_rows(itertools.chain.from_iterable(chunks), file, file_format)
+    seconds = time.perf_counter() - started
+    return {"rows": rows, "seconds": seconds, "rows_per_sec": rows / seconds if seconds else 0.0}
+
+
+def rebuild_search_table():
+    """Rewrites the flattened search table from the catalogue tables; returns its number of rows."""
+    migrations.rebuild_search_table(database.db.connection())
+    return database.db.fetchone("SELECT COUNT(*) FROM car_search")[0]
+
+
+def rebuild_stats_tables():
+    """Rewrites the statistics tables from the catalogue tables; returns the number of models summarised."""
+    migrations.rebuild_stats_tables(database.db.connection())
+    return database.db.fetchone("SELECT COUNT(*) FROM model_stats")[0]
+
+
+def import_dump(json_path, batch_size=None, sync=False, workers=0):
+    """Loads a JSON catalogue dump into the current database, as db_create.py does."""
+    # The forms never import, so they do not pay for db_create's multiprocessing imports
+    import db_create
+
+    batch_size = batch_size or db_create.BATCH_SIZE
+    database.db.close()
+    if workers:
+        return db_create.parallel_load(database.db.path, json_path, workers, batch_size, sync)
+    conn = sqlite3.connect(database.db.path)
+    try:
+        marks = (db_create.normalize_mark(mark) for mark in db_create.iter_marks(json_path))
+        return db_create.load(conn, marks, batch_size, sync)
+    finally:
+        conn.close()
+
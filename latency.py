@@ -0,0 +1,24 @@
+"""Latency summaries shared by benchmark.py and load_test.py."""
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies):
+    latencies = sorted(latencies)
+    total = sum(latencies)
+    summary = {
+        "count": len(latencies),
+        "mean_ms": total / len(latencies) * 1000,
+        "min_ms": latencies[0] * 1000,
+    }
+    for p in PERCENTILES:
+        summary[f"p{p}_ms"] = percentile(latencies, p) * 1000
+    summary["max_ms"] = latencies[-1] * 1000
+    summary["ops_per_sec"] = len(latencies) / total if total else None
+    return summary
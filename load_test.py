@@ -0,0 +1,161 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+from urllib.parse import urlencode
+
+import latency
+
+DEFAULT_URL = 'http://127.0.0.1:8080'
+DEFAULT_CONNECTIONS = 16
+DEFAULT_DURATION = 10.0
+
+# Share of each kind of request in the mix
+REQUEST_MIX = (("search", 50), ("next_page", 15), ("facets", 15), ("car", 20))
+
+
+class Client:
+    """One keep-alive HTTP/1.1 connection."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def get(self, target):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(f"GET {target} HTTP/1.1\r\nHost: {self.host}\r\n\r\n".encode("latin-1"))
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, separator, value = line.decode("latin-1").partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+        return status, json.loads(await self.reader.readexactly(length))
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            await self.writer.wait_closed()
+
+
+class Workload:
+    """Requests like the website's: searches over real filter values, their next pages and car details."""
+
+    def __init__(self, rng, facet_counts, car_ids):
+        self.rng = rng
+        self.values = {facet: [value for value in counts if value is not None]
+                       for facet, counts in facet_counts.items()}
+        self.car_ids = car_ids
+        self.tokens = []
+
+    def filters(self):
+        filters = {}
+        for facet, share in (("brand", 0.6), ("car_class", 0.3), ("body_type", 0.3), ("country", 0.1)):
+            if self.values.get(facet) and self.rng.random() < share:
+                filters[facet] = self.rng.choice(self.values[facet])
+        if self.rng.random() < 0.2:
+            year = self.rng.randint(1990, 2020)
+            filters.update(year_from=year, year_to=year + 10)
+        if self.rng.random() < 0.2:
+            filters["price_max"] = self.rng.choice((15000, 30000, 60000))
+            if self.rng.random() < 0.5:
+                filters["horse_power_min"] = self.rng.choice((150, 200, 300))
+        return filters
+
+    def target(self):
+        kinds, weights = zip(*REQUEST_MIX)
+        kind = self.rng.choices(kinds, weights)[0]
+        if kind == "next_page" and self.tokens:
+            return kind, "/search?" + urlencode(self.rng.choice(self.tokens))
+        if kind == "facets":
+            return kind, "/facets?" + urlencode(self.filters())
+        if kind == "car" and self.car_ids:
+            return kind, f"/cars/{self.rng.choice(self.car_ids)}"
+        filters = self.filters()
+        return "search", "/search?" + urlencode(filters), filters
+
+
+async def discover(client):
+    """Facet values and car IDs to build requests from."""
+    status, facet_counts = await client.get("/facets")
+    status, page = await client.get("/search?page_size=1000")
+    return facet_counts, [row["SpecificationId"] for row in page["rows"]]
+
+
+async def run_client(client, workload, deadline, latencies, errors):
+    while time.perf_counter() < deadline:
+        kind, target, *filters = workload.target()
+        started = time.perf_counter()
+        try:
+            status, body = await client.get(target)
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+            errors.append(f"{target}: {e!r}")
+            await client.close()
+            client.writer = None
+            continue
+        latencies.setdefault(kind, []).append(time.perf_counter() - started)
+        if status != 200:
+            errors.append(f"{target}: HTTP {status} {body}")
+        elif filters and body.get("next_token") and len(workload.tokens) < 1000:
+            workload.tokens.append(dict(filters[0], token=body["next_token"]))
+
+
+async def load_test(url, connections, duration, seed):
+    host, port = url.split("//", 1)[-1].rstrip("/").split(":")
+    clients = [Client(host, int(port)) for _ in range(connections)]
+    workload = Workload(random.Random(seed), *await discover(clients[0]))
+    latencies = {}
+    errors = []
+    started = time.perf_counter()
+    await asyncio.gather(*(run_client(client, workload, started + duration, latencies, errors)
+                           for client in clients))
+    elapsed = time.perf_counter() - started
+    status, stats = await clients[0].get("/stats")
+    for client in clients:
+        await client.close()
+    return latencies, errors, elapsed, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure requests/sec of a running api_server.py.")
+    parser.add_argument("--url", default=DEFAULT_URL)
+    parser.add_argument("--connections", type=int, default=DEFAULT_CONNECTIONS, help="concurrent keep-alive clients")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION, help="seconds")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="also write the results as JSON")
+    args = parser.parse_args()
+
+    latencies, errors, elapsed, stats = asyncio.run(
+        load_test(args.url, args.connections, args.duration, args.seed))
+    total = sum(len(values) for values in latencies.values())
+    results = {
+        "requests": total,
+        "errors": len(errors),
+        "seconds": elapsed,
+        "requests_per_sec": total / elapsed,
+        "server": stats,
+        "latency": {kind: latency.summarize(values) for kind, values in latencies.items()},
+    }
+    print(f"{total} requests in {elapsed:.1f} s over {args.connections} connections: "
+          f"{results['requests_per_sec']:.0f} requests/sec, {len(errors)} errors")
+    for kind, summary in results["latency"].items():
+        print(f"  {kind:<10} {summary['count']:>7}  p50 {summary['p50_ms']:8.2f} ms  "
+              f"p95 {summary['p95_ms']:8.2f} ms  p99 {summary['p99_ms']:8.2f} ms")
+    print(f"  cache: {stats['cache_hits']} hits, {stats['cache_misses']} misses")
+    for error in errors[:10]:
+        print(f"  error: {error}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
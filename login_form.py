@@ -1,9 +1,17 @@
+import startup  # First, so that the startup timing includes the imports
+
 import sys
 import hashlib
 import sqlite3
+import threading
+from PyQt5.QtCore import QTimer
 from PyQt5.QtWidgets import (QApplication, QWidget, QLabel, QLineEdit, QPushButton, QVBoxLayout, QMessageBox, QMenuBar,
                              QMenu, QAction)
-from search_form import SearchForm
+
+import database
+import facets
+import migrations
+import query_log
 
 
 def hash_password(password):
@@ -12,61 +20,31 @@ def hash_password(password):
 
 def initialize_db():
     try:
-        conn = sqlite3.connect('cars.db')
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS Employees (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                login TEXT NOT NULL UNIQUE,
-                password TEXT NOT NULL
-            );
-        """)
-        conn.commit()
+        applied = migrations.migrate(database.db.connection())
+        if applied:
+            print(f"Applied schema migrations: {applied}")
     except sqlite3.Error as e:
         print(f"Database error during initialization: {e}")
-    finally:
-        if conn:
-            conn.close()
 
 
 def authenticate_user(login, password):
     try:
-        conn = sqlite3.connect('cars.db')
-        cursor = conn.cursor()
-
-        query = "SELECT password FROM Employees WHERE login = ?"
-        cursor.execute(query, (login,))
-        result = cursor.fetchone()
-
-        if result:
-            stored_hashed_password = result[0]
+        stored_hashed_password = database.get_password_hash(login)
+        if stored_hashed_password:
             return stored_hashed_password == hash_password(password)
         return False
     except sqlite3.Error as e:
         print(f"Database error: {e}")
         return False
-    finally:
-        if conn:
-            conn.close()
 
 
 def add_user(name, login, password, add_user_form=None):
     try:
-        conn = sqlite3.connect('cars.db')
-        cursor = conn.cursor()
-
-        query_check = "SELECT 1 FROM Employees WHERE login = ? LIMIT 1"
-        cursor.execute(query_check, (login,))
-        if cursor.fetchone():
+        if database.employee_exists(login):
             QMessageBox.warning(None, "Error", "A user with this login already exists!")
             return
 
-        hashed_password = hash_password(password)
-        query_insert = "INSERT INTO Employees (name, password, login) VALUES (?, ?, ?);"
-        cursor.execute(query_insert, (name, hashed_password, login))
-        conn.commit()
+        database.add_employee(name, login, hash_password(password))
         QMessageBox.information(None, "Success", "User successfully added!")
 
         if add_user_form:
@@ -76,10 +54,6 @@ def add_user(name, login, password, add_user_form=None):
         QMessageBox.warning(None, "Error", f"Database error: {e}")
         sys.exit()
 
-    finally:
-        if conn:
-            conn.close()
-
 
 class BaseForm(QWidget):
     def add_label_and_input(self, label_text, is_password=False):
@@ -130,6 +104,9 @@ class LoginForm(BaseForm):
 
         if authenticate_user(login, password):
             QMessageBox.information(self, "Success", "Login successful!")
+            # Imported after login so that the login window does not wait for it
+            from search_form import SearchForm
+
             self.search_form = SearchForm()
             self.search_form.show()
             self.hide()
@@ -171,9 +148,28 @@ class AddUserForm(BaseForm):
             QMessageBox.warning(self, "Error", "All fields must be filled!")
 
 
+def warm_up():
+    """Builds the search lookups in the background while the user is typing the password."""
+    threading.Thread(target=facets.facet_index.mark_names, daemon=True).start()
+
+
 if __name__ == "__main__":
+    startup.mark("imports")
     initialize_db()
+    startup.mark("database")
     app = QApplication(sys.argv)
+    startup.mark("QApplication")
     login_form = LoginForm()
     login_form.show()
-    sys.exit(app.exec_())
+    startup.mark("login window")
+    # Runs on the first event loop pass, once the window has been shown
+    QTimer.singleShot(0, lambda: (startup.mark("first event loop pass"), startup.report(), warm_up()))
+    # kill -USR1 <pid> dumps the query counters; the timer lets Python handle the signal while Qt waits for events
+    if query_log.install_dump_signal():
+        signal_timer = QTimer()
+        signal_timer.timeout.connect(lambda: None)
+        signal_timer.start(500)
+    exit_code = app.exec_()
+    facets.facet_index.close()
+    database.db.close()
+    sys.exit(exit_code)
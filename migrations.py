@@ -0,0 +1,713 @@
+import itertools
+import sqlite3
+
+import database
+
+
+def merge_duplicates(cursor, table, key_columns, references):
+    """
+    Merges rows of a table that share a natural key into the row with the lowest id.
+
+    :param key_columns: natural key columns; rows with a NULL key column are left alone.
+    :param references: (table, column) pairs pointing at table.id, repointed to the kept row.
+    """
+    keys = ", ".join(key_columns)
+    cursor.execute("CREATE TEMP TABLE merge_map (old_id INTEGER PRIMARY KEY, new_id INTEGER)")
+    cursor.execute(f"""
+        INSERT INTO merge_map (old_id, new_id)
+        SELECT t.id, k.keep_id
+        FROM {table} t
+        JOIN (
+            SELECT {keys}, MIN(id) AS keep_id FROM {table}
+            WHERE {" AND ".join(f"{column} IS NOT NULL" for column in key_columns)}
+            GROUP BY {keys} HAVING COUNT(*) > 1
+        ) k ON {" AND ".join(f"t.{column} = k.{column}" for column in key_columns)}
+        WHERE t.id <> k.keep_id
+    """)
+    for child_table, column in references:
+        cursor.execute(f"""
+            UPDATE {child_table}
+            SET {column} = (SELECT new_id FROM merge_map WHERE old_id = {child_table}.{column})
+            WHERE {column} IN (SELECT old_id FROM merge_map)
+        """)
+    cursor.execute(f"DELETE FROM {table} WHERE id IN (SELECT old_id FROM merge_map)")
+    cursor.execute("DROP TABLE temp.merge_map")
+
+
+def add_natural_keys(cursor):
+    # Earlier re-runs of db_create.py appended duplicates; fold them together first
+    merge_duplicates(cursor, "Marks", ("name",), [("Models", "mark_id")])
+    merge_duplicates(cursor, "Models", ("mark_id", "name"),
+                     [("Generations", "model_id"), ("Specifications", "model_id")])
+    merge_duplicates(cursor, "Generations", ("model_id", "name"), [("Specifications", "generation_id")])
+
+    cursor.execute("ALTER TABLE Specifications ADD COLUMN fingerprint TEXT")
+    columns = ", ".join(column for column, affinity in database.FINGERPRINT_COLUMNS)
+    rows = cursor.execute(f"""
+        SELECT id, generation_id, {columns} FROM Specifications
+        WHERE generation_id IS NOT NULL
+        ORDER BY generation_id, id
+    """).fetchall()
+    updates = []
+    for generation_id, group in itertools.groupby(rows, key=lambda row: row[1]):
+        group = list(group)
+        fingerprints = database.specification_fingerprints(row[2:] for row in group)
+        updates.extend((fingerprint, row[0]) for fingerprint, row in zip(fingerprints, group))
+    cursor.executemany("UPDATE Specifications SET fingerprint = ? WHERE id = ?", updates)
+
+    cursor.execute("CREATE UNIQUE INDEX ux_marks_name ON Marks (name)")
+    cursor.execute("CREATE UNIQUE INDEX ux_models_mark_name ON Models (mark_id, name)")
+    cursor.execute("CREATE UNIQUE INDEX ux_generations_model_name ON Generations (model_id, name)")
+    cursor.execute("""
+        CREATE UNIQUE INDEX ux_specifications_generation_fingerprint
+        ON Specifications (generation_id, fingerprint)
+    """)
+
+
+# Rows of car_search (migrations 6 and 10) built from the catalogue tables; append a WHERE clause.
+# Same joins as the search always used: no row for a specification without a model or mark.
+# A specification not linked to a generation (most of an older catalogue) takes its
+# model's production years, so that the year filters still find it.
+CAR_SEARCH_ROWS = """
+    SELECT Specifications.id, Marks.name, Marks.country, Models.name, Models.class,
+           Models.year_from, Models.year_to, Models.body_type,
+           Generations.name,
+           CASE WHEN Generations.id IS NULL THEN Models.year_from ELSE Generations.year_start END,
+           CASE WHEN Generations.id IS NULL THEN Models.year_to ELSE Generations.year_stop END,
+           Specifications.engine_type, Specifications.horse_power, Specifications.transmission,
+           Specifications.drive, Specifications.volume, Specifications.consumption_mixed,
+           Specifications.max_speed
+    FROM Specifications
+    INNER JOIN Models ON Models.id = Specifications.model_id
+    INNER JOIN Marks ON Marks.id = Models.mark_id
+    LEFT JOIN Generations ON Generations.id = Specifications.generation_id
+"""
+
+# Specifications of the OLD model / mark, for the car_search trigger bodies
+_OLD_MODEL_SPECIFICATIONS = "SELECT id FROM Specifications WHERE model_id = OLD.id"
+_OLD_MARK_SPECIFICATIONS = """
+    SELECT Specifications.id FROM Specifications
+    INNER JOIN Models ON Models.id = Specifications.model_id
+    WHERE Models.mark_id = OLD.id
+"""
+
+
+def fill_search_table(cursor, condition="", params=()):
+    """(Re)writes the car_search rows of the specifications matching condition, e.g. "WHERE Specifications.id >= ?"."""
+    cursor.execute(f"INSERT OR REPLACE INTO car_search {CAR_SEARCH_ROWS} {condition}", params)
+
+
+def rebuild_search_table(conn):
+    """Rewrites car_search from the catalogue tables, e.g. after they were changed with the triggers dropped."""
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM car_search")
+        fill_search_table(cursor)
+
+
+def add_search_table(cursor):
+    # One row per specification with exactly the columns of a search row, so a search
+    # reads one table; the triggers below keep it in step with the catalogue tables
+    cursor.execute("""
+        CREATE TABLE car_search (
+            id INTEGER PRIMARY KEY,  -- Specifications.id
+            mark_name TEXT,
+            country TEXT,
+            model_name TEXT,
+            car_class TEXT,
+            year_from INTEGER,
+            year_to INTEGER,
+            body_type TEXT,
+            generation_name TEXT,
+            generation_start INTEGER,
+            generation_end INTEGER,
+            engine_type TEXT,
+            horse_power INTEGER,
+            transmission TEXT,
+            drive TEXT,
+            volume REAL,
+            consumption_mixed REAL,
+            max_speed INTEGER
+        )
+    """)
+    fill_search_table(cursor)
+
+    # SearchForm filter combinations. Every index ends in the implicit id, so when all its
+    # columns are filtered on, a page is a range scan already in id order (no sort)
+    cursor.execute("CREATE INDEX idx_car_search_mark_model ON car_search (mark_name, model_name)")
+    cursor.execute("CREATE INDEX idx_car_search_model ON car_search (model_name)")
+    cursor.execute("CREATE INDEX idx_car_search_country ON car_search (country)")
+    cursor.execute("CREATE INDEX idx_car_search_class_body ON car_search (car_class, body_type)")
+    cursor.execute("CREATE INDEX idx_car_search_body ON car_search (body_type)")
+    cursor.execute("CREATE INDEX idx_car_search_years ON car_search (generation_start, generation_end)")
+    create_search_triggers(cursor)
+
+
+def create_search_triggers(cursor):
+    """The triggers that keep car_search in step with the catalogue tables; they embed CAR_SEARCH_ROWS."""
+    triggers = {
+        # Price is not shown in a search row, so repricing does not touch car_search
+        "specifications_insert": ("AFTER INSERT ON Specifications", """
+            INSERT OR REPLACE INTO car_search {rows} WHERE Specifications.id = NEW.id;
+        """),
+        "specifications_update": ("""
+            AFTER UPDATE OF id, model_id, generation_id, engine_type, horse_power, transmission, drive,
+                            volume, consumption_mixed, max_speed ON Specifications""", """
+            DELETE FROM car_search WHERE id = OLD.id;
+            INSERT OR REPLACE INTO car_search {rows} WHERE Specifications.id = NEW.id;
+        """),
+        "specifications_delete": ("AFTER DELETE ON Specifications", """
+            DELETE FROM car_search WHERE id = OLD.id;
+        """),
+        "marks_insert": ("AFTER INSERT ON Marks", """
+            INSERT OR REPLACE INTO car_search {rows} WHERE Models.mark_id = NEW.id;
+        """),
+        "marks_update": ("AFTER UPDATE OF id, name, country ON Marks", """
+            DELETE FROM car_search WHERE id IN ({old_mark});
+            INSERT OR REPLACE INTO car_search {rows} WHERE Models.mark_id = NEW.id;
+        """),
+        "marks_delete": ("AFTER DELETE ON Marks", """
+            DELETE FROM car_search WHERE id IN ({old_mark});
+        """),
+        "models_insert": ("AFTER INSERT ON Models", """
+            INSERT OR REPLACE INTO car_search {rows} WHERE Specifications.model_id = NEW.id;
+        """),
+        "models_update": ("AFTER UPDATE OF id, name, class, year_from, year_to, body_type, mark_id ON Models", """
+            DELETE FROM car_search WHERE id IN ({old_model});
+            INSERT OR REPLACE INTO car_search {rows} WHERE Specifications.model_id = NEW.id;
+        """),
+        "models_delete": ("AFTER DELETE ON Models", """
+            DELETE FROM car_search WHERE id IN ({old_model});
+        """),
+        # Generations are LEFT JOINed: their rows stay, with the new (or no) generation
+        "generations_insert": ("AFTER INSERT ON Generations", """
+            INSERT OR REPLACE INTO car_search {rows} WHERE Specifications.generation_id = NEW.id;
+        """),
+        "generations_update": ("AFTER UPDATE OF id, name, year_start, year_stop ON Generations", """
+            INSERT OR REPLACE INTO car_search {rows} WHERE Specifications.generation_id IN (OLD.id, NEW.id);
+        """),
+        "generations_delete": ("AFTER DELETE ON Generations", """
+            INSERT OR REPLACE INTO car_search {rows} WHERE Specifications.generation_id = OLD.id;
+        """),
+    }
+    for name, (event, body) in triggers.items():
+        body = body.format(rows=CAR_SEARCH_ROWS, old_model=_OLD_MODEL_SPECIFICATIONS,
+                           old_mark=_OLD_MARK_SPECIFICATIONS)
+        cursor.execute(f"CREATE TRIGGER car_search_{name} {event} BEGIN {body} END")
+
+
+def refresh_search_rows(cursor):
+    """Rewrites car_search and its triggers after a change to CAR_SEARCH_ROWS."""
+    for (name,) in cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name GLOB 'car_search_*'").fetchall():
+        cursor.execute(f'DROP TRIGGER "{name}"')
+    create_search_triggers(cursor)
+    cursor.execute("DELETE FROM car_search")
+    fill_search_table(cursor)
+
+
+# Columns summarised by model_stats and inventory_stats (migration 8): for each, the number
+# of cars with a numeric value, their sum (so the average is sum / count), minimum and maximum
+STATS_COLUMNS = ("price", "horse_power")
+STATS_FIELDS = ("cars",) + tuple(f"{column}_{part}" for column in STATS_COLUMNS
+                                 for part in ("count", "sum", "min", "max"))
+
+# inventory_stats dimension -> its value for a row of Models INNER JOIN Marks; missing values are ''
+STATS_DIMENSIONS = {
+    "brand": "IFNULL(Marks.name, '')",
+    "car_class": "IFNULL(Models.class, '')",
+    "body_type": "IFNULL(Models.body_type, '')",
+}
+
+# Like car_search, inventory_stats leaves out cars without a model or brand
+_STATS_MODELS = "FROM Models INNER JOIN Marks ON Marks.id = Models.mark_id"
+
+
+def _number(value):
+    """value if it is a number, else NULL; a price typed in as text is not summed."""
+    return f"CASE WHEN typeof({value}) IN ('integer', 'real') THEN {value} END"
+
+
+def _specification_stats(row):
+    """The stats fields of one specification row (OLD or NEW) as a model_stats contribution."""
+    stats = {"cars": "1"}
+    for column in STATS_COLUMNS:
+        number = _number(f"{row}.{column}")
+        stats.update({f"{column}_count": f"({number} IS NOT NULL)", f"{column}_sum": f"IFNULL({number}, 0)",
+                      f"{column}_min": number, f"{column}_max": number})
+    return stats
+
+
+def _specification_totals():
+    """The stats fields aggregated over Specifications rows."""
+    stats = {"cars": "COUNT(*)"}
+    for column in STATS_COLUMNS:
+        number = _number(f"Specifications.{column}")
+        stats.update({f"{column}_count": f"COUNT({number})", f"{column}_sum": f"IFNULL(SUM({number}), 0)",
+                      f"{column}_min": f"MIN({number})", f"{column}_max": f"MAX({number})"})
+    return stats
+
+
+def _model_totals():
+    """The stats fields aggregated over model_stats rows."""
+    return {field: f"{'MIN' if field.endswith('_min') else 'MAX' if field.endswith('_max') else 'SUM'}"
+                   f"(model_stats.{field})" for field in STATS_FIELDS}
+
+
+def _stats_changes(old, new, recompute):
+    """
+    SET clauses replacing contribution old of a group's stats with contribution new
+    (dicts field -> SQL; either may be None for an insert or a delete).
+
+    Counts and sums are adjusted. A minimum or maximum is only recomputed, with
+    the SQL from recompute(field), when old held it and new does not replace it.
+    """
+    changes = []
+    for field in STATS_FIELDS:
+        if field.endswith(("_min", "_max")):
+            pick, worse = ("MIN", ">") if field.endswith("_min") else ("MAX", "<")
+            value = field if new is None else f"COALESCE({pick}({field}, {new[field]}), {field}, {new[field]})"
+            if old is not None:
+                retracted = f"{old[field]} = {field}"
+                if new is not None:
+                    retracted += f" AND ({new[field]} IS NULL OR {new[field]} {worse} {old[field]})"
+                value = f"CASE WHEN {retracted} THEN {recompute(field)} ELSE {value} END"
+        else:
+            value = field + (f" - {old[field]}" if old else "") + (f" + {new[field]}" if new else "")
+        changes.append(f"{field} = {value}")
+    return ", ".join(changes)
+
+
+def _add_stats(table, key_columns, source):
+    """Adds the rows of source (key columns, then STATS_FIELDS; it must have a WHERE clause) to table."""
+    excluded = {field: f"excluded.{field}" for field in STATS_FIELDS}
+    return (f"INSERT INTO {table} ({', '.join(key_columns + STATS_FIELDS)}) {source} "
+            f"ON CONFLICT ({', '.join(key_columns)}) DO UPDATE SET {_stats_changes(None, excluded, None)}")
+
+
+def _model_recompute(field):
+    return (f"(SELECT {_specification_totals()[field]} FROM Specifications "
+            f"WHERE Specifications.model_id = model_stats.model_id)")
+
+
+def _group_recompute(dimension):
+    def recompute(field):
+        return (f"(SELECT {_model_totals()[field]} {_STATS_MODELS} "
+                f"INNER JOIN model_stats ON model_stats.model_id = Models.id "
+                f"WHERE {STATS_DIMENSIONS[dimension]} = inventory_stats.value)")
+    return recompute
+
+
+def _group_stats(dimension, condition=""):
+    """INSERT of the inventory_stats rows of a dimension from model_stats; condition filters the models."""
+    key = STATS_DIMENSIONS[dimension]
+    totals = ", ".join(_model_totals()[field] for field in STATS_FIELDS)
+    return (f"INSERT INTO inventory_stats (dimension, value, {', '.join(STATS_FIELDS)}) "
+            f"SELECT '{dimension}', {key}, {totals} {_STATS_MODELS} "
+            f"INNER JOIN model_stats ON model_stats.model_id = Models.id {condition} GROUP BY {key}")
+
+
+def _refresh_stats(values):
+    """Statements recomputing the inventory_stats rows whose value is in values[dimension] (an SQL list or subquery)."""
+    return "".join(f"""
+        DELETE FROM inventory_stats WHERE dimension = '{dimension}' AND value IN ({values[dimension]});
+        {_group_stats(dimension, f"WHERE {STATS_DIMENSIONS[dimension]} IN ({values[dimension]})")};
+    """ for dimension in STATS_DIMENSIONS)
+
+
+def add_specification_stats(cursor, condition="", params=()):
+    """
+    Adds the specifications matching condition (e.g. "AND Specifications.id >= ?")
+    to model_stats; its triggers pass the change on to inventory_stats.
+    """
+    totals = ", ".join(_specification_totals()[field] for field in STATS_FIELDS)
+    cursor.execute(_add_stats("model_stats", ("model_id",), f"""
+        SELECT model_id, {totals} FROM Specifications
+        WHERE model_id IS NOT NULL {condition} GROUP BY model_id
+    """), params)
+
+
+def rebuild_stats_tables(conn):
+    """Rewrites model_stats and inventory_stats from the catalogue tables."""
+    with conn:
+        cursor = conn.cursor()
+        # Emptied first, so deleting model_stats has nothing to subtract from
+        cursor.execute("DELETE FROM inventory_stats")
+        cursor.execute("DELETE FROM model_stats")
+        add_specification_stats(cursor)
+
+
+def add_stats_tables(cursor):
+    # Per-model totals of the Specifications triggers below, and per brand, class and body
+    # type totals of the model_stats triggers, so a statistics view reads a few hundred rows
+    stats_columns = ",\n".join(f"""
+            {column}_count INTEGER NOT NULL,
+            {column}_sum REAL NOT NULL,
+            {column}_min REAL,
+            {column}_max REAL""" for column in STATS_COLUMNS)
+    cursor.execute(f"""
+        CREATE TABLE model_stats (
+            model_id INTEGER PRIMARY KEY,  -- Specifications.model_id
+            cars INTEGER NOT NULL,{stats_columns}
+        )
+    """)
+    cursor.execute(f"""
+        CREATE TABLE inventory_stats (
+            dimension TEXT NOT NULL,  -- a STATS_DIMENSIONS key
+            value TEXT NOT NULL,
+            cars INTEGER NOT NULL,{stats_columns},
+            PRIMARY KEY (dimension, value)
+        )
+    """)
+
+    old = {field: f"OLD.{field}" for field in STATS_FIELDS}
+    new = {field: f"NEW.{field}" for field in STATS_FIELDS}
+    model_triggers = {
+        "insert": ("AFTER INSERT ON model_stats", "".join(
+            _add_stats("inventory_stats", ("dimension", "value"), f"""
+                SELECT '{dimension}', {key}, {', '.join(new.values())} {_STATS_MODELS} WHERE Models.id = NEW.model_id
+            """) + ";" for dimension, key in STATS_DIMENSIONS.items())),
+        "update": ("AFTER UPDATE ON model_stats", "".join(f"""
+            UPDATE inventory_stats SET {_stats_changes(old, new, _group_recompute(dimension))}
+            WHERE dimension = '{dimension}' AND value = (SELECT {key} {_STATS_MODELS} WHERE Models.id = NEW.model_id);
+        """ for dimension, key in STATS_DIMENSIONS.items())),
+        "delete": ("AFTER DELETE ON model_stats", "".join(f"""
+            UPDATE inventory_stats SET {_stats_changes(old, None, _group_recompute(dimension))}
+            WHERE dimension = '{dimension}' AND value = (SELECT {key} {_STATS_MODELS} WHERE Models.id = OLD.model_id);
+        """ for dimension, key in STATS_DIMENSIONS.items()) + "DELETE FROM inventory_stats WHERE cars = 0;"),
+    }
+    for name, (event, body) in model_triggers.items():
+        cursor.execute(f"CREATE TRIGGER inventory_stats_model_{name} {event} BEGIN {body} END")
+
+    add_specification_stats(cursor)
+
+    def add(row):
+        stats = _specification_stats(row)
+        return _add_stats("model_stats", ("model_id",), f"""
+            SELECT {row}.model_id, {', '.join(stats.values())} WHERE {row}.model_id IS NOT NULL
+        """) + ";"
+
+    def retract(row):
+        return f"""
+            UPDATE model_stats SET {_stats_changes(_specification_stats(row), None, _model_recompute)}
+            WHERE model_id = {row}.model_id;
+            DELETE FROM model_stats WHERE model_id = {row}.model_id AND cars = 0;
+        """
+
+    def model_values(*rows):
+        return {
+            "brand": f"SELECT IFNULL(name, '') FROM Marks WHERE id IN ({', '.join(f'{row}.mark_id' for row in rows)})",
+            "car_class": ", ".join(f"IFNULL({row}.class, '')" for row in rows),
+            "body_type": ", ".join(f"IFNULL({row}.body_type, '')" for row in rows),
+        }
+
+    def mark_values(*rows):
+        mark_ids = ", ".join(f"{row}.id" for row in rows)
+        return {
+            "brand": ", ".join(f"IFNULL({row}.name, '')" for row in rows),
+            "car_class": f"SELECT IFNULL(class, '') FROM Models WHERE mark_id IN ({mark_ids})",
+            "body_type": f"SELECT IFNULL(body_type, '') FROM Models WHERE mark_id IN ({mark_ids})",
+        }
+
+    def has_stats(*rows):
+        return f"EXISTS (SELECT 1 FROM model_stats WHERE model_id IN ({', '.join(f'{row}.id' for row in rows)}))"
+
+    def mark_has_stats(*rows):
+        return (f"EXISTS (SELECT 1 FROM Models INNER JOIN model_stats ON model_stats.model_id = Models.id "
+                f"WHERE Models.mark_id IN ({', '.join(f'{row}.id' for row in rows)}))")
+
+    triggers = {
+        "specifications_insert": ("AFTER INSERT ON Specifications", add("NEW")),
+        "specifications_update": ("""
+            AFTER UPDATE OF model_id, price, horse_power ON Specifications
+            WHEN OLD.model_id IS NEW.model_id""", f"""
+            UPDATE model_stats
+            SET {_stats_changes(_specification_stats("OLD"), _specification_stats("NEW"), _model_recompute)}
+            WHERE model_id = NEW.model_id;
+        """),
+        "specifications_move": ("""
+            AFTER UPDATE OF model_id ON Specifications
+            WHEN OLD.model_id IS NOT NEW.model_id""", retract("OLD") + add("NEW")),
+        "specifications_delete": ("AFTER DELETE ON Specifications", retract("OLD")),
+        # A model or brand moves all its cars between groups, so those groups are recomputed;
+        # models and brands without cars (e.g. just added by an import) are skipped
+        "models_insert": (f"AFTER INSERT ON Models WHEN {has_stats('NEW')}", _refresh_stats(model_values("NEW"))),
+        "models_update": (f"""
+            AFTER UPDATE OF id, mark_id, class, body_type ON Models
+            WHEN {has_stats('OLD', 'NEW')}""", _refresh_stats(model_values("OLD", "NEW"))),
+        "models_delete": (f"AFTER DELETE ON Models WHEN {has_stats('OLD')}", _refresh_stats(model_values("OLD"))),
+        "marks_insert": (f"AFTER INSERT ON Marks WHEN {mark_has_stats('NEW')}", _refresh_stats(mark_values("NEW"))),
+        "marks_update": (f"""
+            AFTER UPDATE OF id, name ON Marks
+            WHEN {mark_has_stats('OLD', 'NEW')}""", _refresh_stats(mark_values("OLD", "NEW"))),
+        "marks_delete": (f"AFTER DELETE ON Marks WHEN {mark_has_stats('OLD')}", _refresh_stats(mark_values("OLD"))),
+    }
+    for name, (event, body) in triggers.items():
+        cursor.execute(f"CREATE TRIGGER inventory_stats_{name} {event} BEGIN {body} END")
+
+
+# Entries of the specification change log kept by its prune trigger, which runs
+# on every CHANGE_LOG_PRUNE_INTERVAL-th entry
+CHANGE_LOG_SIZE = 100000
+CHANGE_LOG_PRUNE_INTERVAL = 1000
+
+
+# Ordered up-migrations: (version, description, SQL script or callable(cursor)).
+# Never edit an applied migration - append a new one instead.
+MIGRATIONS = [
+    (1, "base schema", """
+        CREATE TABLE IF NOT EXISTS Marks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            country TEXT
+        );
+
+        CREATE TABLE IF NOT EXISTS Models (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            class TEXT,
+            year_from INTEGER,
+            year_to INTEGER,
+            body_type TEXT,
+            mark_id INTEGER,
+            FOREIGN KEY (mark_id) REFERENCES Marks(id)
+        );
+
+        CREATE TABLE IF NOT EXISTS Generations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            year_start INTEGER,
+            year_stop INTEGER,
+            model_id INTEGER,
+            FOREIGN KEY (model_id) REFERENCES Models(id)
+        );
+
+        CREATE TABLE IF NOT EXISTS Specifications (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            engine_type TEXT,
+            horse_power INTEGER,
+            transmission TEXT,
+            drive TEXT,
+            volume REAL,
+            consumption_mixed REAL,
+            max_speed INTEGER,
+            price REAL,
+            model_id INTEGER,
+            FOREIGN KEY (model_id) REFERENCES Models(id)
+        );
+
+        CREATE TABLE IF NOT EXISTS Employees (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            login TEXT NOT NULL UNIQUE,
+            password TEXT NOT NULL
+        );
+    """),
+    (2, "join and search filter indexes", """
+        -- Join columns; the leading column of each composite also serves plain lookups
+        CREATE INDEX IF NOT EXISTS idx_models_mark_class_body ON Models (mark_id, class, body_type);
+        CREATE INDEX IF NOT EXISTS idx_generations_model_years ON Generations (model_id, year_start, year_stop);
+        CREATE INDEX IF NOT EXISTS idx_specifications_model_id ON Specifications (model_id);
+
+        -- SearchForm filters and cascades
+        CREATE INDEX IF NOT EXISTS idx_marks_name_country ON Marks (name, country);
+        CREATE INDEX IF NOT EXISTS idx_marks_country ON Marks (country);
+        CREATE INDEX IF NOT EXISTS idx_models_name_class_body ON Models (name, class, body_type);
+        CREATE INDEX IF NOT EXISTS idx_models_class_body ON Models (class, body_type);
+        CREATE INDEX IF NOT EXISTS idx_models_body_type ON Models (body_type);
+        CREATE INDEX IF NOT EXISTS idx_generations_years ON Generations (year_start, year_stop);
+    """),
+    (3, "link specifications to generations", """
+        ALTER TABLE Specifications ADD COLUMN generation_id INTEGER REFERENCES Generations(id);
+
+        -- Only models with a single generation can be backfilled unambiguously;
+        -- the rest stay NULL until the catalogue is re-imported by db_create.py
+        UPDATE Specifications
+        SET generation_id = (
+            SELECT Generations.id FROM Generations WHERE Generations.model_id = Specifications.model_id
+        )
+        WHERE model_id IN (
+            SELECT model_id FROM Generations GROUP BY model_id HAVING COUNT(*) = 1
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_specifications_generation_id ON Specifications (generation_id);
+    """),
+    (4, "full-text search index", """
+        -- One document per specification (rowid = Specifications.id)
+        CREATE VIRTUAL TABLE car_fts USING fts5 (
+            mark, model, generation, engine_type, transmission, drive,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '1 2 3'
+        );
+
+        INSERT INTO car_fts (rowid, mark, model, generation, engine_type, transmission, drive)
+        SELECT Specifications.id, Marks.name, Models.name, Generations.name,
+               Specifications.engine_type, Specifications.transmission, Specifications.drive
+        FROM Specifications
+        LEFT JOIN Models ON Models.id = Specifications.model_id
+        LEFT JOIN Marks ON Marks.id = Models.mark_id
+        LEFT JOIN Generations ON Generations.id = Specifications.generation_id;
+
+        CREATE TRIGGER car_fts_specifications_insert AFTER INSERT ON Specifications BEGIN
+            INSERT INTO car_fts (rowid, mark, model, generation, engine_type, transmission, drive)
+            VALUES (
+                NEW.id,
+                (SELECT Marks.name FROM Models JOIN Marks ON Marks.id = Models.mark_id WHERE Models.id = NEW.model_id),
+                (SELECT name FROM Models WHERE id = NEW.model_id),
+                (SELECT name FROM Generations WHERE id = NEW.generation_id),
+                NEW.engine_type, NEW.transmission, NEW.drive
+            );
+        END;
+
+        CREATE TRIGGER car_fts_specifications_update
+        AFTER UPDATE OF id, model_id, generation_id, engine_type, transmission, drive ON Specifications BEGIN
+            DELETE FROM car_fts WHERE rowid = OLD.id;
+            INSERT INTO car_fts (rowid, mark, model, generation, engine_type, transmission, drive)
+            VALUES (
+                NEW.id,
+                (SELECT Marks.name FROM Models JOIN Marks ON Marks.id = Models.mark_id WHERE Models.id = NEW.model_id),
+                (SELECT name FROM Models WHERE id = NEW.model_id),
+                (SELECT name FROM Generations WHERE id = NEW.generation_id),
+                NEW.engine_type, NEW.transmission, NEW.drive
+            );
+        END;
+
+        CREATE TRIGGER car_fts_specifications_delete AFTER DELETE ON Specifications BEGIN
+            DELETE FROM car_fts WHERE rowid = OLD.id;
+        END;
+
+        CREATE TRIGGER car_fts_marks_update AFTER UPDATE OF name ON Marks BEGIN
+            UPDATE car_fts SET mark = NEW.name
+            WHERE rowid IN (
+                SELECT Specifications.id FROM Specifications
+                JOIN Models ON Models.id = Specifications.model_id
+                WHERE Models.mark_id = NEW.id
+            );
+        END;
+
+        CREATE TRIGGER car_fts_marks_delete AFTER DELETE ON Marks BEGIN
+            UPDATE car_fts SET mark = NULL
+            WHERE rowid IN (
+                SELECT Specifications.id FROM Specifications
+                JOIN Models ON Models.id = Specifications.model_id
+                WHERE Models.mark_id = OLD.id
+            );
+        END;
+
+        CREATE TRIGGER car_fts_models_update AFTER UPDATE OF name, mark_id ON Models BEGIN
+            UPDATE car_fts
+            SET model = NEW.name, mark = (SELECT name FROM Marks WHERE id = NEW.mark_id)
+            WHERE rowid IN (SELECT id FROM Specifications WHERE model_id = NEW.id);
+        END;
+
+        CREATE TRIGGER car_fts_models_delete AFTER DELETE ON Models BEGIN
+            UPDATE car_fts SET model = NULL, mark = NULL
+            WHERE rowid IN (SELECT id FROM Specifications WHERE model_id = OLD.id);
+        END;
+
+        CREATE TRIGGER car_fts_generations_update AFTER UPDATE OF name ON Generations BEGIN
+            UPDATE car_fts SET generation = NEW.name
+            WHERE rowid IN (SELECT id FROM Specifications WHERE generation_id = NEW.id);
+        END;
+
+        CREATE TRIGGER car_fts_generations_delete AFTER DELETE ON Generations BEGIN
+            UPDATE car_fts SET generation = NULL
+            WHERE rowid IN (SELECT id FROM Specifications WHERE generation_id = OLD.id);
+        END;
+    """),
+    (5, "natural keys for catalogue sync", add_natural_keys),
+    (6, "flattened search table", add_search_table),
+    # Specifications whose range-filter columns changed, for column_store to refresh
+    # incrementally; a NULL specification_id asks for a full rebuild
+    (7, "specification change log", """
+        CREATE TABLE specification_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            specification_id INTEGER
+        );
+
+        CREATE TRIGGER specification_changes_insert AFTER INSERT ON Specifications BEGIN
+            INSERT INTO specification_changes (specification_id) VALUES (NEW.id);
+        END;
+
+        CREATE TRIGGER specification_changes_update
+        AFTER UPDATE OF id, price, horse_power, volume, consumption_mixed, max_speed ON Specifications BEGIN
+            INSERT INTO specification_changes (specification_id)
+            SELECT OLD.id WHERE OLD.id IS NOT NEW.id;
+            INSERT INTO specification_changes (specification_id) VALUES (NEW.id);
+        END;
+
+        CREATE TRIGGER specification_changes_delete AFTER DELETE ON Specifications BEGIN
+            INSERT INTO specification_changes (specification_id) VALUES (OLD.id);
+        END;
+    """),
+    (8, "inventory statistics tables", add_stats_tables),
+    # Caps the change log on every write path (GUI, CLI, imports, API), not
+    # only when the API's column store refreshes
+    (9, "change log pruning", f"""
+        DELETE FROM specification_changes
+        WHERE seq <= (SELECT MAX(seq) FROM specification_changes) - {CHANGE_LOG_SIZE};
+
+        CREATE TRIGGER specification_changes_prune AFTER INSERT ON specification_changes
+        WHEN NEW.seq % {CHANGE_LOG_PRUNE_INTERVAL} = 0 BEGIN
+            DELETE FROM specification_changes WHERE seq <= NEW.seq - {CHANGE_LOG_SIZE};
+        END;
+    """),
+    (10, "model years for specifications without a generation", refresh_search_rows),
+]
+
+
+def current_version(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.commit()
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+
+def apply_migration(conn, version, description, migration):
+    """Applies one migration and records it in schema_version, atomically."""
+    record = "INSERT INTO schema_version (version, description) VALUES (?, ?)"
+    try:
+        if callable(migration):
+            conn.execute("BEGIN")
+            cursor = conn.cursor()
+            migration(cursor)
+            cursor.execute(record, (version, description))
+            conn.commit()
+        else:
+            # executescript() bypasses implicit transactions, so open one explicitly
+            escaped = description.replace("'", "''")
+            conn.executescript(
+                f"BEGIN;\n{migration}\n"
+                f"INSERT INTO schema_version (version, description) VALUES ({version}, '{escaped}');\n"
+                f"COMMIT;"
+            )
+    except sqlite3.Error:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+
+
+def migrate(conn):
+    """
+    Brings the database up to the latest schema version.
+
+    :param conn: sqlite3 connection.
+    :return: list of applied migration versions.
+    """
+    version = current_version(conn)
+    applied = []
+    for migration_version, description, migration in MIGRATIONS:
+        if migration_version > version:
+            apply_migration(conn, migration_version, description, migration)
+            applied.append(migration_version)
+
+    if applied:
+        # Refresh planner statistics for the new indexes
+        conn.execute("ANALYZE")
+        conn.commit()
+    return applied
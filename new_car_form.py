@@ -2,29 +2,8 @@ import sqlite3
 from PyQt5.QtWidgets import (QLabel, QLineEdit, QPushButton, QVBoxLayout, QMessageBox,
                              QDialog, QComboBox, QCheckBox, QHBoxLayout, QWidget)
 
-
-def fetch_data(query, combo_box=None):
-    """
-    Executes an SQL query and returns the data.
-    If a combo_box is provided, populates it with the data.
-
-    :param query: SQL query to execute.
-    :param combo_box: QComboBox widget (optional).
-    :return: List of values from the query result.
-    """
-    try:
-        with sqlite3.connect('cars.db') as conn:
-            cursor = conn.cursor()
-            cursor.execute(query)
-            results = [row[0] for row in cursor.fetchall()]
-
-            if combo_box:  # If combo_box is provided, populate it with data
-                combo_box.addItems(results)
-
-            return results
-    except sqlite3.Error as e:
-        print(f"Error executing query: {e}")
-        return []
+import database
+import inventory
 
 
 class NewCarForm(QDialog):
@@ -68,6 +47,15 @@ class NewCarForm(QDialog):
         h_layout.addWidget(field)
         layout.addLayout(h_layout)
 
+    def distinct_values(self, table, column):
+        """Loader for add_field(): fills a combo box with the distinct values of a column."""
+        def load(combo_box):
+            try:
+                combo_box.addItems(database.get_distinct_values(table, column))
+            except sqlite3.Error as e:
+                QMessageBox.critical(self, "Error", f"Database error: {e}")
+        return load
+
     def create_checkbox(self, label_text, toggle_func):
         checkbox = QCheckBox(label_text)
         checkbox.stateChanged.connect(toggle_func)
@@ -89,9 +77,9 @@ class NewCarForm(QDialog):
         self.input_fields = {}
         self.add_field(layout, "Brand:", "input_mark", "line_edit")
         self.add_field(layout, "Model:", "input_model", "line_edit")
-        self.add_field(layout, "Country of Manufacture:", "combo_country", "combo_box", lambda cb: cb.addItems(fetch_data("SELECT DISTINCT country FROM Marks")))
-        self.add_field(layout, "Car Class:", "combo_class", "combo_box", lambda cb: cb.addItems(fetch_data("SELECT DISTINCT class FROM Models WHERE class IS NOT NULL")))
-        self.add_field(layout, "Body Type:", "combo_body_type", "combo_box", lambda cb: cb.addItems(fetch_data("SELECT DISTINCT body_type FROM Models WHERE body_type IS NOT NULL")))
+        self.add_field(layout, "Country of Manufacture:", "combo_country", "combo_box", self.distinct_values("Marks", "country"))
+        self.add_field(layout, "Car Class:", "combo_class", "combo_box", self.distinct_values("Models", "class"))
+        self.add_field(layout, "Body Type:", "combo_body_type", "combo_box", self.distinct_values("Models", "body_type"))
         self.add_field(layout, "Start Year of Production:", "input_year_from", "line_edit")
         self.add_field(layout, "End Year of Production:", "input_year_to", "line_edit")
         self.add_field(layout, "Price:", "input_price", "line_edit")
@@ -120,9 +108,9 @@ class NewCarForm(QDialog):
         self.layout.addWidget(widget)
 
         self.additional_fields = {}
-        self.add_field(layout, "Engine:", "engine_type", "combo_box", lambda cb: cb.addItems(fetch_data("SELECT DISTINCT engine_type FROM Specifications WHERE engine_type IS NOT NULL")))
-        self.add_field(layout, "Transmission:", "transmission", "combo_box", lambda cb: cb.addItems(fetch_data("SELECT DISTINCT transmission FROM Specifications WHERE transmission IS NOT NULL")))
-        self.add_field(layout, "Drive:", "drive", "combo_box", lambda cb: cb.addItems(fetch_data("SELECT DISTINCT drive FROM Specifications WHERE drive IS NOT NULL")))
+        self.add_field(layout, "Engine:", "engine_type", "combo_box", self.distinct_values("Specifications", "engine_type"))
+        self.add_field(layout, "Transmission:", "transmission", "combo_box", self.distinct_values("Specifications", "transmission"))
+        self.add_field(layout, "Drive:", "drive", "combo_box", self.distinct_values("Specifications", "drive"))
         self.add_field(layout, "Horsepower:", "horse_power", "line_edit")
         self.add_field(layout, "Engine Volume:", "volume", "line_edit")
         self.add_field(layout, "Fuel Consumption (per 100 km):", "consumption_mixed", "line_edit")
@@ -171,45 +159,9 @@ class NewCarForm(QDialog):
         }
 
         try:
-            with sqlite3.connect('cars.db') as conn:
-                cursor = conn.cursor()
-
-                # Insert or get brand ID
-                cursor.execute("""
-                    INSERT OR IGNORE INTO Marks (name, country)
-                    VALUES (?, ?)
-                """, (main["mark_name"], main["country"]))
-                cursor.execute("SELECT id FROM Marks WHERE name = ?", (main["mark_name"],))
-                mark_id = cursor.fetchone()[0]
-
-                # Insert model
-                cursor.execute("""
-                    INSERT INTO Models (name, year_from, year_to, class, body_type, mark_id)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (main["model_name"], main["year_from"], main["year_to"], main["car_class"], main["body_type"],
-                      mark_id))
-                model_id = cursor.lastrowid
-
-                # Insert generation
-                cursor.execute("""
-                    INSERT INTO Generations (name, year_start, year_stop, model_id)
-                    VALUES (?, ?, ?, ?)
-                """, (styling.get("generation"), styling.get("generation_year_from"), styling.get("generation_year_to"),
-                      model_id))
-
-                # Insert specifications
-                cursor.execute("""
-                    INSERT INTO Specifications (engine_type, transmission, volume, consumption_mixed, max_speed, drive, horse_power, model_id, price)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    specs.get("engine_type"), specs.get("transmission"), specs.get("volume"),
-                    specs.get("consumption_mixed"), specs.get("max_speed"), specs.get("drive"),
-                    specs.get("horse_power"), model_id, main["price"]
-                ))
-
-                conn.commit()
-                QMessageBox.information(self, "Success", "Car successfully added.")
-                self.close()
+            inventory.add_car(main, styling, specs)
+            QMessageBox.information(self, "Success", "Car successfully added.")
+            self.close()
 
         except sqlite3.Error as e:
             QMessageBox.critical(self, "Error", f"Database error: {e}")
@@ -218,14 +170,10 @@ class NewCarForm(QDialog):
         """
         Checks if the required fields have data.
         """
-        required_fields = {
-            "Brand": self.input_mark.text(),
-            "Model": self.input_model.text()
-        }
-
-        for field_name, value in required_fields.items():
-            if not value.strip():
-                QMessageBox.critical(self, "Error", f"The field \"{field_name}\" cannot be empty.")
-                return False
+        try:
+            inventory.validate_car({"mark_name": self.input_mark.text(), "model_name": self.input_model.text()})
+        except inventory.ValidationError as e:
+            QMessageBox.critical(self, "Error", str(e))
+            return False
 
         return True
@@ -0,0 +1,284 @@
+import functools
+import io
+import logging
+import os
+import signal
+import sqlite3
+import sys
+import threading
+import time
+
+# Statements slower than this (execute plus fetching the rows) go to the slow-query log
+SLOW_QUERY_MS = float(os.environ.get("CARS_SLOW_QUERY_MS", 100))
+SLOW_QUERY_LOG = os.environ.get("CARS_SLOW_QUERY_LOG", "slow_queries.log")
+
+# The log rotates at LOG_MAX_BYTES, keeping LOG_BACKUP_COUNT old files
+LOG_MAX_BYTES = 1 << 20
+LOG_BACKUP_COUNT = 5
+
+# Call sites kept per statement in reports, most frequent first
+REPORTED_CALL_SITES = 5
+
+# Frames skipped when looking for the code that issued a statement
+_INTERNAL_FILES = {"query_log.py", "contextlib.py"}
+_DATABASE_FILE = "database.py"
+_DATABASE_FILES = _INTERNAL_FILES | {_DATABASE_FILE}
+
+slow_log = logging.getLogger("cars.slow_queries")
+slow_log.setLevel(logging.INFO)
+slow_log.propagate = False
+# Reentrant, like QueryStats._lock: the dump signal handler runs on the main thread
+# between any two bytecodes, possibly while that thread holds the lock
+_log_lock = threading.RLock()
+
+
+def configure(threshold_ms=None, log_path=None):
+    """Changes the slow-query threshold and/or log file at runtime."""
+    global SLOW_QUERY_MS, SLOW_QUERY_LOG
+    if threshold_ms is not None:
+        SLOW_QUERY_MS = float(threshold_ms)
+    if log_path is not None:
+        with _log_lock:
+            SLOW_QUERY_LOG = log_path
+            for handler in list(slow_log.handlers):
+                slow_log.removeHandler(handler)
+                handler.close()
+
+
+def _log(message):
+    with _log_lock:
+        # The file is only created once there is something to write
+        if not slow_log.handlers:
+            # Imported here: it is slow to import and most runs never log a slow query
+            import logging.handlers
+            handler = logging.handlers.RotatingFileHandler(
+                SLOW_QUERY_LOG, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            slow_log.addHandler(handler)
+    slow_log.info(message)
+
+
+@functools.lru_cache(maxsize=1024)
+def normalize(sql):
+    return " ".join(sql.split())
+
+
+@functools.lru_cache(maxsize=None)
+def _file_name(path):
+    return os.path.basename(path)
+
+
+def call_site():
+    """
+    Where a statement comes from, as frames for format_site().
+
+    Statements issued through database.py name the outermost database.py
+    function (the one the forms call) and its caller.
+    """
+    frame = sys._getframe(1)
+    while frame is not None and _file_name(frame.f_code.co_filename) in _INTERNAL_FILES:
+        frame = frame.f_back
+    entry = None
+    while frame is not None and _file_name(frame.f_code.co_filename) in _DATABASE_FILES:
+        if _file_name(frame.f_code.co_filename) == _DATABASE_FILE:
+            entry = frame
+        frame = frame.f_back
+    # Formatting is left for the reports; this runs on every statement
+    return tuple((f.f_code, f.f_lineno) for f in (entry, frame) if f is not None)
+
+
+def format_site(site):
+    """E.g. "database.py:201 search_page <- search_form.py:179 perform_search"."""
+    return " <- ".join(f"{_file_name(code.co_filename)}:{line} {code.co_name}" for code, line in site) or "?"
+
+
+class QueryStats:
+    """Per-statement counters: calls, time, rows, slow calls and call sites."""
+
+    def __init__(self):
+        # Reentrant so that install_dump_signal()'s handler can take it (see _log_lock)
+        self._lock = threading.RLock()
+        self._statements = {}
+
+    def record(self, sql, elapsed, rows, site, slow):
+        with self._lock:
+            entry = self._statements.get(sql)
+            if entry is None:
+                entry = self._statements[sql] = {
+                    "calls": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0, "slow": 0, "call_sites": {},
+                }
+            elapsed_ms = elapsed * 1000
+            entry["calls"] += 1
+            entry["total_ms"] += elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+            entry["rows"] += rows
+            entry["slow"] += slow
+            entry["call_sites"][site] = entry["call_sites"].get(site, 0) + 1
+
+    def snapshot(self):
+        """Counters of every statement seen so far, most total time first."""
+        with self._lock:
+            statements = [(sql, dict(entry, call_sites=dict(entry["call_sites"])))
+                          for sql, entry in self._statements.items()]
+        report = []
+        for sql, entry in statements:
+            call_sites = sorted(entry["call_sites"].items(), key=lambda item: item[1], reverse=True)
+            entry["call_sites"] = [(format_site(site), calls) for site, calls in call_sites[:REPORTED_CALL_SITES]]
+            entry["mean_ms"] = entry["total_ms"] / entry["calls"]
+            report.append(dict(entry, sql=sql))
+        report.sort(key=lambda entry: entry["total_ms"], reverse=True)
+        return report
+
+    def reset(self):
+        with self._lock:
+            self._statements = {}
+
+    def dump(self, file=None, limit=20):
+        """Writes the top statements by total time as a text table."""
+        file = file or sys.stderr
+        report = self.snapshot()
+        file.write(f"{'calls':>8} {'total ms':>10} {'mean ms':>9} {'max ms':>9} {'rows':>9} {'slow':>5}  statement\n")
+        for entry in report[:limit]:
+            file.write(f"{entry['calls']:>8} {entry['total_ms']:>10.1f} {entry['mean_ms']:>9.2f} "
+                       f"{entry['max_ms']:>9.2f} {entry['rows']:>9} {entry['slow']:>5}  {entry['sql'][:120]}\n")
+            for site, calls in entry["call_sites"]:
+                file.write(f"{'':>55}{calls:>6} x {site}\n")
+        file.flush()
+
+
+stats = QueryStats()
+
+
+def query_plan(conn, sql, parameters):
+    try:
+        rows = sqlite3.Cursor(conn).execute("EXPLAIN QUERY PLAN " + sql, parameters).fetchall()
+    except sqlite3.Error as e:
+        return f"    (no plan: {e})"
+    return "\n".join(f"    {detail}" for row_id, parent, unused, detail in rows)
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """
+    Cursor that times every statement, including fetching its rows.
+
+    A statement is recorded once it is finished: when its rows are exhausted,
+    when the cursor runs the next statement, or when it is closed or dropped.
+    """
+
+    _statement = None
+
+    def _begin(self, sql, parameters, site):
+        self._finish()
+        self._statement = sql
+        self._parameters = parameters
+        self._site = site
+        self._elapsed = 0.0
+        self._rows = 0
+
+    def _finish(self):
+        if self._statement is None:
+            return
+        sql, self._statement = self._statement, None
+        slow = self._elapsed * 1000 >= SLOW_QUERY_MS
+        stats.record(normalize(sql), self._elapsed, self._rows, self._site, slow)
+        if slow:
+            plan = query_plan(self.connection, sql, self._parameters) if self._parameters is not None \
+                else "    (no plan: executemany)"
+            _log(f"{self._elapsed * 1000:.1f} ms, {self._rows} rows, {format_site(self._site)}\n"
+                 f"    {normalize(sql)}\n{plan}")
+
+    def _executed(self, started):
+        self._elapsed += time.perf_counter() - started
+        if self.description is None:
+            # Not a query: there are no rows to wait for
+            self._rows = max(self.rowcount, 0)
+            self._finish()
+
+    def execute(self, sql, parameters=()):
+        self._begin(sql, parameters, call_site())
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._executed(started)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._begin(sql, None, call_site())
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._executed(started)
+
+    def _fetched(self, started, rows, exhausted):
+        if self._statement is not None:
+            self._elapsed += time.perf_counter() - started
+            self._rows += rows
+            if exhausted:
+                self._finish()
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(started, row is not None, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(started, len(rows), not rows)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(started, len(rows), True)
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._fetched(started, 0, True)
+            raise
+        self._fetched(started, 1, False)
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finish()
+        except sqlite3.Error:
+            pass
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose cursors, including the ones made by execute(), are InstrumentedCursors."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def install_dump_signal(signum=getattr(signal, "SIGUSR1", None)):
+    """Dumps the counters to stderr and the slow-query log whenever the process gets the signal (POSIX)."""
+    if signum is None:
+        return False
+
+    def dump(signum, frame):
+        report = io.StringIO()
+        stats.dump(report)
+        sys.stderr.write(report.getvalue())
+        _log("query counters:\n" + report.getvalue())
+
+    signal.signal(signum, dump)
+    return True
@@ -1,11 +1,10 @@
-import sqlite3
+from PyQt5.QtCore import QStringListModel, QTimer
 from PyQt5.QtWidgets import QLabel, QLineEdit, QPushButton, QVBoxLayout, QMessageBox, QWidget, QComboBox, QFormLayout, \
-    QGroupBox, QHBoxLayout
+    QGroupBox, QHBoxLayout, QCompleter
 
-from delete_car_form import DeleteCarForm
-from edit_from import EditDataForm
-from new_car_form import NewCarForm
-from searh_result_form import SearchResultWindow
+import database
+from facets import facet_index
+from workers import BusyIndicator, QueryRunner
 
 
 class SearchForm(QWidget):
@@ -16,14 +15,30 @@ class SearchForm(QWidget):
     def init_ui(self):
         self.setWindowTitle("Car Search")
         self.layout = QVBoxLayout()
+        self.query_runner = QueryRunner(self)
+
+        # Free-text search over brands, models, generations and specifications
+        row_layout = QHBoxLayout()
+        row_layout.addWidget(QLabel("Quick Search:"))
+        self.input_quick_search = QLineEdit()
+        self.input_quick_search.setPlaceholderText("e.g. bmw x5 g0")
+        self.suggestions = QStringListModel(self)
+        completer = QCompleter(self.suggestions, self)
+        # Suggestions are already matched by the database
+        completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.input_quick_search.setCompleter(completer)
+        self.input_quick_search.textEdited.connect(self.update_suggestions)
+        self.input_quick_search.returnPressed.connect(self.perform_text_search)
+        row_layout.addWidget(self.input_quick_search)
+        self.layout.addLayout(row_layout)
 
         # Dictionary for field configuration
         fields = [
             ("Car Brand:", "input_brand", QComboBox, self.update_all_fields),
-            ("Country:", "input_country", QComboBox, None),
+            ("Country:", "input_country", QComboBox, self.refresh_facet_counts),
             ("Model:", "input_model", QComboBox, self.update_classes_and_bodies),
-            ("Car Class:", "input_class", QComboBox, None),
-            ("Body Type:", "input_body", QComboBox, None),
+            ("Car Class:", "input_class", QComboBox, self.refresh_facet_counts),
+            ("Body Type:", "input_body", QComboBox, self.refresh_facet_counts),
         ]
 
         for label_text, attr_name, widget_class, signal_handler in fields:
@@ -43,6 +58,18 @@ class SearchForm(QWidget):
         self.input_year_to = QLineEdit()
         self.layout.addWidget(self.input_year_from)
         self.layout.addWidget(self.input_year_to)
+        self.input_year_from.editingFinished.connect(self.refresh_facet_counts)
+        self.input_year_to.editingFinished.connect(self.refresh_facet_counts)
+
+        # Search filter -> combobox showing its values with match counts
+        self.facet_fields = {
+            "brand": self.input_brand,
+            "country": self.input_country,
+            "model": self.input_model,
+            "car_class": self.input_class,
+            "body_type": self.input_body,
+        }
+        self.facet_counts = {}
 
         # Buttons
         buttons = [
@@ -50,6 +77,7 @@ class SearchForm(QWidget):
             ("New Car", self.open_new_car_form),
             ("Edit Data", self.update_record),
             ("Delete Car", self.delete_car_by_id),
+            ("Statistics", self.open_statistics),
             ("Exit", self.close),
         ]
 
@@ -58,6 +86,9 @@ class SearchForm(QWidget):
             button.clicked.connect(btn_handler)
             self.layout.addWidget(button)
 
+        # Shown while queries are running in the background
+        self.layout.addWidget(BusyIndicator(self.query_runner))
+
         # Group for search results
         self.result_group = QGroupBox("Search Results")
         self.result_layout = QFormLayout()
@@ -68,158 +99,132 @@ class SearchForm(QWidget):
         # Set main layout
         self.setLayout(self.layout)
 
+        # Populate the comboboxes once the window is on screen
+        QTimer.singleShot(0, self.load_fields)
+
+    def load_fields(self):
         # Populate "Car Brand" field and update other fields
-        self.populate_combobox(self.input_brand, "SELECT DISTINCT name FROM marks")
+        self.populate_combobox(self.input_brand, facet_index.mark_names)
         self.update_all_fields()
 
-    def populate_combobox(self, combobox, query, params=()):
+    def populate_combobox(self, combobox, loader, *args):
+        """Resets the combobox to the empty value and fills it once the query finishes in the background."""
+        self.fill_combobox(combobox, [])
+        self.query_runner.submit(combobox, loader, args,
+                                 on_result=lambda values: self.fill_combobox(combobox, values),
+                                 on_error=self.show_database_error)
+
+    def fill_combobox(self, combobox, values):
+        # Programmatic refills must not re-trigger the cascade
+        combobox.blockSignals(True)
         combobox.clear()
         combobox.addItem("")  # Add empty value
-        try:
-            conn = sqlite3.connect('cars.db', check_same_thread=False)
-            cursor = conn.cursor()
-            cursor.execute(query, params)
-            results = cursor.fetchall()
-            if results:
-                for row in results:
-                    combobox.addItem(row[0])
-        except sqlite3.Error as e:
-            QMessageBox.critical(self, "Error", f"Database Error: {e}")
-        finally:
-            conn.close()
+        for value in values:
+            combobox.addItem(self.facet_label(combobox, value), value)
+        combobox.blockSignals(False)
+
+    def combobox_value(self, combobox):
+        """Selected value without the count suffix, or "" for the empty item."""
+        return combobox.currentData() or ""
+
+    def facet_label(self, combobox, value):
+        facet = next(name for name, field in self.facet_fields.items() if field is combobox)
+        return f"{value} ({self.facet_counts.get(facet, {}).get(value, 0)})"
+
+    def refresh_facet_counts(self):
+        self.query_runner.submit("facet_counts", facet_index.counts, (self.search_filters(),),
+                                 on_result=self.apply_facet_counts,
+                                 on_error=self.show_database_error)
+
+    def apply_facet_counts(self, counts):
+        self.facet_counts = counts
+        for combobox in self.facet_fields.values():
+            for index in range(1, combobox.count()):
+                combobox.setItemText(index, self.facet_label(combobox, combobox.itemData(index)))
+
+    def show_database_error(self, error):
+        QMessageBox.critical(self, "Error", f"Database Error: {error}")
 
     def update_all_fields(self):
-        brand = self.input_brand.currentText()
+        brand = self.combobox_value(self.input_brand)
 
-        # Update countries
-        if brand:
-            query = "SELECT DISTINCT country FROM marks WHERE name = ?"
-            self.populate_combobox(self.input_country, query, (brand,))
-        else:
-            self.populate_combobox(self.input_country, "SELECT DISTINCT country FROM marks")
-
-        # Update models
-        if brand:
-            query = """
-                SELECT DISTINCT models.name
-                FROM models
-                JOIN marks ON models.mark_id = marks.id
-                WHERE marks.name = ?
-            """
-            self.populate_combobox(self.input_model, query, (brand,))
-        else:
-            self.populate_combobox(self.input_model, "SELECT DISTINCT name FROM models")
+        # Update countries and models
+        self.populate_combobox(self.input_country, facet_index.countries, brand)
+        self.populate_combobox(self.input_model, facet_index.model_names, brand)
 
         self.update_classes_and_bodies()
 
     def update_classes_and_bodies(self):
-        model = self.input_model.currentText()
-
-        # Update class
-        if model:
-            query = """
-                SELECT DISTINCT class
-                FROM models
-                WHERE name = ?
-            """
-            self.populate_combobox(self.input_class, query, (model,))
-        else:
-            self.populate_combobox(self.input_class, "SELECT DISTINCT class FROM models")
-
-        # Update body type
-        if model:
-            query = """
-                SELECT DISTINCT body_type
-                FROM models
-                WHERE name = ?
-            """
-            self.populate_combobox(self.input_body, query, (model,))
-        else:
-            self.populate_combobox(self.input_body, "SELECT DISTINCT body_type FROM models")
+        model = self.combobox_value(self.input_model)
+
+        # Update class and body type
+        self.populate_combobox(self.input_class, facet_index.classes, model)
+        self.populate_combobox(self.input_body, facet_index.body_types, model)
+
+        self.refresh_facet_counts()
+
+    def search_filters(self):
+        return {
+            "brand": self.combobox_value(self.input_brand),
+            "model": self.combobox_value(self.input_model),
+            "country": self.combobox_value(self.input_country),
+            "car_class": self.combobox_value(self.input_class),
+            "body_type": self.combobox_value(self.input_body),
+            "year_from": self.input_year_from.text(),
+            "year_to": self.input_year_to.text(),
+        }
 
     def perform_search(self):
-        brand = self.input_brand.currentText()
-        model = self.input_model.currentText()
-        country = self.input_country.currentText()
-        car_class = self.input_class.currentText()
-        body_type = self.input_body.currentText()
-        year_from = self.input_year_from.text()
-        year_to = self.input_year_to.text()
-
-        try:
-            conn = sqlite3.connect('cars.db')
-            cursor = conn.cursor()
-
-            # Dynamic SQL Query
-            query = """
-                SELECT 
-                    Marks.name AS MarkName, 
-                    Marks.country AS Country, 
-                    Models.name AS ModelName, 
-                    Models.class AS CarClass, 
-                    Models.year_from AS YearFrom, 
-                    Models.year_to AS YearTo, 
-                    Models.body_type AS BodyType, 
-                    Generations.name AS GenerationName, 
-                    Generations.year_start AS GenerationStart, 
-                    Generations.year_stop AS GenerationEnd, 
-                    Specifications.engine_type AS EngineType, 
-                    Specifications.horse_power AS HorsePower, 
-                    Specifications.transmission AS Transmission, 
-                    Specifications.drive AS DriveType, 
-                    Specifications.volume AS EngineVolume, 
-                    Specifications.consumption_mixed AS ConsumptionMixed, 
-                    Specifications.max_speed AS MaxSpeed
-                FROM 
-                    Marks
-                INNER JOIN 
-                    Models ON Marks.id = Models.mark_id
-                INNER JOIN 
-                    Generations ON Models.id = Generations.model_id
-                INNER JOIN 
-                    Specifications ON Models.id = Specifications.model_id
-                WHERE 1=1
-            """
-
-            params = []
-            filters = {
-                "Marks.name =": brand,
-                "Models.name =": model,
-                "Marks.country =": country,
-                "Models.class =": car_class,
-                "Models.body_type =": body_type,
-                "Generations.year_start >= ": year_from,
-                "Generations.year_stop <= ": year_to
-            }
-
-            for field, value in filters.items():
-                if value:
-                    query += f" AND {field} ?"
-                    params.append(value)
-
-            cursor.execute(query, tuple(params))
-            results = cursor.fetchall()
-
-            if results:
-                self.search_result_window = SearchResultWindow(results)
-                self.search_result_window.exec_()
-            else:
-                QMessageBox.information(self, "Search Results", "No data to display.")
-
-        except sqlite3.Error as e:
-            QMessageBox.critical(self, "Error", f"Database Error: {e}")
-        finally:
-            if conn:
-                conn.close()
+        # Only the first page is fetched here; the result view pulls the rest on scroll
+        filters = self.search_filters()
+        self.query_runner.submit("search", database.search_page, (filters,),
+                                 on_result=lambda page: self.show_search_results(
+                                     page, lambda token: database.search_page(filters, token=token), filters),
+                                 on_error=self.show_database_error)
+
+    def update_suggestions(self, text):
+        self.query_runner.submit("suggest", database.suggest, (text,),
+                                 on_result=self.suggestions.setStringList,
+                                 on_error=self.show_database_error)
+
+    def perform_text_search(self):
+        self.query_runner.cancel("suggest")
+        text = self.input_quick_search.text()
+        self.query_runner.submit("search", database.text_search, (text,),
+                                 on_result=lambda rows: self.show_search_results((rows, None), text=text),
+                                 on_error=self.show_database_error)
+
+    # The dialogs are imported when first opened, not at startup
+
+    def show_search_results(self, first_page, load_page=None, filters=None, text=None):
+        from searh_result_form import SearchResultModel, SearchResultWindow
+
+        if first_page[0]:
+            self.search_result_window = SearchResultWindow(SearchResultModel(first_page, load_page), filters, text)
+            self.search_result_window.exec_()
+        else:
+            QMessageBox.information(self, "Search Results", "No data to display.")
 
     def open_new_car_form(self):
+        from new_car_form import NewCarForm
+
         self.new_car_form = NewCarForm()
         self.new_car_form.exec_()
 
     def update_record(self):
-        self.edit_data_form = EditDataForm()
+        from edit_from import EditDataForm
+
+        self.edit_data_form = EditDataForm(self.search_filters())
         self.edit_data_form.exec_()
 
     def delete_car_by_id(self):
-        self.delete_car_form = DeleteCarForm()
+        from delete_car_form import DeleteCarForm
+
+        self.delete_car_form = DeleteCarForm(self.search_filters())
         self.delete_car_form.exec_()
+
+    def open_statistics(self):
+        from statistics_form import StatisticsWindow
+
+        self.statistics_window = StatisticsWindow()
+        self.statistics_window.exec_()
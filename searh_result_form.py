@@ -1,5 +1,10 @@
-from PyQt5.QtCore import Qt
-from PyQt5.QtWidgets import QDialog, QVBoxLayout, QScrollArea, QWidget, QLabel, QHBoxLayout, QPushButton, QSizePolicy
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, pyqtSignal
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QLabel, QHBoxLayout, QPushButton, QTableView, QAbstractItemView,
+                             QHeaderView, QMessageBox, QFileDialog)
+
+import database
+import inventory
+from workers import BusyIndicator, QueryRunner
 
 
 # Function to add a row (label + value)
@@ -60,55 +65,155 @@ class CarDetailWindow(QDialog):
         self.setLayout(self.layout)
 
 
-# Main window with search results
-class SearchResultWindow(QDialog):
-    def __init__(self, results):
-        super().__init__()
-        self.resize(400, 300)
-        self.setWindowTitle("Search Results")
-        self.layout = QVBoxLayout()
-
-        if results:
-            scroll_area = QScrollArea()
-            result_widget = QWidget()
-            result_layout = QVBoxLayout()
+class SearchResultModel(QAbstractTableModel):
+    """
+    Table model over search results that are fetched page by page.
 
-            # Adding rows with results
-            for row in results:
-                row_layout = QHBoxLayout()
+    The first page is passed in as (rows, token); the following ones are
+    requested with load_page(token) on the worker pool when the view scrolls
+    near the end of what is loaded. Without load_page the rows are final.
+    """
 
-                # Main car information
-                column_layout = QVBoxLayout()
-                column_layout.addWidget(QLabel(f"Brand: {row[0]}"))
-                column_layout.addWidget(QLabel(f"Model: {row[1]}"))
-                column_layout.addWidget(QLabel(f"Start Year: {row[4]}"))
+    load_failed = pyqtSignal(object)
 
-                # Button to view detailed information
-                detail_button = QPushButton("Details")
-                detail_button.clicked.connect(lambda checked, data=row: self.open_detail_window(data))
+    # (header, index in the search row)
+    COLUMNS = [
+        ("ID", database.SEARCH_ID_COLUMN),
+        ("Brand", 0),
+        ("Model", 2),
+        ("Country", 1),
+        ("Class", 3),
+        ("Body Type", 6),
+        ("Start Year", 4),
+    ]
 
-                # Add elements to the row
-                row_layout.addLayout(column_layout)
-                row_layout.addWidget(detail_button)
-                result_layout.addLayout(row_layout)
-                result_layout.addWidget(QLabel("\n"))
+    def __init__(self, first_page, load_page=None, parent=None):
+        super().__init__(parent)
+        self.load_page = load_page
+        self._rows, self._token = first_page
+        self._loading = False
+        self.query_runner = QueryRunner(self)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        value = self._rows[index.row()][self.COLUMNS[index.column()][1]]
+        return "" if value is None else str(value)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.COLUMNS[section][0]
+        return str(section + 1)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return (not parent.isValid() and self.load_page is not None
+                and self._token is not None and not self._loading)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        self._loading = True
+        self.query_runner.submit("page", self.load_page, (self._token,),
+                                 on_result=self.append_page, on_error=self.stop_loading)
+
+    def append_page(self, page):
+        rows, self._token = page
+        self._loading = False
+        if rows:
+            first = len(self._rows)
+            self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+            self._rows.extend(rows)
+            self.endInsertRows()
+
+    def stop_loading(self, error):
+        self._token = None
+        self._loading = False
+        self.load_failed.emit(error)
+
+    def row(self, row_number):
+        """Full search row, as passed to CarDetailWindow."""
+        return self._rows[row_number]
 
-            result_widget.setLayout(result_layout)
 
-            # Set size policy to avoid horizontal scrolling
-            result_widget.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Preferred)
-            scroll_area.setWidget(result_widget)
-            scroll_area.setWidgetResizable(True)
-            scroll_area.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)  # Disable horizontal scroll
+# Main window with search results
+class SearchResultWindow(QDialog):
+    # File dialog filter -> export format
+    EXPORT_FILTERS = {
+        "CSV (*.csv)": "csv",
+        "JSON Lines (*.jsonl)": "jsonl",
+        "Parquet (*.parquet)": "parquet",
+    }
+
+    def __init__(self, model, filters=None, text=None):
+        super().__init__()
+        # What the results were searched by, so the export can stream all of them again
+        self.filters = filters or {}
+        self.text = text
+        self.resize(600, 400)
+        self.setWindowTitle("Search Results")
+        self.layout = QVBoxLayout()
 
-            self.layout.addWidget(scroll_area)
-        else:
-            self.layout.addWidget(QLabel("No data available."))
+        self.model = model
+        self.model.setParent(self)
+
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.doubleClicked.connect(lambda index: self.open_detail_window(self.model.row(index.row())))
+        self.layout.addWidget(self.table)
+        self.layout.addWidget(BusyIndicator(self.model.query_runner))
+        self.model.load_failed.connect(
+            lambda error: QMessageBox.critical(self, "Error", f"Database Error: {error}"))
+
+        # Button to view detailed information about the selected row
+        button_layout = QHBoxLayout()
+        detail_button = QPushButton("Details")
+        detail_button.clicked.connect(self.open_selected_details)
+        export_button = QPushButton("Export...")
+        export_button.clicked.connect(self.export_results)
+        back_button = QPushButton("Back")
+        back_button.clicked.connect(self.close)
+        button_layout.addWidget(detail_button)
+        button_layout.addWidget(export_button)
+        button_layout.addWidget(back_button)
+        self.layout.addLayout(button_layout)
 
         self.setLayout(self.layout)
 
+    def open_selected_details(self):
+        index = self.table.currentIndex()
+        if index.isValid():
+            self.open_detail_window(self.model.row(index.row()))
 
     def open_detail_window(self, car_data):
         """Opens a window with detailed car information."""
         detail_window = CarDetailWindow(car_data)
         detail_window.exec_()
+
+    def export_results(self):
+        path, selected_filter = QFileDialog.getSaveFileName(self, "Export Results", "cars.csv",
+                                                            ";;".join(self.EXPORT_FILTERS))
+        if not path:
+            return
+        file_format = self.EXPORT_FILTERS.get(selected_filter, "csv")
+        if not path.lower().endswith(f".{file_format}"):
+            path += f".{file_format}"
+        # Runs in the background; the rows are streamed to the file, not loaded into the table
+        self.model.query_runner.submit("export", inventory.export, (path, self.filters, file_format, self.text),
+                                       on_result=self.show_export_result,
+                                       on_error=lambda error: QMessageBox.critical(self, "Error", str(error)))
+
+    def show_export_result(self, result):
+        QMessageBox.information(self, "Export", f"Exported {result['rows']} rows in {result['seconds']:.1f} s "
+                                                f"({result['rows_per_sec']:.0f} rows/sec).")
@@ -0,0 +1,35 @@
+import os
+import sys
+import time
+
+# Taken when this module is first imported, so import it before anything else
+STARTED = time.perf_counter()
+
+# The login window should be on screen within this many milliseconds
+TARGET_MS = 300
+
+# Set CARS_STARTUP_REPORT=1 to print the report
+ENABLED = os.environ.get("CARS_STARTUP_REPORT", "") not in ("", "0")
+
+_phases = []
+
+
+def mark(phase):
+    """Records that a start-up phase has just finished."""
+    _phases.append((phase, time.perf_counter()))
+
+
+def report(file=None):
+    """Prints how long every phase took and the total against TARGET_MS."""
+    if not ENABLED:
+        return
+    file = file or sys.stderr
+    previous = STARTED
+    file.write("Startup timing:\n")
+    for phase, finished in _phases:
+        file.write(f"  {phase:<24} {(finished - previous) * 1000:7.1f} ms\n")
+        previous = finished
+    total_ms = (previous - STARTED) * 1000
+    verdict = "within" if total_ms <= TARGET_MS else "OVER"
+    file.write(f"  {'total':<24} {total_ms:7.1f} ms ({verdict} the {TARGET_MS} ms target)\n")
+    file.flush()
@@ -0,0 +1,112 @@
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, QPushButton, QTableView,
+                             QAbstractItemView, QHeaderView, QMessageBox)
+
+import database
+from workers import BusyIndicator, QueryRunner
+
+
+class StatisticsModel(QAbstractTableModel):
+    """Rows of database.get_statistics(), with averages rounded for display."""
+
+    # (header, index in the statistics row); the first header is the grouping's
+    COLUMNS = [
+        ("", 0),
+        ("Cars", 1),
+        ("Min Price", 2),
+        ("Avg Price", 3),
+        ("Max Price", 4),
+        ("Min HP", 5),
+        ("Avg HP", 6),
+        ("Max HP", 7),
+    ]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []
+        self._group_header = ""
+
+    def set_rows(self, group_header, rows):
+        self.beginResetModel()
+        self._group_header = group_header
+        self._rows = rows
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.TextAlignmentRole and index.column() > 0:
+            return Qt.AlignRight | Qt.AlignVCenter
+        if role != Qt.DisplayRole:
+            return None
+        value = self._rows[index.row()][self.COLUMNS[index.column()][1]]
+        if index.column() == 0:
+            return value or "(not set)"
+        if value is None:
+            return ""
+        return f"{value:,.0f}" if isinstance(value, float) else f"{value:,}"
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self._group_header if section == 0 else self.COLUMNS[section][0]
+        return str(section + 1)
+
+
+class StatisticsWindow(QDialog):
+    """Number of cars and price / horse power ranges per brand, class or body type."""
+
+    # Combobox label -> database.STATS_DIMENSIONS value
+    GROUPINGS = {
+        "Brand": "brand",
+        "Class": "car_class",
+        "Body Type": "body_type",
+    }
+
+    def __init__(self):
+        super().__init__()
+        self.resize(800, 500)
+        self.setWindowTitle("Inventory Statistics")
+        self.query_runner = QueryRunner(self)
+        self.layout = QVBoxLayout()
+
+        group_layout = QHBoxLayout()
+        group_layout.addWidget(QLabel("Group by:"))
+        self.input_grouping = QComboBox()
+        self.input_grouping.addItems(self.GROUPINGS)
+        self.input_grouping.currentTextChanged.connect(self.load_statistics)
+        group_layout.addWidget(self.input_grouping)
+        group_layout.addStretch()
+        self.layout.addLayout(group_layout)
+
+        self.model = StatisticsModel(self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.layout.addWidget(self.table)
+        self.layout.addWidget(BusyIndicator(self.query_runner))
+
+        back_button = QPushButton("Back")
+        back_button.clicked.connect(self.close)
+        self.layout.addWidget(back_button)
+
+        self.setLayout(self.layout)
+        self.load_statistics(self.input_grouping.currentText())
+
+    def load_statistics(self, grouping):
+        # The statistics tables hold a few hundred rows, but keep the GUI thread off the database anyway
+        self.query_runner.submit("statistics", database.get_statistics, (self.GROUPINGS[grouping],),
+                                 on_result=lambda rows: self.model.set_rows(grouping, rows),
+                                 on_error=self.show_database_error)
+
+    def show_database_error(self, error):
+        QMessageBox.critical(self, "Error", f"Database error: {error}")
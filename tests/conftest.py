@@ -0,0 +1,33 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+import database  # noqa: E402
+import migrations  # noqa: E402
+from writes import WRITES  # noqa: E402
+
+
+@pytest.fixture
+def catalogue(tmp_path):
+    """A migrated copy of the shipped cars.db, opened through database.db; yields its connection."""
+    path = tmp_path / "cars.db"
+    shutil.copy(os.path.join(REPO, "cars.db"), path)
+    previous = database.db.path
+    database.db.close()
+    database.db.path = str(path)
+    conn = database.db.connection()
+    migrations.migrate(conn)
+    yield conn
+    database.db.close()
+    database.db.path = previous
+
+
+@pytest.fixture(params=list(WRITES))
+def written(request, catalogue):
+    """The catalogue after one of the writes.WRITES; yields (connection, specification ids it logs or None)."""
+    yield catalogue, WRITES[request.param](catalogue)
@@ -0,0 +1,45 @@
+import asyncio
+import json
+
+import api_server
+
+
+def test_unexpected_error_is_a_json_500(catalogue, monkeypatch, caplog):
+    server = api_server.ApiServer(read_connections=1)
+
+    def broken(params):
+        raise KeyError("page")
+
+    monkeypatch.setattr(server, "search", broken)
+    try:
+        status, body = asyncio.run(server.respond("GET", "/search?brand=Alpina"))
+    finally:
+        server.executor.shutdown()
+        server.cache.close()
+
+    assert status == 500
+    assert json.loads(body) == {"error": "Internal server error."}
+    assert "/search?brand=Alpina" in caplog.text
+
+
+def test_response_of_a_changed_database_is_not_cached(catalogue, monkeypatch):
+    server = api_server.ApiServer(read_connections=1)
+    search = server.search
+
+    def search_during_write(params):
+        rows = search(params)
+        # Committed after the rows were read, before the response is cached
+        with catalogue:
+            catalogue.execute("UPDATE Specifications SET price = price + 1 WHERE id = (SELECT MIN(id) FROM Specifications)")
+        return rows
+
+    try:
+        asyncio.run(server.respond("GET", "/search?brand=Alpina"))
+        assert len(server.cache.entries) == 1
+
+        monkeypatch.setattr(server, "search", search_during_write)
+        asyncio.run(server.respond("GET", "/search?brand=Acura"))
+        assert not server.cache.entries
+    finally:
+        server.executor.shutdown()
+        server.cache.close()
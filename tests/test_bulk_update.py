@@ -0,0 +1,59 @@
+import math
+
+import pytest
+
+import inventory
+
+
+@pytest.mark.parametrize("text, change", [
+    ("*1.05", ("multiply", 1.05)),
+    ("×1.05", ("multiply", 1.05)),
+    ("+500", ("add", 500.0)),
+    ("-500", ("add", -500.0)),
+    ("  +5 ", ("add", 5.0)),
+    ("-0.5", ("add", -0.5)),
+    ("30000", ("set", "30000")),
+    ("", ("set", "")),
+])
+def test_numeric_column(text, change):
+    assert inventory.parse_bulk_change("specifications", "price", text) == ("specifications", "price") + change
+
+
+@pytest.mark.parametrize("text", ["*x", "+", "-", "*", "+1e999", "*nan", "-500 km"])
+def test_relative_value_must_be_a_number(text):
+    with pytest.raises(inventory.ValidationError):
+        inventory.parse_bulk_change("specifications", "price", text)
+
+
+@pytest.mark.parametrize("text", ["+S", "-", "*x", "×"])
+def test_text_column_takes_the_value_as_is(text):
+    assert inventory.parse_bulk_change("models", "class", text) == ("models", "class", "set", text)
+
+
+def test_column_must_be_editable():
+    with pytest.raises(inventory.ValidationError):
+        inventory.parse_bulk_change("specifications", "id", "+1")
+
+
+def prices(conn, brand):
+    return conn.execute("""
+        SELECT Specifications.id, Specifications.price, Specifications.horse_power FROM Specifications
+        INNER JOIN car_search ON car_search.id = Specifications.id
+        WHERE car_search.mark_name = ? ORDER BY Specifications.id
+    """, (brand,)).fetchall()
+
+
+def test_relative_changes(catalogue):
+    before = prices(catalogue, "Alpina")
+    changes = [inventory.parse_bulk_change("specifications", "price", "-500"),
+               inventory.parse_bulk_change("specifications", "horse_power", "*1.1")]
+    assert inventory.bulk_update(changes, filters={"brand": "Alpina"}, dry_run=True) == {"specifications": len(before)}
+    assert prices(catalogue, "Alpina") == before
+
+    assert inventory.bulk_update(changes, filters={"brand": "Alpina"}) == {"specifications": len(before)}
+    after = prices(catalogue, "Alpina")
+    for (row_id, price, horse_power), (after_id, after_price, after_horse_power) in zip(before, after):
+        assert after_id == row_id
+        assert after_price == (None if price is None else price - 500)
+        # An INTEGER column stays whole; SQLite rounds halves up, not to even
+        assert after_horse_power == (None if horse_power is None else math.floor(horse_power * 1.1 + 0.5))
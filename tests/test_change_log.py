@@ -0,0 +1,27 @@
+import pytest
+
+import migrations
+from writes import WRITES
+
+
+@pytest.mark.parametrize("write", list(WRITES))
+def test_writes_log_their_specifications(catalogue, write):
+    seq = catalogue.execute("SELECT IFNULL(MAX(seq), 0) FROM specification_changes").fetchone()[0]
+    changed = WRITES[write](catalogue) or set()
+    logged = {row[0] for row in catalogue.execute(
+        "SELECT specification_id FROM specification_changes WHERE seq > ?", (seq,))}
+    assert logged == changed
+
+
+def test_writes_prune_the_change_log(catalogue):
+    specifications = catalogue.execute("SELECT COUNT(*) FROM Specifications").fetchone()[0]
+    repricings = migrations.CHANGE_LOG_SIZE // specifications + 2
+    with catalogue:
+        for _ in range(repricings):
+            catalogue.execute("UPDATE Specifications SET price = price + 1")
+
+    count, oldest, newest = catalogue.execute(
+        "SELECT COUNT(*), MIN(seq), MAX(seq) FROM specification_changes").fetchone()
+    assert newest >= repricings * specifications
+    assert count == newest - oldest + 1
+    assert migrations.CHANGE_LOG_SIZE <= count < migrations.CHANGE_LOG_SIZE + migrations.CHANGE_LOG_PRUNE_INTERVAL
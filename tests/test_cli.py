@@ -0,0 +1,19 @@
+import sys
+
+import cli
+import database
+
+
+def run(monkeypatch, *args):
+    monkeypatch.setattr(sys, "argv", ["cli.py", "--db", database.db.path] + list(args))
+    return cli.main()
+
+
+def test_rebuild_commands_exit_zero(catalogue, monkeypatch):
+    assert run(monkeypatch, "rebuild-search") == 0
+    assert run(monkeypatch, "rebuild-stats") == 0
+
+
+def test_unwritable_export_is_reported(catalogue, monkeypatch, tmp_path, capsys):
+    assert run(monkeypatch, "export", str(tmp_path / "missing" / "cars.csv")) == 1
+    assert capsys.readouterr().err.startswith("Error: ")
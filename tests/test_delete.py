@@ -0,0 +1,69 @@
+import pytest
+
+import inventory
+
+
+def brand_rows(conn, brand):
+    """(models, generations, marks) still stored for a brand."""
+    models = conn.execute("""
+        SELECT COUNT(*) FROM Models INNER JOIN Marks ON Marks.id = Models.mark_id WHERE Marks.name = ?
+    """, (brand,)).fetchone()[0]
+    generations = conn.execute("""
+        SELECT COUNT(*) FROM Generations
+        INNER JOIN Models ON Models.id = Generations.model_id
+        INNER JOIN Marks ON Marks.id = Models.mark_id
+        WHERE Marks.name = ?
+    """, (brand,)).fetchone()[0]
+    marks = conn.execute("SELECT COUNT(*) FROM Marks WHERE name = ?", (brand,)).fetchone()[0]
+    return models, generations, marks
+
+
+def test_cleanup_removes_generations_of_emptied_models(catalogue):
+    # Most Alpina specifications have no generation_id, so their generations are
+    # only reachable through the model
+    unlinked = catalogue.execute("""
+        SELECT COUNT(*) FROM car_search
+        INNER JOIN Specifications ON Specifications.id = car_search.id
+        WHERE car_search.mark_name = 'Alpina' AND Specifications.generation_id IS NULL
+    """).fetchone()[0]
+    assert unlinked
+    models, generations, marks = brand_rows(catalogue, "Alpina")
+
+    counts = inventory.delete_cars(filters={"brand": "Alpina"}, cleanup=True)
+
+    assert brand_rows(catalogue, "Alpina") == (0, 0, 0)
+    assert (counts["models"], counts["generations"], counts["marks"]) == (models, generations, marks)
+
+
+def test_cleanup_keeps_parents_with_cars_left(catalogue):
+    model_id, first, second = catalogue.execute("""
+        SELECT model_id, MIN(id), MAX(id) FROM Specifications
+        WHERE model_id IS NOT NULL GROUP BY model_id HAVING COUNT(*) > 1 LIMIT 1
+    """).fetchone()
+    generations = catalogue.execute("SELECT COUNT(*) FROM Generations WHERE model_id = ?", (model_id,)).fetchone()[0]
+
+    counts = inventory.delete_cars([first], cleanup=True)
+
+    assert counts["specifications"] == 1
+    assert counts["models"] == counts["marks"] == 0
+    assert catalogue.execute("SELECT COUNT(*) FROM Models WHERE id = ?", (model_id,)).fetchone()[0] == 1
+    remaining = catalogue.execute("SELECT COUNT(*) FROM Generations WHERE model_id = ?", (model_id,)).fetchone()[0]
+    assert remaining == generations - counts["generations"]
+
+
+def test_dry_run_deletes_nothing(catalogue):
+    before = catalogue.execute("SELECT COUNT(*) FROM Specifications").fetchone()[0]
+    counts = inventory.delete_cars(filters={"brand": "Alpina"}, cleanup=True, dry_run=True)
+    assert counts["specifications"] > 0
+    assert catalogue.execute("SELECT COUNT(*) FROM Specifications").fetchone()[0] == before
+    assert brand_rows(catalogue, "Alpina")[2] == 1
+
+
+def test_zero_bound_is_a_filter(catalogue):
+    # price_min=0 selects the cars priced 0 or more instead of being refused as "no filter"
+    counts = inventory.delete_cars(filters={"price_min": 0}, dry_run=True)
+    assert counts["specifications"] == catalogue.execute(
+        "SELECT COUNT(*) FROM Specifications WHERE price >= 0").fetchone()[0]
+
+    with pytest.raises(inventory.ValidationError):
+        inventory.delete_cars(filters={"price_min": None, "brand": ""})
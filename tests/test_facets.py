@@ -0,0 +1,77 @@
+"""FacetIndex must answer like the SQL it replaces: the cascade queries and GROUP BY counts over car_search."""
+import pytest
+
+import database
+import facets
+
+# car_search column of each facet
+COLUMNS = {"brand": "mark_name", "country": "country", "model": "model_name",
+           "car_class": "car_class", "body_type": "body_type"}
+
+FILTERS = [
+    {},
+    {"brand": "Alfa Romeo"},
+    {"brand": "Alpina", "body_type": "седан"},
+    {"country": "Германия", "year_from": "2000"},
+    {"brand": "Acura", "model": "CL", "year_to": "2010"},
+    {"brand": "Alfa Romeo", "country": "Япония"},
+    {"year_from": "1995", "year_to": "2015", "car_class": "D"},
+]
+
+
+def expected_counts(conn, filters):
+    """facet -> {value: count}, each facet counted under every filter but its own."""
+    counts = {}
+    for facet, column in COLUMNS.items():
+        conditions, params = database.filter_conditions(dict(filters, **{facet: None}))
+        counts[facet] = dict(conn.execute(
+            f"SELECT car_search.{column}, COUNT(*) FROM car_search WHERE 1=1{conditions} GROUP BY 1", params))
+    return counts
+
+
+@pytest.fixture
+def index(catalogue):
+    index = facets.FacetIndex()
+    yield index
+    index.close()
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_counts(catalogue, index, filters):
+    assert index.counts(filters) == expected_counts(catalogue, filters)
+
+
+def test_counts_after_write(written):
+    conn, logged = written
+    index = facets.FacetIndex()
+    try:
+        for filters in FILTERS:
+            assert index.counts(filters) == expected_counts(conn, filters)
+    finally:
+        index.close()
+
+
+def test_counts_follow_writes(catalogue, index):
+    index.counts({})
+    with catalogue:
+        catalogue.execute("DELETE FROM Specifications WHERE id IN (SELECT id FROM car_search WHERE mark_name = 'Alpina')")
+    assert index.counts({}) == expected_counts(catalogue, {})
+    assert "Alpina" not in index.counts({})["brand"]
+
+
+def values(column):
+    return sorted(value for value in column if value is not None)
+
+
+def test_cascade(catalogue, index):
+    assert list(index.mark_names()) == values(database.get_mark_names())
+    assert list(index.countries()) == values(database.get_countries())
+    assert list(index.model_names()) == values(database.get_model_names())
+    assert list(index.classes()) == values(database.get_classes())
+    assert list(index.body_types()) == values(database.get_body_types())
+    for brand in database.get_mark_names():
+        assert list(index.countries(brand)) == values(database.get_countries(brand))
+        assert list(index.model_names(brand)) == values(database.get_model_names(brand))
+    for model in database.get_model_names():
+        assert list(index.classes(model)) == values(database.get_classes(model))
+        assert list(index.body_types(model)) == values(database.get_body_types(model))
@@ -0,0 +1,60 @@
+"""car_fts (free-text search) against the catalogue, and text_search() / suggest() over it."""
+import database
+
+FTS_ROWS = """
+    SELECT Specifications.id, Marks.name, Models.name, Generations.name,
+           Specifications.engine_type, Specifications.transmission, Specifications.drive
+    FROM Specifications
+    LEFT JOIN Models ON Models.id = Specifications.model_id
+    LEFT JOIN Marks ON Marks.id = Models.mark_id
+    LEFT JOIN Generations ON Generations.id = Specifications.generation_id
+    ORDER BY Specifications.id
+"""
+
+
+def assert_fts_table(conn):
+    assert conn.execute("""
+        SELECT rowid, mark, model, generation, engine_type, transmission, drive FROM car_fts ORDER BY rowid
+    """).fetchall() == conn.execute(FTS_ROWS).fetchall()
+
+
+def test_shipped_catalogue(catalogue):
+    assert_fts_table(catalogue)
+
+
+def test_after_write(written):
+    conn, logged = written
+    assert_fts_table(conn)
+
+
+def test_words_are_prefixes(catalogue):
+    rows = database.text_search("alp")
+    assert rows
+    assert {row[database.SEARCH_COLUMN_NAMES.index("MarkName")] for row in rows} == {"Alpina"}
+    assert database.text_search("alfa rom") == database.text_search("Alfa Romeo", database.TEXT_SEARCH_LIMIT)
+
+
+def test_best_rank_first(catalogue):
+    ranks = dict(catalogue.execute("""
+        SELECT rowid, bm25(car_fts) FROM car_fts WHERE car_fts MATCH '"alfa"* "romeo"*'
+    """).fetchall())
+    found = [row[database.SEARCH_ID_COLUMN] for row in database.text_search("alfa romeo", 20)]
+    assert len(ranks) > 20
+    assert [ranks[specification_id] for specification_id in found] == sorted(ranks.values())[:20]
+
+
+def test_limit_and_empty_text(catalogue):
+    assert len(database.text_search("a", 5)) == 5
+    assert database.text_search("   ") == []
+    assert database.suggest("") == []
+
+
+def test_quotes_are_searched_as_text(catalogue):
+    assert database.text_search('"alpina') == database.text_search("alpina")
+
+
+def test_suggestions(catalogue):
+    suggestions = database.suggest("alp", limit=5)
+    assert 0 < len(suggestions) <= 5
+    assert len(set(suggestions)) == len(suggestions)
+    assert all(suggestion.startswith("Alpina ") for suggestion in suggestions)
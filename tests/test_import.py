@@ -0,0 +1,30 @@
+import json
+
+import pytest
+
+import db_create
+
+MARKS = [
+    {"name": 'Quote " and brackets ]}', "models": [{"name": "[E36]", "generations": []}]},
+    {"name": "Backslash \\", "models": [{"name": "{x}", "class": None}]},
+    {"name": "Марка", "models": []},
+]
+
+
+@pytest.mark.parametrize("chunk_size, read_size", [(1, 3), (40, 7), (db_create.READ_SIZE, db_create.READ_SIZE)])
+def test_mark_texts_decode_to_the_marks(tmp_path, chunk_size, read_size):
+    path = tmp_path / "dump.json"
+    path.write_text(" [\n" + ",\n".join(json.dumps(mark, ensure_ascii=False) for mark in MARKS) + "\n]\n",
+                    encoding="utf-8")
+
+    texts = list(db_create.iter_mark_texts(path, chunk_size, read_size))
+
+    assert [mark for text in texts for mark in db_create.decode_mark_text(text)] == MARKS
+    assert list(db_create.iter_marks(path)) == MARKS
+
+
+def test_truncated_dump_is_rejected(tmp_path):
+    path = tmp_path / "dump.json"
+    path.write_text('[{"name": "Cut ]"', encoding="utf-8")
+    with pytest.raises(ValueError):
+        list(db_create.iter_mark_texts(path))
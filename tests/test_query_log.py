@@ -0,0 +1,29 @@
+import os
+import signal
+import subprocess
+import sys
+
+import pytest
+
+# Takes both locks the dump handler needs, then gets the signal while holding them
+DUMP_WHILE_LOCKED = """
+import os, signal, sys
+import query_log
+query_log.configure(log_path=sys.argv[1])
+query_log.install_dump_signal()
+with query_log._log_lock, query_log.stats._lock:
+    os.kill(os.getpid(), signal.SIGUSR1)
+    for _ in range(1000):
+        pass
+print("done")
+"""
+
+
+@pytest.mark.skipif(not hasattr(signal, "SIGUSR1"), reason="POSIX signal")
+def test_dump_signal_while_logging(tmp_path):
+    log_path = tmp_path / "slow_queries.log"
+    result = subprocess.run([sys.executable, "-c", DUMP_WHILE_LOCKED, str(log_path)], capture_output=True, text=True,
+                            timeout=10, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert result.stdout == "done\n"
+    assert "calls" in result.stderr
+    assert "query counters:" in log_path.read_text(encoding="utf-8")
@@ -0,0 +1,54 @@
+"""Keyset pages must cover every search row exactly once, in specification id order."""
+import pytest
+
+import database
+
+FILTERS = [
+    {},
+    {"brand": "Alfa Romeo"},
+    {"brand": "Alpina", "year_from": 2000},
+    {"price_max": 30000, "horse_power_min": 150},
+    {"brand": "No such brand"},
+]
+
+
+def pages(filters, page_size):
+    rows, token = database.search_page(filters, page_size)
+    result = [rows]
+    while token is not None:
+        rows, token = database.search_page(filters, page_size, token)
+        result.append(rows)
+    return result
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+@pytest.mark.parametrize("page_size", [1, 7, database.PAGE_SIZE])
+def test_pages_cover_the_search(catalogue, filters, page_size):
+    result = pages(filters, page_size)
+    rows = [row for page in result for row in page]
+    expected = sorted(database.search_cars(filters), key=lambda row: row[database.SEARCH_ID_COLUMN])
+    assert rows == expected
+    assert all(len(page) == page_size for page in result[:-1])
+    assert len(result[-1]) <= page_size
+    # The last page is only empty when nothing matched at all
+    assert result[-1] or not expected
+
+
+def test_token_resumes_after_a_write(catalogue):
+    first, token = database.search_page({"brand": "Alfa Romeo"}, 10)
+    last_id = first[-1][database.SEARCH_ID_COLUMN]
+    with catalogue:
+        catalogue.execute("DELETE FROM Specifications WHERE id = ?", (last_id,))
+    second, token = database.search_page({"brand": "Alfa Romeo"}, 10, token)
+    assert second[0][database.SEARCH_ID_COLUMN] > last_id
+
+
+def test_token_round_trip():
+    for last_id in (0, 1, 2 ** 40):
+        assert database.decode_page_token(database.encode_page_token(last_id)) == last_id
+
+
+@pytest.mark.parametrize("token", ["", "not base64!", "bnVsbA==", "eyJhZnRlciI6ICIxIn0=", "eyJiZWZvcmUiOiAxfQ=="])
+def test_invalid_token(token):
+    with pytest.raises(ValueError):
+        database.decode_page_token(token)
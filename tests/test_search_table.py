@@ -0,0 +1,29 @@
+"""car_search is kept up to date by triggers; it must always equal its rows built from the catalogue."""
+import database
+import inventory
+import migrations
+
+
+def assert_search_table(conn):
+    assert conn.execute("SELECT * FROM car_search ORDER BY id").fetchall() == \
+        conn.execute(migrations.CAR_SEARCH_ROWS + " ORDER BY Specifications.id").fetchall()
+
+
+def test_shipped_catalogue(catalogue):
+    assert_search_table(catalogue)
+
+
+def test_after_write(written):
+    conn, logged = written
+    assert_search_table(conn)
+
+
+def test_rebuild(catalogue):
+    with catalogue:
+        catalogue.execute("DELETE FROM car_search WHERE id % 2 = 0")
+        catalogue.execute("UPDATE car_search SET mark_name = 'stale'")
+    database.db.close()
+    rows = inventory.rebuild_search_table()
+    conn = database.db.connection()
+    assert rows == conn.execute("SELECT COUNT(*) FROM car_search").fetchone()[0]
+    assert_search_table(conn)
@@ -0,0 +1,72 @@
+"""model_stats and inventory_stats are kept up to date by triggers; they must equal GROUP BYs over the catalogue."""
+import pytest
+
+import database
+import inventory
+import migrations
+
+
+def number(column):
+    # Text prices ('on request') are cars, but not counted in the price aggregates
+    return f"CASE WHEN typeof(Specifications.{column}) IN ('integer', 'real') THEN Specifications.{column} END"
+
+
+AGGREGATES = ", ".join(f"COUNT({number(column)}), IFNULL(SUM({number(column)}), 0), "
+                       f"MIN({number(column)}), MAX({number(column)})" for column in migrations.STATS_COLUMNS)
+
+
+def assert_stats_tables(conn):
+    groups = {}
+    for dimension, key in migrations.STATS_DIMENSIONS.items():
+        for value, *stats in conn.execute(f"""
+            SELECT {key}, COUNT(*), {AGGREGATES}
+            FROM Specifications
+            INNER JOIN Models ON Models.id = Specifications.model_id
+            INNER JOIN Marks ON Marks.id = Models.mark_id
+            GROUP BY {key}
+        """):
+            groups[(dimension, value)] = stats
+    stored = {(dimension, value): stats for dimension, value, *stats in conn.execute("SELECT * FROM inventory_stats")}
+    assert stored == pytest.approx(groups)
+
+    models = {model_id: stats for model_id, *stats in conn.execute(f"""
+        SELECT model_id, COUNT(*), {AGGREGATES} FROM Specifications WHERE model_id IS NOT NULL GROUP BY model_id
+    """)}
+    stored = {model_id: stats for model_id, *stats in conn.execute("SELECT * FROM model_stats")}
+    assert stored == pytest.approx(models)
+
+
+def test_shipped_catalogue(catalogue):
+    assert_stats_tables(catalogue)
+
+
+def test_after_write(written):
+    conn, logged = written
+    assert_stats_tables(conn)
+
+
+def test_rebuild(catalogue):
+    with catalogue:
+        catalogue.execute("DELETE FROM model_stats")
+        catalogue.execute("UPDATE inventory_stats SET cars = 0, price_sum = 0")
+    database.db.close()
+    assert inventory.rebuild_stats_tables() > 0
+    assert_stats_tables(database.db.connection())
+
+
+def test_statistics_by_brand(catalogue):
+    expected = catalogue.execute(f"""
+        SELECT {migrations.STATS_DIMENSIONS["brand"]}, COUNT(*),
+               MIN({number("price")}), AVG({number("price")}), MAX({number("price")}),
+               MIN({number("horse_power")}), AVG({number("horse_power")}), MAX({number("horse_power")})
+        FROM Specifications
+        INNER JOIN Models ON Models.id = Specifications.model_id
+        INNER JOIN Marks ON Marks.id = Models.mark_id
+        GROUP BY 1 ORDER BY 1
+    """).fetchall()
+    assert database.get_statistics("brand") == pytest.approx(expected)
+
+
+def test_unknown_grouping_is_rejected(catalogue):
+    with pytest.raises(ValueError):
+        database.get_statistics("colour")
@@ -0,0 +1,35 @@
+from writes import sync
+
+
+def stored(conn):
+    return conn.execute("""
+        SELECT Specifications.id, Specifications.generation_id, Specifications.fingerprint
+        FROM Specifications JOIN Models ON Models.id = Specifications.model_id
+        JOIN Marks ON Marks.id = Models.mark_id
+        WHERE Marks.name = 'Testmark'
+        ORDER BY Specifications.id
+    """).fetchall()
+
+
+def test_resync_leaves_rows_unchanged(catalogue):
+    assert sync(catalogue)["inserted"] == 6
+    rows = stored(catalogue)
+    assert sync(catalogue) == {"inserted": 0, "updated": 0, "unchanged": 6}
+    assert stored(catalogue) == rows
+
+
+def test_resync_links_unlinked_specifications(catalogue):
+    sync(catalogue)
+    rows = stored(catalogue)
+    total = catalogue.execute("SELECT COUNT(*) FROM Specifications").fetchone()[0]
+    # As left by imports from before generation_id / fingerprint existed
+    with catalogue:
+        catalogue.execute("UPDATE Specifications SET generation_id = NULL, fingerprint = NULL WHERE id IN (?, ?)",
+                          (rows[0][0], rows[1][0]))
+        catalogue.execute("UPDATE Specifications SET fingerprint = NULL WHERE id = ?", (rows[2][0],))
+
+    stats = sync(catalogue)
+
+    assert (stats["inserted"], stats["updated"]) == (0, 3)
+    assert catalogue.execute("SELECT COUNT(*) FROM Specifications").fetchone()[0] == total
+    assert stored(catalogue) == rows
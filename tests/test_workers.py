@@ -0,0 +1,45 @@
+import time
+
+import pytest
+
+QtCore = pytest.importorskip("PyQt5.QtCore")
+
+import workers  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+
+def wait(app, runner, timeout=5):
+    deadline = time.monotonic() + timeout
+    while runner.is_busy() and time.monotonic() < deadline:
+        app.processEvents()
+        time.sleep(0.01)
+
+
+def broken():
+    raise KeyError("missing")
+
+
+def test_unexpected_error_is_delivered(app, caplog):
+    runner = workers.QueryRunner()
+    busy = []
+    errors = []
+    runner.busy_changed.connect(busy.append)
+
+    runner.submit("channel", broken, on_error=errors.append)
+    wait(app, runner)
+
+    assert [type(error) for error in errors] == [KeyError]
+    assert busy == [True, False]
+    assert "KeyError" in caplog.text
+
+
+def test_result_is_delivered(app):
+    runner = workers.QueryRunner()
+    results = []
+    runner.submit("channel", sum, ([1, 2, 3],), on_result=results.append)
+    wait(app, runner)
+    assert results == [6] and not runner.is_busy()
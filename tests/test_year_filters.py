@@ -0,0 +1,52 @@
+"""Year filters on the shipped catalogue, where most specifications have no generation_id."""
+import pytest
+
+import database
+import facets
+
+# Specifications matching year bounds: by their generation's years, or by their model's
+# when they are not linked to a generation
+EXPECTED = """
+    SELECT COUNT(*) FROM Specifications
+    INNER JOIN Models ON Models.id = Specifications.model_id
+    INNER JOIN Marks ON Marks.id = Models.mark_id
+    LEFT JOIN Generations ON Generations.id = Specifications.generation_id
+    WHERE (:year_from IS NULL
+           OR CASE WHEN Generations.id IS NULL THEN Models.year_from ELSE Generations.year_start END >= :year_from)
+      AND (:year_to IS NULL
+           OR CASE WHEN Generations.id IS NULL THEN Models.year_to ELSE Generations.year_stop END <= :year_to)
+"""
+
+BOUNDS = [(1990, None), (2000, None), (2010, None), (None, 2000), (None, 2010), (1995, 2015)]
+
+
+def filters(year_from, year_to):
+    return {"year_from": "" if year_from is None else str(year_from),
+            "year_to": "" if year_to is None else str(year_to)}
+
+
+@pytest.mark.parametrize("year_from, year_to", BOUNDS)
+def test_search_counts(catalogue, year_from, year_to):
+    expected = catalogue.execute(EXPECTED, {"year_from": year_from, "year_to": year_to}).fetchone()[0]
+    assert len(database.search_cars(filters(year_from, year_to))) == expected
+
+
+@pytest.mark.parametrize("year_from, year_to", BOUNDS)
+def test_facet_counts(catalogue, year_from, year_to):
+    expected = catalogue.execute(EXPECTED, {"year_from": year_from, "year_to": year_to}).fetchone()[0]
+    index = facets.FacetIndex()
+    try:
+        counts = index.counts(filters(year_from, year_to))
+    finally:
+        index.close()
+    assert sum(counts["brand"].values()) == expected
+
+
+def test_unlinked_specifications_are_found(catalogue):
+    unlinked = catalogue.execute("""
+        SELECT COUNT(*) FROM car_search
+        INNER JOIN Specifications ON Specifications.id = car_search.id
+        WHERE Specifications.generation_id IS NULL AND car_search.generation_start >= 1990
+    """).fetchone()[0]
+    # Before falling back to the model's years, none of these were found
+    assert unlinked > 400
@@ -0,0 +1,150 @@
+"""
+Writes of every kind the triggers on the catalogue tables have to follow.
+
+Each function takes the catalogue connection, makes one change and returns
+the ids of the specifications whose range-filter columns it changed, i.e.
+what the specification_changes log must list (None: not checked).
+"""
+import db_create
+import inventory
+
+# A mark for SyncWriter imports: one model, one generation, three specifications
+MARK = {
+    "name": "Testmark",
+    "country": "Nowhere",
+    "models": [{
+        "name": "One",
+        "class": "B",
+        "year-from": 2001,
+        "year-to": 2005,
+        "generations": [{
+            "name": "I",
+            "year-start": 2001,
+            "year-stop": 2005,
+            "configurations": [{
+                "body-type": "Sedan",
+                "modifications": [
+                    {"specifications": {"engine-type": "Petrol", "horse-power": 90, "transmission": "Manual",
+                                        "drive": "Front", "volume": 1.4, "consumption-mixed": 6.1,
+                                        "max-speed": 180, "price": 10000}},
+                    # Identical modifications get an occurrence suffix
+                    {"specifications": {"engine-type": "Petrol", "horse-power": 90, "transmission": "Manual",
+                                        "drive": "Front", "volume": 1.4, "consumption-mixed": 6.1,
+                                        "max-speed": 180, "price": 10500}},
+                    {"specifications": {"engine-type": "Diesel", "horse-power": 110, "transmission": "Automatic",
+                                        "drive": "Front", "volume": 1.9, "consumption-mixed": 5.2,
+                                        "max-speed": 190, "price": 12000}},
+                ],
+            }],
+        }],
+    }],
+}
+
+
+def sync(conn):
+    return db_create.sync_marks(conn, [db_create.normalize_mark(MARK)])
+
+
+def sample(conn):
+    """(specification id with a model and generation, its model id, a model id of another mark)."""
+    specification_id, model_id, mark_id = conn.execute("""
+        SELECT Specifications.id, Specifications.model_id, Models.mark_id FROM Specifications
+        JOIN Models ON Models.id = Specifications.model_id
+        WHERE Specifications.generation_id IS NOT NULL ORDER BY Specifications.id LIMIT 1
+    """).fetchone()
+    other_model_id = conn.execute("SELECT MIN(id) FROM Models WHERE mark_id != ?", (mark_id,)).fetchone()[0]
+    return specification_id, model_id, other_model_id
+
+
+def brand_ids(conn, brand):
+    return {row[0] for row in conn.execute("SELECT id FROM car_search WHERE mark_name = ?", (brand,))}
+
+
+def statement(sql, logged=False):
+    """A write of one SQL statement on the sample() rows; logs the sample specification if logged."""
+    def write(conn):
+        specification_id, model_id, other_model_id = sample(conn)
+        with conn:
+            conn.execute(sql, {"specification": specification_id, "model": model_id, "other_model": other_model_id})
+        return {specification_id} if logged else None
+    return write
+
+
+def insert(conn):
+    specification_id = sample(conn)[0]
+    with conn:
+        cursor = conn.execute("""
+            INSERT INTO Specifications (engine_type, horse_power, transmission, drive, volume,
+                                        consumption_mixed, max_speed, price, model_id, generation_id)
+            SELECT engine_type, 999, transmission, drive, volume, consumption_mixed, max_speed, 1,
+                   model_id, generation_id
+            FROM Specifications WHERE id = ?
+        """, (specification_id,))
+    return {cursor.lastrowid}
+
+
+def change_id(conn):
+    specification_id = sample(conn)[0]
+    with conn:
+        conn.execute("UPDATE Specifications SET id = 99999999 WHERE id = ?", (specification_id,))
+    return {specification_id, 99999999}
+
+
+def delete(conn):
+    specification_id = sample(conn)[0]
+    assert inventory.delete_cars([specification_id])["specifications"] == 1
+    return {specification_id}
+
+
+def delete_with_cleanup(conn):
+    ids = brand_ids(conn, "Alpina")
+    counts = inventory.delete_cars(filters={"brand": "Alpina"}, cleanup=True)
+    assert counts["specifications"] == len(ids) and counts["marks"] == 1
+    return ids
+
+
+def bulk_update(conn):
+    ids = brand_ids(conn, "Alpina")
+    changes = [inventory.parse_bulk_change("specifications", "price", "*1.05"),
+               inventory.parse_bulk_change("models", "class", "S")]
+    inventory.bulk_update(changes, filters={"brand": "Alpina"})
+    return ids
+
+
+def sync_import(conn):
+    sync(conn)
+    ids = brand_ids(conn, "Testmark")
+    assert len(ids) == 3
+    return ids
+
+
+WRITES = {
+    "insert": insert,
+    "price and horse power": statement(
+        "UPDATE Specifications SET price = price * 2, horse_power = NULL WHERE id = :specification", logged=True),
+    "text price": statement(
+        "UPDATE Specifications SET price = 'on request' WHERE id = :specification", logged=True),
+    "unrelated column": statement(
+        "UPDATE Specifications SET engine_type = 'hydrogen' WHERE id = :specification"),
+    "move to another model": statement(
+        "UPDATE Specifications SET model_id = :other_model, generation_id = NULL WHERE id = :specification"),
+    "id change": change_id,
+    "rename mark": statement(
+        "UPDATE Marks SET name = 'Renamed', country = 'Elsewhere' "
+        "WHERE id = (SELECT mark_id FROM Models WHERE id = :model)"),
+    "rename model": statement(
+        "UPDATE Models SET name = 'Renamed', class = 'Z', body_type = 'wagon' WHERE id = :model"),
+    "move model": statement(
+        "UPDATE Models SET mark_id = (SELECT mark_id FROM Models WHERE id = :other_model) WHERE id = :model"),
+    "rename generation": statement(
+        "UPDATE Generations SET name = 'Renamed', year_start = 1900 "
+        "WHERE id = (SELECT generation_id FROM Specifications WHERE id = :specification)"),
+    "delete generation": statement(
+        "DELETE FROM Generations WHERE id = (SELECT generation_id FROM Specifications WHERE id = :specification)"),
+    "delete model": statement("DELETE FROM Models WHERE id = :model"),
+    "delete mark": statement("DELETE FROM Marks WHERE id = (SELECT mark_id FROM Models WHERE id = :model)"),
+    "delete": delete,
+    "delete with cleanup": delete_with_cleanup,
+    "bulk update": bulk_update,
+    "sync import": sync_import,
+}
@@ -0,0 +1,128 @@
+import itertools
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtCore import QObject, pyqtSignal
+from PyQt5.QtWidgets import QProgressBar
+
+MAX_WORKERS = 4
+
+# Shared by every form; each worker thread keeps its own database connection for
+# as long as it lives. Python threads rather than a QThreadPool: PyQt drops a Qt
+# thread's Python state between runs, and with it the thread's connection.
+pool = ThreadPoolExecutor(MAX_WORKERS, thread_name_prefix="query")
+
+log = logging.getLogger("cars.workers")
+
+
+class QueryTask:
+    def __init__(self, runner, request_id, func, args):
+        self.runner = runner
+        self.request_id = request_id
+        self.func = func
+        self.args = args
+        self.future = None
+
+    def run(self):
+        try:
+            result = self.func(*self.args)
+        # ValueError covers inventory.ValidationError; OSError a file that cannot be written (exports)
+        except (sqlite3.Error, ValueError, OSError) as e:
+            self.runner.task_failed.emit(self.request_id, e)
+        except Exception as e:
+            # A bug; report it like the others so the form settles, and keep the traceback
+            log.exception("Query task %r failed", self.request_id)
+            self.runner.task_failed.emit(self.request_id, e)
+        else:
+            self.runner.task_finished.emit(self.request_id, result)
+
+    def cancel(self):
+        """Removes the task from the queue; False if it has already started."""
+        return self.future.cancel()
+
+
+class QueryRunner(QObject):
+    """
+    Runs database calls on the worker pool and delivers results on the GUI thread.
+
+    Every call is submitted on a channel (e.g. the combobox it fills). A newer
+    call on the same channel supersedes the older one: it is removed from the
+    queue if it has not started yet, and its result is dropped otherwise.
+    """
+
+    task_finished = pyqtSignal(int, object)
+    task_failed = pyqtSignal(int, object)
+    busy_changed = pyqtSignal(bool)
+
+    _ids = itertools.count(1)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._latest = {}  # channel -> request id
+        self._tasks = {}  # request id -> (channel, task, on_result, on_error)
+        self.task_finished.connect(self._deliver_result)
+        self.task_failed.connect(self._deliver_error)
+
+    def is_busy(self):
+        return bool(self._tasks)
+
+    def submit(self, channel, func, args=(), on_result=None, on_error=None):
+        previous = self._latest.get(channel)
+        if previous in self._tasks and self._tasks[previous][1].cancel():
+            self._forget(previous)
+
+        request_id = next(self._ids)
+        task = QueryTask(self, request_id, func, tuple(args))
+        was_busy = self.is_busy()
+        self._latest[channel] = request_id
+        self._tasks[request_id] = (channel, task, on_result, on_error)
+        if not was_busy:
+            self.busy_changed.emit(True)
+        task.future = pool.submit(task.run)
+        return request_id
+
+    def cancel(self, channel):
+        """Drops the pending call on a channel, if any."""
+        request_id = self._latest.pop(channel, None)
+        if request_id in self._tasks:
+            self._tasks[request_id][1].cancel()
+            self._forget(request_id)
+
+    def _forget(self, request_id):
+        channel, task, on_result, on_error = self._tasks.pop(request_id)
+        if self._latest.get(channel) == request_id:
+            del self._latest[channel]
+        if not self._tasks:
+            self.busy_changed.emit(False)
+        return channel, on_result, on_error
+
+    def _take_current(self, request_id):
+        if request_id not in self._tasks:
+            return None
+        channel = self._tasks[request_id][0]
+        superseded = self._latest.get(channel) != request_id
+        callbacks = self._forget(request_id)
+        return None if superseded else callbacks
+
+    def _deliver_result(self, request_id, result):
+        callbacks = self._take_current(request_id)
+        if callbacks and callbacks[1]:
+            callbacks[1](result)
+
+    def _deliver_error(self, request_id, error):
+        callbacks = self._take_current(request_id)
+        if callbacks and callbacks[2]:
+            callbacks[2](error)
+
+
+class BusyIndicator(QProgressBar):
+    """Indeterminate progress bar shown while a QueryRunner has calls in flight."""
+
+    def __init__(self, runner, parent=None):
+        super().__init__(parent)
+        self.setRange(0, 0)
+        self.setTextVisible(False)
+        self.setMaximumHeight(6)
+        self.hide()
+        runner.busy_changed.connect(self.setVisible)